@@ -8,8 +8,60 @@
 
 // Activer CORS
 require_once __DIR__ . '/../core/Cors.php';
+require_once __DIR__ . '/../core/ModelCache.php';
 Cors::enable();
 
+/**
+ * Envoie la génération au serveur Python persistant (backend/python/serveur_generation.py)
+ * @param array $payload
+ * @return array|null Réponse décodée, ou null si le serveur est injoignable
+ */
+function requestGenerationServer($payload) {
+    $serverUrl = getenv('GENERATION_SERVER_URL') ?: 'http://127.0.0.1:8765';
+
+    $context = stream_context_create([
+        'http' => [
+            'method' => 'POST',
+            'header' => "Content-Type: application/json\r\n",
+            'content' => json_encode($payload, JSON_UNESCAPED_SLASHES),
+            'timeout' => 300,
+            'ignore_errors' => true // Lire le corps même en cas de 500
+        ]
+    ]);
+
+    $response = @file_get_contents(rtrim($serverUrl, '/') . '/generate', false, $context);
+    if ($response === false) {
+        error_log("Serveur de génération injoignable ($serverUrl), repli sur exec");
+        return null;
+    }
+
+    $result = json_decode($response, true);
+    if (!is_array($result) || !array_key_exists('returncode', $result)) {
+        error_log("Réponse invalide du serveur de génération: " . substr($response, 0, 500));
+        return null;
+    }
+
+    return $result;
+}
+
+/**
+ * Réponse d'une génération en mode aperçu : le GLB complet et le DXF seront publiés sous glb_url et dxf_url
+ * @return array
+ */
+function previewResponse($prompt, $filename, $previewPath, $executionTime) {
+    return [
+        'success' => true,
+        'pending' => true,
+        'preview_url' => '/models/' . basename($previewPath),
+        'glb_url' => '/models/' . $filename,
+        'dxf_url' => '/models/' . preg_replace('/\.glb$/', '.dxf', $filename),
+        'prompt' => $prompt,
+        'filename' => $filename,
+        'execution_time' => $executionTime . 's',
+        'cached' => false
+    ];
+}
+
 // Vérifier que c'est une requête POST
 if ($_SERVER['REQUEST_METHOD'] !== 'POST') {
     http_response_code(405);
@@ -50,6 +102,9 @@ try {
 
     $prompt = trim($data['prompt']);
     $closed = isset($data['closed']) && $data['closed'] === true;
+    $handles = isset($data['handles']) && $data['handles'] === true;
+    // Aperçu : GLB grossier renvoyé dès la fin du maillage, le modèle complet suit en arrière-plan
+    $preview = isset($data['preview']) && $data['preview'] === true;
 
     // Support pour couleur unique (legacy) ou multi-couleurs
     $colors = null;
@@ -111,9 +166,6 @@ try {
         exit();
     }
 
-    // Générer un nom de fichier unique
-    $filename = 'meuble_' . uniqid() . '.glb';
-
     // Utiliser OUTPUT_DIR si défini, sinon fallback sur /data/models (Docker) ou chemin local
     $outputDir = getenv('OUTPUT_DIR');
 
@@ -131,7 +183,11 @@ try {
     }
 
     $outputDir = rtrim($outputDir, DIRECTORY_SEPARATOR) . DIRECTORY_SEPARATOR;
-    $outputPath = $outputDir . $filename;
+
+    // Textures écrites une fois dans OUTPUT_DIR/textures (nom = empreinte du contenu) au lieu d'être intégrées à chaque GLB
+    $externalTextures = getenv('GLB_EXTERNAL_TEXTURES') === '1';
+    // Sommets quantifiés sur 16 bits (KHR_mesh_quantization)
+    $quantize = getenv('GLB_QUANTIZE') === '1';
 
     // Créer le dossier si inexistant
     if (!is_dir($outputDir)) {
@@ -140,6 +196,46 @@ try {
         }
     }
 
+    // Nom de fichier dérivé de la requête : une requête déjà générée est servie depuis le cache
+    $startTime = microtime(true);
+    $cache = new ModelCache($outputDir);
+    $cacheKey = $cache->key($prompt, [
+        'closed' => $closed,
+        'colors' => $colors,
+        'deleted_panels' => $deletedPanels,
+        'zones' => $zones,
+        'handles' => $handles,
+        'external_textures' => $externalTextures,
+        'quantize' => $quantize
+    ]);
+    $filename = $cache->filename($cacheKey);
+
+    $cached = $cache->get($cacheKey);
+    if ($cached !== null) {
+        http_response_code(201);
+        echo json_encode([
+            'success' => true,
+            'glb_url' => '/models/' . $filename,
+            'dxf_url' => $cached['dxf'] ? '/models/' . basename($cached['dxf']) : null,
+            'prompt' => $prompt,
+            'filename' => $filename,
+            'execution_time' => round(microtime(true) - $startTime, 2) . 's',
+            'cached' => true
+        ]);
+        exit();
+    }
+
+    // Aperçu déjà servi, modèle complet pas encore publié : ne pas relancer la génération
+    $previewPath = $preview ? $cache->pendingPreview($cacheKey) : null;
+    if ($previewPath !== null) {
+        http_response_code(202);
+        echo json_encode(previewResponse($prompt, $filename, $previewPath, round(microtime(true) - $startTime, 2)));
+        exit();
+    }
+
+    // Générer dans un fichier temporaire, publié dans le cache une fois complet
+    $outputPath = $cache->temporaryPath($cacheKey);
+
     // Chemin vers le script Python (normaliser les slashes)
     // Utiliser le vrai script de Gauthier
     $pythonScript = dirname(__DIR__) . DIRECTORY_SEPARATOR . 'python' . DIRECTORY_SEPARATOR . 'procedure_real.py';
@@ -166,6 +262,15 @@ try {
     // Ajouter --closed si demandé
     $closedFlag = $closed ? '--closed' : '';
 
+    // Ajouter --handles si les poignées sont demandées
+    $handlesFlag = $handles ? '--handles' : '';
+
+    // Ajouter --external-textures si activé
+    $externalTexturesFlag = $externalTextures ? '--external-textures' : '';
+
+    // Ajouter --quantize si activé
+    $quantizeFlag = $quantize ? '--quantize' : '';
+
     // Ajouter --colors si fourni (format JSON)
     $colorsFlag = '';
     if ($colors && !empty($colors)) {
@@ -188,12 +293,15 @@ try {
     }
 
     $command = sprintf(
-        '"%s" "%s" %s %s %s %s %s %s 2>&1',
+        '"%s" "%s" %s %s %s %s %s %s %s %s %s 2>&1',
         $pythonExe,
         $pythonScript,
         escapeshellarg($prompt),
         escapeshellarg($outputPath),
         $closedFlag,
+        $handlesFlag,
+        $externalTexturesFlag,
+        $quantizeFlag,
         $colorsFlag,
         $deletedPanelsFlag,
         $zonesFlag
@@ -204,13 +312,43 @@ try {
     error_log("Output dir: $outputDir");
     error_log("Output path: $outputPath");
 
-    // Mesurer le temps d'exécution
-    $startTime = microtime(true);
-
-    // Exécuter la commande Python
+    // Essayer d'abord le serveur de génération persistant (imports Python déjà chargés)
     $output = [];
     $returnCode = 0;
-    exec($command, $output, $returnCode);
+    $payload = [
+        'prompt' => $prompt,
+        'output_path' => $outputPath,
+        'closed' => $closed,
+        'colors' => $colors,
+        'deleted_panels' => $deletedPanels,
+        'zones' => $zones,
+        'handles' => $handles,
+        'external_textures' => $externalTextures,
+        'quantize' => $quantize
+    ];
+    if ($preview) {
+        // Le serveur répond après l'aperçu et publie lui-même le modèle complet dans le cache
+        // (sans serveur, repli sur la génération complète ci-dessous)
+        $payload['preview_output_path'] = $cache->previewPath($cacheKey);
+        $payload['publish_path'] = $cache->glbPath($cacheKey);
+    }
+    $serverResult = requestGenerationServer($payload);
+
+    if ($serverResult !== null && !empty($serverResult['pending'])) {
+        // Le modèle complet sera publié par le serveur sans passer par put() : appliquer l'éviction ici
+        $cache->evict();
+        http_response_code(202);
+        echo json_encode(previewResponse($prompt, $filename, $serverResult['preview_glb_path'], round(microtime(true) - $startTime, 2)));
+        exit();
+    }
+
+    if ($serverResult !== null) {
+        $output = explode("\n", $serverResult['output'] ?? '');
+        $returnCode = (int)($serverResult['returncode'] ?? 1);
+    } else {
+        // Serveur indisponible : exécuter la commande Python
+        exec($command, $output, $returnCode);
+    }
 
     $executionTime = round(microtime(true) - $startTime, 2);
 
@@ -223,6 +361,8 @@ try {
     // Vérifier le code de retour
     if ($returnCode !== 0) {
         // Erreur lors de l'exécution Python
+        @unlink($outputPath);
+        @unlink(preg_replace('/\.glb$/', '.dxf', $outputPath));
         $errorMessage = implode("\n", $output);
         error_log("Erreur Python : $errorMessage");
 
@@ -256,13 +396,13 @@ try {
         exit();
     }
 
-    // Vérifier si le fichier DXF a été créé
-    $dxfFilename = pathinfo($filename, PATHINFO_FILENAME) . '.dxf';
-    $dxfPath = $outputDir . $dxfFilename;
+    // Publier le GLB et le DXF dans le cache
+    $stored = $cache->put($cacheKey, $outputPath);
+    $dxfPath = $cache->dxfPath($cacheKey);
     $dxfUrl = null;
 
-    if (file_exists($dxfPath)) {
-        $dxfUrl = '/models/' . $dxfFilename;
+    if ($stored['dxf'] !== null) {
+        $dxfUrl = '/models/' . basename($stored['dxf']);
         error_log("Fichier DXF trouvé: $dxfPath");
     } else {
         error_log("Fichier DXF NON TROUVE après exécution Python: $dxfPath");
@@ -280,7 +420,8 @@ try {
         'dxf_url' => $dxfUrl,
         'prompt' => $prompt,
         'filename' => $filename,
-        'execution_time' => $executionTime . 's'
+        'execution_time' => $executionTime . 's',
+        'cached' => false
     ]);
 
 } catch (Exception $e) {
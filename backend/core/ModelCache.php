@@ -0,0 +1,296 @@
+<?php
+/**
+ * ArchiMeuble - Cache des modèles générés (GLB/DXF)
+ *
+ * Les fichiers sont nommés d'après un hash de la requête normalisée
+ * (prompt, --closed, couleurs, panneaux supprimés, zones, poignées, options du GLB) et de la version
+ * du catalogue de textures / du générateur : une requête déjà vue renvoie
+ * directement les fichiers existants sans relancer Python.
+ *
+ * En mode aperçu, un GLB grossier (meuble_<clé>.apercu.glb) est servi tout de
+ * suite et le serveur de génération publie le modèle complet à glbPath() une
+ * fois calculé.
+ *
+ * Éviction LRU (date de dernier accès = mtime) quand le dossier dépasse
+ * MODELS_CACHE_MAX_MB. Les modèles référencés par une configuration ou une
+ * commande ne sont jamais supprimés.
+ */
+
+require_once __DIR__ . '/Database.php';
+
+class ModelCache {
+    private const PREFIX = 'meuble_';
+    private const KEY_LENGTH = 32;
+    private const DEFAULT_MAX_MB = 2048;
+    private const PREVIEW_TTL = 300; // au-delà, un aperçu sans modèle complet est considéré comme abandonné
+
+    private $dir;
+    private $maxBytes;
+    private $pythonDir;
+
+    public function __construct(string $dir, ?int $maxBytes = null) {
+        $this->dir = rtrim($dir, DIRECTORY_SEPARATOR) . DIRECTORY_SEPARATOR;
+        $maxMb = getenv('MODELS_CACHE_MAX_MB');
+        $this->maxBytes = $maxBytes ?? (int)(($maxMb !== false && $maxMb !== '' ? (float)$maxMb : self::DEFAULT_MAX_MB) * 1024 * 1024);
+        $this->pythonDir = dirname(__DIR__) . DIRECTORY_SEPARATOR . 'python';
+    }
+
+    /**
+     * Calcule la clé de cache d'une requête de génération
+     *
+     * @param string $prompt
+     * @param array $options closed, colors, deleted_panels, zones, handles, external_textures, quantize
+     * @return string
+     */
+    public function key(string $prompt, array $options): string {
+        $colors = $options['colors'] ?? null;
+        if (is_array($colors)) {
+            $colors = array_map(function ($hex) {
+                return is_string($hex) ? strtolower(trim($hex)) : $hex;
+            }, $colors);
+            ksort($colors);
+        }
+
+        $deletedPanels = $options['deleted_panels'] ?? null;
+        if (is_array($deletedPanels)) {
+            $deletedPanels = array_values(array_unique(array_map('strval', $deletedPanels)));
+            sort($deletedPanels);
+        }
+
+        $canonical = [
+            'prompt' => self::normalizePrompt($prompt),
+            'closed' => !empty($options['closed']),
+            'colors' => $colors ?: null,
+            'deleted_panels' => $deletedPanels ?: null,
+            'zones' => !empty($options['zones']) ? self::sortKeys($options['zones']) : null,
+            'handles' => !empty($options['handles']),
+            'external_textures' => !empty($options['external_textures']),
+            'quantize' => !empty($options['quantize']),
+            'catalogue' => $this->catalogVersion()
+        ];
+
+        return substr(hash('sha256', json_encode($canonical, JSON_UNESCAPED_SLASHES)), 0, self::KEY_LENGTH);
+    }
+
+    /**
+     * Nom du fichier GLB associé à une clé
+     */
+    public function filename(string $key): string {
+        return self::PREFIX . $key . '.glb';
+    }
+
+    public function glbPath(string $key): string {
+        return $this->dir . $this->filename($key);
+    }
+
+    public function dxfPath(string $key): string {
+        return $this->dir . self::PREFIX . $key . '.dxf';
+    }
+
+    public function previewPath(string $key): string {
+        return $this->dir . self::PREFIX . $key . '.apercu.glb';
+    }
+
+    /**
+     * Aperçu dont le modèle complet est encore en cours de génération
+     *
+     * @return string|null chemin de l'aperçu, ou null s'il n'y en a pas de récent
+     */
+    public function pendingPreview(string $key): ?string {
+        $previewPath = $this->previewPath($key);
+        if (!is_file($previewPath) || time() - (int)@filemtime($previewPath) > self::PREVIEW_TTL) {
+            return null;
+        }
+        return $previewPath;
+    }
+
+    /**
+     * Cherche un modèle déjà généré
+     *
+     * @return array|null ['glb' => chemin, 'dxf' => chemin|null] ou null si absent
+     */
+    public function get(string $key): ?array {
+        $glbPath = $this->glbPath($key);
+        if (!is_file($glbPath)) {
+            return null;
+        }
+
+        $dxfPath = $this->dxfPath($key);
+        $hasDxf = is_file($dxfPath);
+
+        // Marquer l'entrée comme récemment utilisée
+        @touch($glbPath);
+        if ($hasDxf) {
+            @touch($dxfPath);
+        }
+
+        return ['glb' => $glbPath, 'dxf' => $hasDxf ? $dxfPath : null];
+    }
+
+    /**
+     * Chemin temporaire où générer le GLB avant de le publier avec put()
+     * (le DXF est écrit par Python à côté, avec le même nom)
+     */
+    public function temporaryPath(string $key): string {
+        return $this->dir . self::PREFIX . $key . '.tmp' . uniqid() . '.glb';
+    }
+
+    /**
+     * Publie un modèle généré à son chemin définitif puis applique l'éviction
+     *
+     * @param string $key
+     * @param string $generatedGlb GLB produit à temporaryPath()
+     * @return array ['glb' => chemin, 'dxf' => chemin|null]
+     */
+    public function put(string $key, string $generatedGlb): array {
+        $generatedDxf = preg_replace('/\.glb$/', '.dxf', $generatedGlb);
+        $dxfPath = $this->dxfPath($key);
+        $hasDxf = false;
+
+        // Le DXF d'abord : la présence du GLB signale une entrée complète
+        if (is_file($generatedDxf)) {
+            $hasDxf = rename($generatedDxf, $dxfPath);
+        }
+        if (!rename($generatedGlb, $this->glbPath($key))) {
+            throw new Exception("Impossible d'enregistrer le modèle dans le cache");
+        }
+
+        $this->evict();
+
+        return ['glb' => $this->glbPath($key), 'dxf' => $hasDxf ? $dxfPath : null];
+    }
+
+    /**
+     * Supprime les modèles les moins récemment utilisés jusqu'à repasser sous la taille maximale
+     *
+     * @return int Nombre d'entrées supprimées
+     */
+    public function evict(): int {
+        $entries = [];
+        $total = 0;
+        $pattern = '/^' . self::PREFIX . '([0-9a-f]{' . self::KEY_LENGTH . '})(\.apercu)?\.(glb|dxf)$/';
+
+        foreach (scandir($this->dir) ?: [] as $file) {
+            if (!preg_match($pattern, $file, $matches)) {
+                continue;
+            }
+            $path = $this->dir . $file;
+            $size = (int)@filesize($path);
+            $total += $size;
+
+            $key = $matches[1];
+            if (!isset($entries[$key])) {
+                $entries[$key] = ['size' => 0, 'atime' => 0];
+            }
+            $entries[$key]['size'] += $size;
+            $entries[$key]['atime'] = max($entries[$key]['atime'], (int)@filemtime($path));
+        }
+
+        if ($total <= $this->maxBytes) {
+            return 0;
+        }
+
+        $pinned = $this->pinnedKeys();
+        if ($pinned === null) {
+            // Sans base de données on ne sait pas quels modèles sont sauvegardés : ne rien supprimer
+            return 0;
+        }
+
+        uasort($entries, function ($a, $b) {
+            return $a['atime'] <=> $b['atime'];
+        });
+
+        $evicted = 0;
+        foreach ($entries as $key => $entry) {
+            if ($total <= $this->maxBytes) {
+                break;
+            }
+            if (isset($pinned[$key])) {
+                continue;
+            }
+            @unlink($this->glbPath($key));
+            @unlink($this->dxfPath($key));
+            @unlink($this->previewPath($key));
+            $total -= $entry['size'];
+            $evicted++;
+        }
+
+        if ($evicted > 0) {
+            error_log("[ModelCache] $evicted modèle(s) supprimé(s), taille du cache: " . round($total / 1048576, 1) . " Mo");
+        }
+
+        return $evicted;
+    }
+
+    /**
+     * Clés des modèles référencés par une configuration ou une commande
+     *
+     * @return array|null clé => true, ou null si la base est indisponible
+     */
+    private function pinnedKeys(): ?array {
+        try {
+            $db = Database::getInstance();
+            $rows = array_merge(
+                $db->query("SELECT glb_url FROM configurations WHERE glb_url LIKE '/models/" . self::PREFIX . "%'"),
+                $db->query("SELECT glb_url FROM order_items WHERE glb_url LIKE '/models/" . self::PREFIX . "%'")
+            );
+        } catch (Exception $e) {
+            error_log("[ModelCache] Modèles sauvegardés introuvables: " . $e->getMessage());
+            return null;
+        }
+
+        $pinned = [];
+        foreach ($rows as $row) {
+            if (preg_match('/' . self::PREFIX . '([0-9a-f]{' . self::KEY_LENGTH . '})\.glb$/', $row['glb_url'] ?? '', $matches)) {
+                $pinned[$matches[1]] = true;
+            }
+        }
+        return $pinned;
+    }
+
+    /**
+     * Version du catalogue et du générateur : toute modification des textures,
+     * de panneau.json, des règles d'alésage ou du code Python invalide le cache
+     */
+    private function catalogVersion(): string {
+        $files = array_merge(
+            glob($this->pythonDir . DIRECTORY_SEPARATOR . '*.py') ?: [],
+            glob($this->pythonDir . DIRECTORY_SEPARATOR . '*.json') ?: [],
+            glob($this->pythonDir . DIRECTORY_SEPARATOR . 'textures' . DIRECTORY_SEPARATOR . '*') ?: []
+        );
+        sort($files);
+
+        $signature = [];
+        foreach ($files as $file) {
+            $signature[] = basename($file) . ':' . @filesize($file) . ':' . @filemtime($file);
+        }
+
+        $catalog = $this->pythonDir . DIRECTORY_SEPARATOR . 'textures' . DIRECTORY_SEPARATOR . 'panneau.json';
+        if (is_file($catalog)) {
+            $signature[] = md5_file($catalog);
+        }
+
+        return md5(implode('|', $signature));
+    }
+
+    /**
+     * Normalise un prompt : les espaces n'ont pas de sens pour le parseur
+     */
+    public static function normalizePrompt(string $prompt): string {
+        return preg_replace('/\s+/', '', $prompt);
+    }
+
+    private static function sortKeys($value) {
+        if (!is_array($value)) {
+            return $value;
+        }
+        $isList = array_keys($value) === range(0, count($value) - 1);
+        foreach ($value as $k => $v) {
+            $value[$k] = self::sortKeys($v);
+        }
+        if (!$isList) {
+            ksort($value);
+        }
+        return $value;
+    }
+}
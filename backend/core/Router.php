@@ -315,6 +315,11 @@ class Router {
             header('Access-Control-Allow-Headers: Content-Type');
             header('Content-Type: ' . $contentType);
 
+            // Textures des modèles nommées d'après leur contenu : jamais modifiées, cache long navigateur/CDN
+            if (preg_match('#^models/textures/[0-9a-f]{40}\.png$#', $cleanPath)) {
+                header('Cache-Control: public, max-age=31536000, immutable');
+            }
+
             // Gérer OPTIONS preflight
             if ($_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
                 http_response_code(204);
@@ -0,0 +1,307 @@
+"""
+ArchiMeuble - Écriture des modèles 3D au format glTF 2.0 binaire (GLB)
+
+Remplace l'export trimesh.Scene : les maillages sont écrits directement sous
+forme de tampons entrelacés (position float32, UV float32 ou couleur RGBA 8
+bits) et d'indices, sans copie de la scène ni ré-encodage des images. Les
+matériaux sont écrits tels quels et dédoublonnés par clé.
+
+Pas de normales : sans attribut NORMAL la spécification impose aux lecteurs
+des normales plates, ce qui est le rendu voulu pour des planches et évite de
+dupliquer les sommets à chaque arête.
+
+En option (pas_quantification), les positions sont écrites en int16 et les UV
+en uint16 normalisés (KHR_mesh_quantization) : avec un pas de taille du meuble
+/ 32767, l'erreur reste bien en dessous du millimètre.
+
+Les images sont intégrées au fichier, ou écrites à part (dossier_images) sous
+un nom tiré de leur contenu pour que le navigateur et le CDN les gardent en
+cache d'un modèle à l'autre.
+
+Le meuble est modélisé en millimètres : la conversion en mètres est portée par
+la transformation du noeud racine, les sommets ne sont jamais recopiés.
+
+    ecrivain = EcrivainGLB()
+    materiau = ecrivain.ajouter_materiau_texture(octets_png)
+    maillage = ecrivain.ajouter_maillage(positions, triangles, uvs=uvs, materiau=materiau)
+    ecrivain.ajouter_noeud("mesh_0", maillage, translation=decalage)
+    ecrivain.ecrire("meuble.glb", echelle=0.001)
+
+Les tampons ne dépendent pas des transformations des noeuds : après un premier
+ecrire(), deplacer_noeud() puis un second ecrire() produisent une autre variante
+du même meuble (tiroirs ouverts / fermés) sans reconstruire les maillages.
+"""
+
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC_GLB = 0x46546C67  # "glTF"
+CHUNK_JSON = 0x4E4F534A  # "JSON"
+CHUNK_BIN = 0x004E4942  # "BIN\0"
+
+FLOAT = 5126
+UNSIGNED_BYTE = 5121
+SHORT = 5122
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+TRIANGLES = 4
+
+# Rendu identique à l'ancien export trimesh (SimpleMaterial par défaut)
+FACTEUR_COULEUR_TEXTURE = [0.4, 0.4, 0.4, 1.0]
+RUGOSITE_TEXTURE = 0.9036020036098448
+
+
+def nombres_json(valeurs): # 9 chiffres significatifs suffisent aux transformations des noeuds (17 avec repr)
+    return [float(f"{float(v):.9g}") for v in valeurs]
+
+
+def ecrire_image_externe(dossier, octets_png, empreinte): # SORTIE nom du fichier, écrit une seule fois pour un contenu donné
+    nom = empreinte + ".png"
+    chemin = os.path.join(dossier, nom)
+    if not os.path.exists(chemin):
+        os.makedirs(dossier, exist_ok=True)
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        with open(temporaire, "wb") as fichier:
+            fichier.write(octets_png)
+        os.replace(temporaire, chemin) # un autre processus peut écrire la même image en même temps
+    return nom
+
+
+class EcrivainGLB: # accumule maillages, matériaux et noeuds puis écrit le fichier en une fois
+    def __init__(self, dossier_images=None, prefixe_uri_images="textures/", pas_quantification=None):
+        self.gltf = {
+            "asset": {"version": "2.0", "generator": "ArchiMeuble"},
+            "scene": 0,
+            "scenes": [{"nodes": []}],
+            "nodes": [],
+            "meshes": [],
+            "accessors": [],
+            "bufferViews": [],
+        }
+        self.morceaux = [] # données binaires, dans l'ordre du tampon
+        self.taille = 0
+        self.materiaux = {} # clé -> index du matériau
+        self.vues = {} # (empreinte, cible, stride) -> index de la bufferView (indices et sommets identiques écrits une fois)
+        self.accesseurs = {} # description -> index de l'accesseur
+        self.enfants = set() # noeuds rattachés à un autre noeud que la racine
+        # Images externes : écrites dans dossier_images et référencées par prefixe_uri_images + nom (relatif au GLB)
+        self.dossier_images = dossier_images
+        self.prefixe_uri_images = prefixe_uri_images
+        # KHR_mesh_quantization : positions en int16 avec un pas commun (mm) à tous les maillages ; les
+        # translations sont exprimées en pas et la racine porte l'échelle, aucun noeud n'a d'échelle en plus
+        self.pas = pas_quantification
+
+    def tampon(self, donnees, cible=None, stride=None): # ajoute une bufferView alignée sur 4 octets, partagée si déjà écrite
+        cle = (hashlib.sha1(donnees).digest(), cible, stride)
+        if cle in self.vues:
+            return self.vues[cle]
+        if self.taille % 4:
+            self.morceaux.append(b"\0" * (4 - self.taille % 4))
+            self.taille += 4 - self.taille % 4
+        vue = {"buffer": 0, "byteOffset": self.taille, "byteLength": len(donnees)}
+        if cible is not None:
+            vue["target"] = cible
+        if stride is not None:
+            vue["byteStride"] = stride
+        self.morceaux.append(donnees)
+        self.taille += len(donnees)
+        self.gltf["bufferViews"].append(vue)
+        self.vues[cle] = len(self.gltf["bufferViews"]) - 1
+        return self.vues[cle]
+
+    def accesseur(self, vue, type_composant, nombre, type, decalage=0, normalise=False, minimum=None, maximum=None):
+        accesseur = {"bufferView": vue, "byteOffset": decalage, "componentType": type_composant, "count": int(nombre), "type": type}
+        if normalise:
+            accesseur["normalized"] = True
+        if minimum is not None:
+            accesseur["min"] = [float(v) for v in minimum]
+            accesseur["max"] = [float(v) for v in maximum]
+        cle = json.dumps(accesseur, sort_keys=True)
+        if cle not in self.accesseurs:
+            self.gltf["accessors"].append(accesseur)
+            self.accesseurs[cle] = len(self.gltf["accessors"]) - 1
+        return self.accesseurs[cle]
+
+    def ajouter_materiau(self, cle, materiau): # matériau glTF déjà construit, partagé par clé
+        if cle not in self.materiaux:
+            self.gltf.setdefault("materials", []).append(materiau)
+            self.materiaux[cle] = len(self.gltf["materials"]) - 1
+        return self.materiaux[cle]
+
+    def ajouter_image(self, octets_png, empreinte): # SORTIE index de la texture glTF
+        if self.dossier_images is None:
+            image = {"bufferView": self.tampon(octets_png), "mimeType": "image/png"}
+        else:
+            image = {"uri": self.prefixe_uri_images + ecrire_image_externe(self.dossier_images, octets_png, empreinte), "mimeType": "image/png"}
+        self.gltf.setdefault("images", []).append(image)
+        self.gltf.setdefault("textures", []).append({"source": len(self.gltf["images"]) - 1})
+        return len(self.gltf["textures"]) - 1
+
+    def ajouter_materiau_texture(self, octets_png, empreinte=None): # matériau texturé, partagé par contenu d'image (sha1 hexadécimal des octets)
+        if empreinte is None:
+            empreinte = hashlib.sha1(octets_png).hexdigest()
+        if empreinte in self.materiaux:
+            return self.materiaux[empreinte]
+        texture = self.ajouter_image(octets_png, empreinte)
+        return self.ajouter_materiau(empreinte, {
+            "pbrMetallicRoughness": {
+                "baseColorTexture": {"index": texture},
+                "baseColorFactor": FACTEUR_COULEUR_TEXTURE,
+                "roughnessFactor": RUGOSITE_TEXTURE,
+            },
+            "doubleSided": False,
+        })
+
+    def ajouter_materiau_couleur(self, rgba): # matériau de couleur unie (RGBA 0-255), partagé par couleur
+        # Métal et rugosité par défaut, comme les maillages à couleurs par sommet sans matériau qu'il remplace
+        return self.ajouter_materiau(("couleur",) + tuple(int(c) for c in rgba), {
+            "pbrMetallicRoughness": {"baseColorFactor": [int(c) / 255 for c in rgba]},
+        })
+
+    def ajouter_maillage(self, positions, triangles, uvs=None, couleurs=None, materiau=None, nom=None):
+        """
+        Écrit un maillage triangulé : positions et UV (ou couleurs RGBA 8 bits)
+        entrelacés dans une seule bufferView, puis les indices.
+
+        Returns:
+            int: index du maillage glTF
+        """
+        triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+        if self.pas is not None:
+            quantifiees = np.round(np.asarray(positions, dtype=np.float64) / self.pas)
+            if len(quantifiees) and np.abs(quantifiees).max() > 32767:
+                raise ValueError("Maillage trop grand pour le pas de quantification")
+            champs = [("POSITION", quantifiees.astype(np.int16), SHORT, "VEC3", False)]
+        else:
+            champs = [("POSITION", np.asarray(positions, dtype=np.float32), FLOAT, "VEC3", False)]
+        if uvs is not None:
+            uvs = np.asarray(uvs, dtype=np.float64)
+            if self.pas is not None and uvs.min() >= 0 and uvs.max() <= 1: # UV normalisés sur 16 bits, sinon laissés en float
+                champs.append(("TEXCOORD_0", np.round(uvs * 65535).astype(np.uint16), UNSIGNED_SHORT, "VEC2", True))
+            else:
+                champs.append(("TEXCOORD_0", uvs.astype(np.float32), FLOAT, "VEC2", False))
+        elif couleurs is not None:
+            champs.append(("COLOR_0", np.asarray(couleurs, dtype=np.uint8), UNSIGNED_BYTE, "VEC4", True))
+
+        # Entrelacement : un enregistrement par sommet, chaque attribut aligné sur 4 octets
+        dtype = np.dtype([(nom_champ, valeurs.dtype, -(-valeurs.shape[1] * valeurs.itemsize // 4) * 4 // valeurs.itemsize) for nom_champ, valeurs, _, _, _ in champs])
+        sommets_entrelaces = np.zeros(len(champs[0][1]), dtype=dtype)
+        for nom_champ, valeurs, _, _, _ in champs:
+            sommets_entrelaces[nom_champ][:, :valeurs.shape[1]] = valeurs
+        vue = self.tampon(sommets_entrelaces.tobytes(), ARRAY_BUFFER, dtype.itemsize)
+
+        attributs = {}
+        for nom_champ, valeurs, type_composant, type, normalise in champs:
+            minimum = maximum = None
+            if nom_champ == "POSITION":
+                minimum, maximum = valeurs.min(axis=0), valeurs.max(axis=0)
+            attributs[nom_champ] = self.accesseur(vue, type_composant, len(valeurs), type, dtype.fields[nom_champ][1], normalise, minimum, maximum)
+
+        if len(sommets_entrelaces) < 65536:
+            indices, type_indices = triangles.astype(np.uint16), UNSIGNED_SHORT
+        else:
+            indices, type_indices = triangles.astype(np.uint32), UNSIGNED_INT
+        vue_indices = self.tampon(indices.tobytes(), ELEMENT_ARRAY_BUFFER)
+        primitive = {
+            "attributes": attributs,
+            "indices": self.accesseur(vue_indices, type_indices, indices.size, "SCALAR"),
+            "mode": TRIANGLES,
+        }
+        if materiau is not None:
+            primitive["material"] = materiau
+
+        maillage = {"primitives": [primitive]}
+        if nom is not None:
+            maillage["name"] = nom
+        self.gltf["meshes"].append(maillage)
+        return len(self.gltf["meshes"]) - 1
+
+    def ajouter_noeud(self, nom, maillage, translation=None, rotation=None, echelle=None, parent=None):
+        """
+        Ajoute un noeud (instance d'un maillage) enfant de la racine, ou d'un
+        autre noeud dont il suit alors les déplacements.
+
+        Args:
+            translation: en mm
+            rotation: quaternion (x, y, z, w)
+            echelle: facteurs par axe local
+        """
+        translation = self.unites(translation)
+        noeud = {"name": nom, "mesh": maillage}
+        for cle, valeur in (("translation", translation), ("rotation", rotation), ("scale", echelle)):
+            if valeur is not None:
+                noeud[cle] = nombres_json(valeur)
+        self.gltf["nodes"].append(noeud)
+        index = len(self.gltf["nodes"]) - 1
+        if parent is not None:
+            self.gltf["nodes"][parent].setdefault("children", []).append(index)
+            self.enfants.add(index)
+        return index
+
+    def unites(self, translation): # translation en mm -> unités des noeuds (pas de quantification s'il y en a un)
+        if translation is None or self.pas is None:
+            return translation
+        return np.asarray(translation, dtype=np.float64) / self.pas
+
+    def deplacer_noeud(self, noeud, translation): # change la translation d'un noeud entre deux écritures (None : position d'origine)
+        if translation is None:
+            self.gltf["nodes"][noeud].pop("translation", None)
+        else:
+            self.gltf["nodes"][noeud]["translation"] = nombres_json(self.unites(translation))
+
+    def ajouter_animation_translation(self, nom, deplacements, duree=1.0):
+        """
+        Animation glTF linéaire de translation : chaque noeud va de sa position
+        de départ à sa position d'arrivée (mm, repère de la racine) en `duree`
+        secondes. Les positions de tous les noeuds partagent une bufferView.
+
+        Args:
+            deplacements: liste de (index du noeud, translation de départ, translation d'arrivée)
+        """
+        temps = self.accesseur(self.tampon(np.array([0.0, duree], dtype=np.float32).tobytes()), FLOAT, 2, "SCALAR", minimum=[0.0], maximum=[duree])
+        positions = np.array([[self.unites(depart), self.unites(arrivee)] for _, depart, arrivee in deplacements], dtype=np.float32)
+        vue = self.tampon(positions.tobytes())
+        animation = {"name": nom, "samplers": [], "channels": []}
+        for k, (noeud, _, _) in enumerate(deplacements):
+            sortie = self.accesseur(vue, FLOAT, 2, "VEC3", decalage=k * 2 * 12)
+            animation["samplers"].append({"input": temps, "output": sortie, "interpolation": "LINEAR"})
+            animation["channels"].append({"sampler": k, "target": {"node": noeud, "path": "translation"}})
+        self.gltf.setdefault("animations", []).append(animation)
+        return len(self.gltf["animations"]) - 1
+
+    def ecrire(self, chemin, echelle=0.001): # ajoute la racine (mise à l'échelle) et écrit le GLB
+        gltf = dict(self.gltf)
+        enfants = [i for i in range(len(gltf["nodes"])) if i not in self.enfants]
+        if self.pas is not None:
+            echelle = echelle * self.pas
+        gltf["nodes"] = gltf["nodes"] + [{"name": "meuble", "scale": nombres_json([echelle] * 3), "children": enfants}]
+        gltf["scenes"] = [{"nodes": [len(gltf["nodes"]) - 1]}]
+        for cle in ("meshes", "accessors", "bufferViews"): # les tableaux vides sont interdits par la spécification
+            if not gltf[cle]:
+                del gltf[cle]
+        if self.pas is not None:
+            gltf["extensionsUsed"] = gltf["extensionsRequired"] = ["KHR_mesh_quantization"]
+        if self.taille:
+            gltf["buffers"] = [{"byteLength": self.taille + (-self.taille % 4)}]
+
+        texte = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+        texte += b" " * (-len(texte) % 4)
+        bourrage = b"\0" * (-self.taille % 4)
+        longueur = 12 + 8 + len(texte) + (8 + self.taille + len(bourrage) if self.taille else 0)
+
+        with open(chemin, "wb") as fichier:
+            fichier.write(struct.pack("<III", MAGIC_GLB, 2, longueur))
+            fichier.write(struct.pack("<II", len(texte), CHUNK_JSON))
+            fichier.write(texte)
+            if self.taille:
+                fichier.write(struct.pack("<II", self.taille + len(bourrage), CHUNK_BIN))
+                for morceau in self.morceaux:
+                    fichier.write(morceau)
+                fichier.write(bourrage)
+        return longueur
@@ -0,0 +1,406 @@
+"""
+ArchiMeuble - Grammaire des prompts de meubles
+
+Découpe un prompt (ex : M1(1700,500,730)EFH3(F,T,F)) en jetons en une seule
+passe, puis construit un arbre syntaxique typé que procedure_real.process
+parcourt pour modéliser le meuble.
+
+    sequence   := operation*
+    operation  := M chiffre ( nombre, ... )         primitive (zone de départ)
+                | (V|H|A) [I] [L] repartition [enfants]
+                | P [2|g|d|m|o|c] [poignée]         porte
+                | T [o] [poignée]                  tiroir
+                | S [2]                            socle
+                | C ( nom, nom, nom, nom )         textures
+                | N ( nom )                        nom de la zone
+                | E F R r h d g b a c D v p m      opérations simples
+    repartition := [ entier, ... ] | entier | (rien, deux enfants)
+    enfants    := ( sequence, sequence, ... )
+
+Les erreurs de syntaxe lèvent ErreurSyntaxe avec la position (0 = premier
+caractère du prompt).
+
+Compatibilité avec l'ancien parseur caractère par caractère : l'opération qui
+suit directement une division V/H/A (sauf A(...,...)) n'était jamais exécutée.
+Elle est gardée dans l'arbre (Division.ignoree) mais process ne l'applique pas,
+pour que les prompts existants (ex : HI4(T,T,T,T)RRdg) donnent le même meuble.
+"""
+
+CHIFFRES = "0123456789"
+SYMBOLES = "()[],"
+OPERATIONS_SIMPLES = "EFRrhdgbacDvpm"
+VARIANTES_PORTE = "gdmoc"
+NOMBRE_VALEURS_PRIMITIVE = {0: 6, 1: 3, 2: 4, 3: 4, 4: 4, 5: 3}
+AXES = {"V": "verticale", "H": "horizontale", "A": "avant"}
+
+
+class ErreurSyntaxe(ValueError):
+    def __init__(self, message, position, sequence=None):
+        self.message = message
+        self.position = position
+        self.sequence = sequence
+        texte = f"{message} (position {position})"
+        if sequence is not None:
+            debut = max(0, position - 20)
+            texte += f" : {'...' if debut else ''}{sequence[debut:position]}>>{sequence[position:position + 20]}"
+        super().__init__(texte)
+
+
+class Jeton:
+    def __init__(self, type, valeur, position):
+        self.type = type  # "lettre", "nombre", "texte", un symbole de SYMBOLES ou "fin"
+        self.valeur = valeur
+        self.position = position
+
+    def __repr__(self):
+        return f"Jeton({self.type}, {self.valeur!r}, {self.position})"
+
+
+def tokeniser(sequence): # ENTREE un prompt SORTIE la liste des jetons, terminée par un jeton "fin"
+    jetons = []
+    n = len(sequence)
+    i = 0
+    while i < n:
+        char = sequence[i]
+        if char.isspace():
+            i += 1
+        elif char in CHIFFRES:
+            debut = i
+            while i < n and sequence[i] in CHIFFRES:
+                i += 1
+            if i + 1 < n and sequence[i] == "." and sequence[i + 1] in CHIFFRES:
+                i += 1
+                while i < n and sequence[i] in CHIFFRES:
+                    i += 1
+            jetons.append(Jeton("nombre", sequence[debut:i], debut))
+        elif char.isascii() and char.isalpha():
+            jetons.append(Jeton("lettre", char, i))
+            i += 1
+            if char in "CN" and i < n and sequence[i] == "(": # noms de textures / de zone : texte brut jusqu'à ")"
+                fin = sequence.find(")", i)
+                if fin == -1:
+                    raise ErreurSyntaxe("')' attendu", n, sequence)
+                jetons.append(Jeton("(", "(", i))
+                debut = i + 1
+                for morceau in sequence[debut:fin].split(","):
+                    if debut > i + 1:
+                        jetons.append(Jeton(",", ",", debut - 1))
+                    jetons.append(Jeton("texte", morceau, debut))
+                    debut += len(morceau) + 1
+                jetons.append(Jeton(")", ")", fin))
+                i = fin + 1
+        elif char in SYMBOLES:
+            jetons.append(Jeton(char, char, i))
+            i += 1
+        else:
+            raise ErreurSyntaxe(f"caractère inattendu {char!r}", i, sequence)
+    jetons.append(Jeton("fin", "", n))
+    return jetons
+
+
+# %%
+# arbre syntaxique
+
+class Sequence: # suite d'opérations appliquées à une même zone
+    def __init__(self, operations, position):
+        self.operations = operations
+        self.position = position
+
+    def __repr__(self):
+        return f"Sequence({self.operations})"
+
+
+class Noeud: # opération du prompt, lettre = caractère de commande
+    def __init__(self, lettre, position):
+        self.lettre = lettre
+        self.position = position
+
+    def __repr__(self):
+        return self.lettre
+
+
+class Primitive(Noeud): # M0 à M5 : création de la zone de départ
+    def __init__(self, numero, valeurs, position):
+        super().__init__("M", position)
+        self.numero = numero
+        self.valeurs = valeurs
+
+    def __repr__(self):
+        return f"M{self.numero}({','.join(str(v) for v in self.valeurs)})"
+
+
+class Operation(Noeud): # opération sans paramètre (E, F, h, d, g, b, ...)
+    pass
+
+
+class Division(Noeud): # V, H ou A : séparation en sous-zones
+    def __init__(self, lettre, invisible, mode, valeurs, nombre, enfants, position):
+        super().__init__(lettre, position)
+        self.invisible = invisible # I : pas de planche de séparation
+        self.mode = mode # "proportions" ou "longueurs" (L)
+        self.valeurs = valeurs # [proportions ou longueurs] ou None
+        self.nombre = nombre # n parts égales ou None
+        self.enfants = enfants # liste de Sequence (une par sous-zone) ou None
+        self.ignoree = None # opération suivante, non exécutée (voir l'en-tête du module)
+
+    @property
+    def axe(self):
+        return AXES[self.lettre]
+
+    @property
+    def masque_suivante(self): # l'ancien parseur sautait le caractère suivant, sauf après A(...,...)
+        return not (self.lettre == "A" and self.valeurs is None and self.nombre is None)
+
+    @property
+    def nombre_zones(self):
+        if self.valeurs is not None:
+            return len(self.valeurs) + (1 if self.mode == "longueurs" else 0)
+        if self.nombre is not None:
+            return self.nombre
+        return 2
+
+    def __repr__(self):
+        texte = self.lettre + ("I" if self.invisible else "") + ("L" if self.mode == "longueurs" else "")
+        if self.valeurs is not None:
+            texte += "[" + ",".join(str(v) for v in self.valeurs) + "]"
+        elif self.nombre is not None:
+            texte += str(self.nombre)
+        if self.enfants is not None:
+            texte += "(" + ",".join("".join(repr(op) for op in enfant.operations) for enfant in self.enfants) + ")"
+        if self.ignoree is not None:
+            texte += repr(self.ignoree)
+        return texte
+
+
+class Porte(Noeud): # P : variante "" (simple), "2", "g", "d", "m" (miroir), "o" (push), "c" (coulissante)
+    def __init__(self, variante, poignee, position):
+        super().__init__("P", position)
+        self.variante = variante
+        self.poignee = poignee
+
+    def __repr__(self):
+        return "P" + self.variante + (str(self.poignee) if self.poignee is not None else "")
+
+
+class Tiroir(Noeud): # T : push = To (push to open)
+    def __init__(self, push, poignee, position):
+        super().__init__("T", position)
+        self.push = push
+        self.poignee = poignee
+
+    def __repr__(self):
+        return "T" + ("o" if self.push else "") + (str(self.poignee) if self.poignee is not None else "")
+
+
+class Socle(Noeud): # S : double = S2 (planche de fond en plus)
+    def __init__(self, double, position):
+        super().__init__("S", position)
+        self.double = double
+
+    def __repr__(self):
+        return "S2" if self.double else "S"
+
+
+class Couleurs(Noeud): # C(exterieur,interieur,porte,tiroir) : noms de textures du catalogue
+    def __init__(self, noms, position):
+        super().__init__("C", position)
+        self.noms = noms
+
+    def __repr__(self):
+        return "C(" + ",".join(self.noms) + ")"
+
+
+class Nom(Noeud): # N(nom) : nomme la zone courante
+    def __init__(self, nom, position):
+        super().__init__("N", position)
+        self.nom = nom
+
+    def __repr__(self):
+        return f"N({self.nom})"
+
+
+# %%
+# analyseur
+
+class Analyseur:
+    def __init__(self, sequence):
+        self.sequence = sequence
+        self.jetons = tokeniser(sequence)
+        self.index = 0
+
+    def courant(self):
+        return self.jetons[self.index]
+
+    def avancer(self):
+        jeton = self.jetons[self.index]
+        self.index += 1
+        return jeton
+
+    def erreur(self, message, jeton=None):
+        jeton = jeton or self.courant()
+        return ErreurSyntaxe(message, jeton.position, self.sequence)
+
+    def attendre(self, type):
+        if self.courant().type != type:
+            raise self.erreur(f"{type!r} attendu")
+        return self.avancer()
+
+    def est_lettre(self, lettres):
+        jeton = self.courant()
+        return jeton.type == "lettre" and jeton.valeur in lettres
+
+    def analyser(self):
+        sequence = self.lire_sequence()
+        if self.courant().type != "fin":
+            raise self.erreur(f"{self.courant().valeur!r} inattendu")
+        return sequence
+
+    def lire_sequence(self):
+        position = self.courant().position
+        operations = []
+        while self.courant().type == "lettre":
+            operation = self.lire_operation()
+            operations.append(operation)
+            if isinstance(operation, Division) and operation.masque_suivante and self.courant().type == "lettre":
+                operation.ignoree = self.lire_operation()
+        return Sequence(operations, position)
+
+    def lire_operation(self):
+        jeton = self.avancer()
+        lettre = jeton.valeur
+        if lettre == "M":
+            return self.lire_primitive(jeton)
+        if lettre in AXES:
+            return self.lire_division(jeton)
+        if lettre == "P":
+            return self.lire_porte(jeton)
+        if lettre == "T":
+            push = self.est_lettre("o")
+            if push:
+                self.avancer()
+            return Tiroir(push, self.lire_poignee(), jeton.position)
+        if lettre == "S":
+            double = self.courant().type == "nombre" and self.courant().valeur == "2"
+            if double:
+                self.avancer()
+            return Socle(double, jeton.position)
+        if lettre == "C":
+            noms = self.lire_textes()
+            if len(noms) != 4:
+                raise self.erreur("C attend 4 textures (exterieur, interieur, porte, tiroir)", jeton)
+            return Couleurs(noms, jeton.position)
+        if lettre == "N":
+            noms = self.lire_textes()
+            if len(noms) != 1:
+                raise self.erreur("N attend un seul nom", jeton)
+            return Nom(noms[0], jeton.position)
+        if lettre in OPERATIONS_SIMPLES:
+            return Operation(lettre, jeton.position)
+        raise self.erreur(f"opération inconnue {lettre!r}", jeton)
+
+    def lire_nombre(self, entier=False):
+        jeton = self.courant()
+        if jeton.type != "nombre" or (entier and "." in jeton.valeur):
+            raise self.erreur("entier attendu" if entier else "nombre attendu")
+        self.avancer()
+        return float(jeton.valeur) if "." in jeton.valeur else int(jeton.valeur)
+
+    def lire_primitive(self, jeton):
+        chiffre = self.courant()
+        if chiffre.type != "nombre" or chiffre.valeur not in ("0", "1", "2", "3", "4", "5"):
+            raise self.erreur("M doit être suivi d'un chiffre de 0 à 5")
+        self.avancer()
+        numero = int(chiffre.valeur)
+        self.attendre("(")
+        valeurs = [self.lire_nombre()]
+        while self.courant().type == ",":
+            self.avancer()
+            valeurs.append(self.lire_nombre())
+        self.attendre(")")
+        if len(valeurs) != NOMBRE_VALEURS_PRIMITIVE[numero]:
+            raise self.erreur(f"M{numero} attend {NOMBRE_VALEURS_PRIMITIVE[numero]} valeurs, {len(valeurs)} données", jeton)
+        return Primitive(numero, valeurs, jeton.position)
+
+    def lire_division(self, jeton):
+        invisible = self.est_lettre("I")
+        if invisible:
+            self.avancer()
+        mode = "proportions"
+        if self.est_lettre("L"):
+            self.avancer()
+            mode = "longueurs"
+
+        valeurs = None
+        nombre = None
+        if self.courant().type == "[":
+            self.avancer()
+            valeurs = [self.lire_nombre(entier=True)]
+            while self.courant().type == ",":
+                self.avancer()
+                valeurs.append(self.lire_nombre(entier=True))
+            self.attendre("]")
+        elif self.courant().type == "nombre":
+            nombre = self.lire_nombre(entier=True)
+            if nombre < 1:
+                raise self.erreur("le nombre de parts doit être au moins 1", self.jetons[self.index - 1])
+        elif self.courant().type != "(":
+            raise self.erreur(f"'(', '[' ou un nombre attendu après {jeton.valeur}")
+
+        division = Division(jeton.valeur, invisible, mode, valeurs, nombre, None, jeton.position)
+        if self.courant().type == "(":
+            division.enfants = self.lire_enfants(division.nombre_zones, exact=valeurs is None and nombre is None)
+        return division
+
+    def lire_enfants(self, nombre_zones, exact=False):
+        ouvrante = self.attendre("(")
+        enfants = []
+        while True:
+            if len(enfants) == nombre_zones:
+                raise self.erreur(f"trop de sous-zones : {nombre_zones} attendues")
+            enfants.append(self.lire_sequence())
+            if self.courant().type == ",":
+                self.avancer()
+            else:
+                break
+        self.attendre(")")
+        if exact and len(enfants) != nombre_zones:
+            raise self.erreur(f"{nombre_zones} sous-zones attendues, {len(enfants)} données", ouvrante)
+        return enfants
+
+    def lire_porte(self, jeton):
+        variante = ""
+        suivant = self.courant()
+        if suivant.type == "nombre" and suivant.valeur[0] == "2":
+            # P2 et P2<poignée> arrivent dans le même jeton nombre
+            if len(suivant.valeur) > 2 or "." in suivant.valeur:
+                raise self.erreur("type de poignée invalide", suivant)
+            self.avancer()
+            poignee = int(suivant.valeur[1]) if len(suivant.valeur) == 2 else None
+            return Porte("2", poignee, jeton.position)
+        if suivant.type == "lettre" and suivant.valeur in VARIANTES_PORTE:
+            self.avancer()
+            variante = suivant.valeur
+        poignee = self.lire_poignee() if variante in ("g", "d", "m") else None
+        return Porte(variante, poignee, jeton.position)
+
+    def lire_poignee(self): # chiffre optionnel après P2, Pg, Pd, Pm, T, To
+        jeton = self.courant()
+        if jeton.type != "nombre":
+            return None
+        if len(jeton.valeur) != 1:
+            raise self.erreur("type de poignée invalide")
+        self.avancer()
+        return int(jeton.valeur)
+
+    def lire_textes(self):
+        self.attendre("(")
+        textes = [self.attendre("texte").valeur]
+        while self.courant().type == ",":
+            self.avancer()
+            textes.append(self.attendre("texte").valeur)
+        self.attendre(")")
+        return textes
+
+
+def analyser(sequence): # ENTREE un prompt SORTIE l'arbre syntaxique (Sequence)
+    return Analyseur(sequence).analyser()
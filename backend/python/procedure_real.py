@@ -1,14 +1,20 @@
 # %%
 #imports 
 import numpy as np # numpy pour le calcul vectoriel 
-import pyvista as pv # pyvista bibliothèque intermédiaire pour la 3D
 from copy import deepcopy,copy # copy pour gerer les copy profonde des objets mutables
+from collections import namedtuple # gabarits d'alésage immuables
 import trimesh # trimesh : librairy 3D principale
 import sys # system
 import ezdxf # edition de fichiers dxf 
 from PIL import Image, ImageDraw, ImageFont # gestion des images (textures)
 import svgwrite # édition de fichiers svg
 import json # json : gestion de données 
+import os # chemins des textures et des fichiers de sortie
+import time # mesure des temps de chaque étape
+from grammaire import analyser, ErreurSyntaxe # tokenizer et arbre syntaxique des prompts
+from ecriture_glb import EcrivainGLB # écriture directe des fichiers GLB
+import io # encodage des images en mémoire
+import hashlib # empreinte des images de texture
 
 
 
@@ -102,6 +108,26 @@ def line_plane_intersection(P1, P2, plane): #ENTREE deux points (definisant une
     intersection = P1 + t * direction
     return intersection
 
+def segments_plane_intersections(P1, P2, plane): # version vectorisée de line_plane_intersection pour N segments
+    """
+    Calculate the intersection points between N lines and a plane.
+
+    Parameters:
+    - P1 (np.ndarray): Nx3 first points of the lines.
+    - P2 (np.ndarray): Nx3 second points of the lines.
+    - plane (np.ndarray): The plane equation [a, b, c, d].
+
+    Returns:
+    - np.ndarray: Nx3 intersection points (the lines must not be parallel to the plane).
+    """
+    a, b, c, d = plane
+    direction = P2 - P1
+    # mêmes opérations, dans le même ordre, que line_plane_intersection : résultats identiques au bit près
+    denominator = a * direction[:, 0] + b * direction[:, 1] + c * direction[:, 2]
+    numerator = -(a * P1[:, 0] + b * P1[:, 1] + c * P1[:, 2] + d)
+    t = numerator / denominator
+    return P1 + t[:, None] * direction
+
 def reconstruct_contour(segments): #ENTREE liste de couples d'indices SORTIE contour formée par les segments en fermant le contour
 
     # Étape 1 : Normaliser les segments (trier les sommets dans chaque segment)
@@ -199,6 +225,53 @@ def perpendicular_unit_vectors(normal): #ENTREE un vecteur 3D SORTIE deux vecteu
 
     return u1, u2
 
+def trianguler_polygone(points, contour, normale): # ENTREE points 3D, contour d'une face plane et sa normale sortante SORTIE triangles (indices des points) orientés selon la normale
+    contour = np.asarray(contour)
+    n = len(contour)
+    if n < 3:
+        return np.empty((0, 3), dtype=int)
+    polygone = points[contour]
+
+    # Sens du contour : aire orientée (formule de Newell) comparée à la normale de la face
+    aire = np.cross(polygone, np.roll(polygone, -1, axis=0)).sum(axis=0)
+    if np.dot(aire, normale) < 0:
+        contour = contour[::-1]
+        polygone = polygone[::-1]
+
+    # Faces convexes (cas général) : triangulation en éventail depuis le premier sommet
+    aretes = np.roll(polygone, -1, axis=0) - polygone
+    virages = np.cross(aretes, np.roll(aretes, -1, axis=0)) @ normale
+    tolerance = 1e-9 * np.max(np.sum(aretes**2, axis=1))
+    if np.all(virages >= -tolerance):
+        return np.column_stack([np.full(n - 2, contour[0]), contour[1:-1], contour[2:]])
+
+    # Sinon découpage en oreilles dans le plan de la face (u, v, normale forment un repère direct)
+    u, v = perpendicular_unit_vectors(normale)
+    xy = np.column_stack((polygone @ u, polygone @ v))
+    restants = list(range(n))
+    triangles = []
+    while len(restants) > 3:
+        for k in range(len(restants)):
+            a, b, c = restants[k - 1], restants[k], restants[(k + 1) % len(restants)]
+            ab, bc = xy[b] - xy[a], xy[c] - xy[b]
+            if ab[0] * bc[1] - ab[1] * bc[0] <= tolerance: # sommet rentrant ou aligné
+                continue
+            autres = [i for i in restants if i not in (a, b, c)]
+            if autres and np.any(point_dans_triangle(xy[autres], xy[a], xy[b], xy[c])):
+                continue
+            triangles.append((a, b, c))
+            del restants[k]
+            break
+        else: # polygone dégénéré : on garde l'éventail sur ce qui reste
+            break
+    triangles += [(restants[0], restants[i], restants[i + 1]) for i in range(1, len(restants) - 1)]
+    return contour[np.array(triangles)]
+
+def point_dans_triangle(p, a, b, c): # ENTREE points 2D (N,2) et un triangle direct SORTIE booléens, True si le point est dans le triangle (bords compris)
+    def cote(p1, p2):
+        return (p2[0] - p1[0]) * (p[:, 1] - p1[1]) - (p2[1] - p1[1]) * (p[:, 0] - p1[0])
+    return (cote(a, b) >= 0) & (cote(b, c) >= 0) & (cote(c, a) >= 0)
+
 def create_number_image(number, image_size=(500, 500), font_size=100, 
                         
             background_color=(255, 255, 255), text_color=(0, 0, 0)): #creer une image avec du texte
@@ -239,12 +312,13 @@ def create_number_image(number, image_size=(500, 500), font_size=100,
     
     return image
 
-def sectionner_par_texture(planches):
+def sectionner_par_texture(planches, textures_dict):
     """
     Groupe les planches par texture pour la génération du DXF.
 
     Parameters:
     planches (list): Liste des objets Planche
+    textures_dict (dict): Catalogue des textures (nom -> Texture)
 
     Returns:
     list: Liste de listes de planches groupées par texture
@@ -255,9 +329,7 @@ def sectionner_par_texture(planches):
         if not getattr(planche, 'planche', False) or not getattr(planche, 'texture', None):
             continue
             
-        texture_obj = planche.texture
-        if isinstance(texture_obj, str):
-            texture_obj = textures_dict.get(texture_obj, textures_dict.get("Blanc Premium"))
+        texture_obj = resoudre_texture(planche.texture, textures_dict)
         
         texture_name = texture_obj.nom if texture_obj else "Inconnu"
             
@@ -321,38 +393,103 @@ class Texture:
     def __repr__(self):
         return f"Texture({self.nom}, {self.ref}, {self.epaisseur}mm, {self.longueur}x{self.largeur}, {self.prix_m2_ht}/m2)"
 
-# Charger les données JSON depuis un fichier local
-import os
-script_dir = os.path.dirname(os.path.abspath(__file__))
-json_file = os.path.join(script_dir, "textures", "panneau.json")
-
-try:
-    with open(json_file, "r", encoding="utf-8") as file:
-        json_data = json.load(file)
-        data = json_data.get("panneaux", [])
-except FileNotFoundError:
-    print(f"Erreur : le fichier {json_file} est introuvable.")
-    data = []
-except json.JSONDecodeError as e:
-    print(f"Erreur de décodage JSON : {e}")
-    data = []
-except Exception as e:
-    print(f"Autre erreur : {e}")
-    data = []
-
+def dossier_script(): # dossier contenant ce fichier (textures/, pieces/)
+    return os.path.dirname(os.path.abspath(__file__))
 
+def charger_textures(json_file=None): # ENTREE chemin du catalogue panneau.json SORTIE dictionnaire nom -> Texture
+    """
+    Charge le catalogue des panneaux depuis un fichier JSON.
 
-# Créer un dictionnaire pour stocker les textures avec des variables dynamiques
-textures_dict = {}
+    Parameters:
+    json_file (str): chemin du fichier, par défaut textures/panneau.json à côté de ce script.
 
-for item in data:
-    #var_name = item["nom"].lower().replace(" ", "_")  # Normaliser le nom pour en faire une variable
-    var_name = item["nom"]
-    textures_dict[var_name] = Texture(**item)
+    Returns:
+    dict: dictionnaire {nom: Texture}
+    """
+    if json_file is None:
+        json_file = os.path.join(dossier_script(), "textures", "panneau.json")
 
-# Afficher les textures chargées
-for name, texture in textures_dict.items():
-    print(f"{name} = {texture}")
+    try:
+        with open(json_file, "r", encoding="utf-8") as file:
+            json_data = json.load(file)
+            data = json_data.get("panneaux", [])
+    except FileNotFoundError:
+        print(f"Erreur : le fichier {json_file} est introuvable.")
+        data = []
+    except json.JSONDecodeError as e:
+        print(f"Erreur de décodage JSON : {e}")
+        data = []
+    except Exception as e:
+        print(f"Autre erreur : {e}")
+        data = []
+
+    # Créer un dictionnaire pour stocker les textures
+    textures_dict = {}
+
+    for item in data:
+        #var_name = item["nom"].lower().replace(" ", "_")  # Normaliser le nom pour en faire une variable
+        var_name = item["nom"]
+        textures_dict[var_name] = Texture(**item)
+
+    # Afficher les textures chargées
+    for name, texture in textures_dict.items():
+        print(f"{name} = {texture}")
+
+    return textures_dict
+
+def resoudre_texture(texture, textures_dict): # les planches techniques gardent un nom de texture ("blanc") : on retombe sur le Blanc Premium
+    if isinstance(texture, str):
+        return textures_dict.get(texture, textures_dict.get("Blanc Premium"))
+    return texture
+
+def textures_par_defaut(textures_dict): # textures utilisées par process tant qu'aucune commande C ne les change
+    return {"exterieur": textures_dict["Blanc Premium"],"interieur": textures_dict["Blanc Premium"],"porte": textures_dict["Chêne Brun"],"tiroir": textures_dict["Chêne Brun"]}
+
+class CacheTextures: # images des textures lues et décodées une fois par processus, partagées par toutes les planches et les requêtes
+    def __init__(self):
+        self.images = {} # chemin -> (date de modification, image décodée, octets PNG, empreinte des octets)
+        self.par_image = {} # id(image) -> chemin
+        self.couleurs = {} # chemin -> (date de modification, couleur moyenne RGBA) pour l'aperçu
+
+    def charger(self, chemin): # relit le fichier seulement s'il a changé
+        date = os.path.getmtime(chemin)
+        entree = self.images.get(chemin)
+        if entree is None or entree[0] != date:
+            with open(chemin, "rb") as fichier:
+                octets = fichier.read()
+            image = Image.open(io.BytesIO(octets))
+            image.load()
+            if not octets.startswith(b"\x89PNG"):
+                octets = encoder_png(image)
+            if entree is not None:
+                del self.par_image[id(entree[1])]
+            entree = self.images[chemin] = (date, image, octets, hashlib.sha1(octets).hexdigest())
+            self.par_image[id(image)] = chemin
+        return entree
+
+    def image(self, chemin):
+        return self.charger(chemin)[1]
+
+    def couleur_moyenne(self, chemin): # SORTIE couleur RGBA moyenne de l'image, calculée une fois par fichier
+        date, image = self.charger(chemin)[:2]
+        entree = self.couleurs.get(chemin)
+        if entree is None or entree[0] != date:
+            r, g, b = image.convert("RGB").resize((1, 1), Image.BOX).getpixel((0, 0))
+            entree = self.couleurs[chemin] = (date, [r, g, b, 255])
+        return entree[1]
+
+    def png(self, image): # (octets PNG, empreinte) d'une image du cache, None si elle n'en vient pas
+        chemin = self.par_image.get(id(image))
+        if chemin is None or self.images[chemin][1] is not image:
+            return None
+        return self.images[chemin][2:]
+
+def encoder_png(image): # encode une image PIL en PNG
+    tampon = io.BytesIO()
+    image.save(tampon, format="PNG")
+    return tampon.getvalue()
+
+cache_textures = CacheTextures() # partagé par toutes les générations d'un même processus (serveur_generation)
 
 
 
@@ -362,6 +499,8 @@ for name, texture in textures_dict.items():
 # Les classes de cette partie permettent la represenation des objets utilisé dans un meuble 
 
 class Alesage: # l'objet alésage défini en totalité les caractéistique d'un alésage dans une planche 
+    __slots__ = ("positionxyz", "type", "rayon", "profondeur", "positionsnu", "face_usinage", "distance_au_coin", "couleur")
+
     def __init__(
     self,
     positionsnu=np.array([0,0,0]), #position dans le repère s(segment qui coupe le chant en 2) n (normale au chant) u (normale à la face usinage)
@@ -385,6 +524,33 @@ class Alesage: # l'objet alésage défini en totalité les caractéistique d'un
         print("positionxyz",self.positionxyz)
         print("positionsnu",self.positionsnu)
         print("rayon", self.rayon)
+
+# Alésages d'une planche rangés en colonnes (Zone.tableau_alesages), une ligne par trou : placer_alesages les écrit
+# par lots, le DXF et le prix les lisent sans passer par des objets Alesage
+DTYPE_ALESAGES = np.dtype([
+    ("position", float, 3), # centre dans l'espace du meuble
+    ("rayon", float),
+    ("profondeur", float),
+    ("face_usinage", "U5"), # "chant" ou "plat"
+    ("couleur", "U16"), # couleur de la représentation en svg
+    ("calque", "U24"), # calque DXF du diamètre
+    ("index_face", np.int32), # face de la planche qui porte l'alésage (index dans listface, -1 : face_usine copiée hors de listface)
+])
+
+def calque_diametre(rayon): # nom du calque DXF des alésages d'un rayon donné ("diam_6mm", "diam_5.0mm")
+    return f"diam_{round(2 * rayon, 1)}mm"
+
+def tableau_alesages(alesages, index_face): # ENTREE objets Alesage d'une face SORTIE leurs lignes DTYPE_ALESAGES
+    tableau = np.zeros(len(alesages), dtype=DTYPE_ALESAGES)
+    if len(alesages):
+        tableau["position"] = [alesage.positionxyz for alesage in alesages]
+        tableau["rayon"] = [alesage.rayon for alesage in alesages]
+        tableau["profondeur"] = [alesage.profondeur for alesage in alesages]
+        tableau["face_usinage"] = [alesage.face_usinage for alesage in alesages]
+        tableau["couleur"] = [alesage.couleur for alesage in alesages]
+        tableau["calque"] = [calque_diametre(alesage.rayon) for alesage in alesages]
+        tableau["index_face"] = index_face
+    return tableau
         
 
 class Face: #l'objet face défini une face plane polygonale appartenant à une zone 
@@ -416,6 +582,7 @@ class Face: #l'objet face défini une face plane polygonale appartenant à une z
         self.faceoppose=faceoppose
         self.zone=zone
         self.facesupport=facesupport
+        self.racine=self if facesupport is None else facesupport.racine # face d'origine de la filiation, tenue à jour à chaque découpe
         self.chant=chant
         
     def segments(self): # donne une représenation du contour par les segements qui le copmpose 
@@ -433,12 +600,151 @@ class Face: #l'objet face défini une face plane polygonale appartenant à une z
         print(f"facesupport: {self.facesupport}")
         print(f"zone: {self.zone}")
     def remonter_facesupport(self): #remonte la filiation des faces support ( mère, grand mère, etc) jusqu'a la face d'origine 
+        # self.racine donne le même résultat sans parcours ; la remontée sert à le recalculer sur les copies (MemoSequences)
         # Condition d'arrêt : Si facesupport est None, on renvoie l'objet actuel
         if self.facesupport is None :   
             return self 
         else:
             return self.facesupport.remonter_facesupport()
 
+def labels_decoupe(label): # labels des deux faces créées par une découpe (côté plus, côté moins)
+    if label=="verticale":
+        return "d","g"
+    elif label=="horizontale":
+        return "h","b"
+    elif label=="avant":
+        return "a","f"
+    elif label =="d" :
+        return "g","d"
+    elif label =="g" :
+        return "d","g"
+    elif label =="b" :
+        return "h","b"
+    elif label =="h" :
+        return "b","h"
+    elif label =="a" :
+        return "f","a"
+    elif label =="f" :
+        return "a","f"
+    return label,label
+
+class GabaritDecoupe: # topologie d'une découpe de zone par un plan, indépendante des coordonnées
+    # coupes : segments coupés par le plan, leurs points d'intersection sont ajoutés à la fin des points dans cet ordre
+    # plus, moins : (index des points conservés, [(indice de la face mère ou -1 pour la face de clippage, contour, chant), ...])
+    def __init__(self,contours,nombre_points,boolean):
+
+        # contruction des segments : segments uniques (triés) et, pour chaque face, l'index de ses segments
+        segments_faces=[np.column_stack((contour, np.roll(contour, -1))) for contour in contours]
+        debuts=np.cumsum([0]+[len(segments_face) for segments_face in segments_faces])
+        segments=np.sort(np.vstack(segments_faces),axis=1)
+        segments,inverse=np.unique(segments,axis=0,return_inverse=True)
+        inverse=inverse.reshape(-1)
+
+        # classement de tous les segments en une passe : entièrement du côté +, du côté - ou coupés
+        cote0=boolean[segments[:,0]]
+        cote1=boolean[segments[:,1]]
+        coupes=np.flatnonzero(cote0!=cote1)
+        segment_plus=segments.copy()
+        segment_moins=segments.copy()
+        segment_moins[cote0&cote1]=-1
+        segment_plus[~cote0&~cote1]=-1
+
+        newindex=nombre_points+np.arange(len(coupes))
+        plus_premier=cote0[coupes]
+        segment_plus[coupes]=np.column_stack([np.where(plus_premier,segments[coupes,0],segments[coupes,1]),newindex])
+        segment_moins[coupes]=np.column_stack([np.where(plus_premier,segments[coupes,1],segments[coupes,0]),newindex])
+        self.coupes=segments[coupes]
+
+        #reconstitution des faces 
+        faces_plus=[]
+        faces_moins=[]
+        for i,contour in enumerate(contours) :
+            if np.all(boolean[contour]) :
+                faces_plus.append((i,contour,False))
+            elif np.all(~boolean[contour]) :
+                faces_moins.append((i,contour,False))
+            else : 
+                index_face=np.unique(inverse[debuts[i]:debuts[i+1]]) # segments de la face, dans l'ordre des segments uniques
+                faces_plus.append((i,reconstruct_contour(segment_plus[index_face]),True))
+                faces_moins.append((i,reconstruct_contour(segment_moins[index_face]),True))
+
+        # Reconstitution de la face de clippage : segments n'appartenant qu'à une seule face côté plus
+        segments=np.vstack([np.column_stack((contour, np.roll(contour, -1))) for _,contour,_ in faces_plus])
+        segments=np.sort(segments,axis=1)
+        unique, counts = np.unique(segments, axis=0, return_counts=True)
+        contour=reconstruct_contour(unique[counts == 1])
+        faces_plus.append((-1,contour,False))
+        faces_moins.append((-1,contour,False))
+
+        self.plus=self.nettoyer(faces_plus)
+        self.moins=self.nettoyer(faces_moins)
+
+    @staticmethod
+    def nettoyer(faces): # équivalent de Zone.clear : ne garde que les points utilisés et renumérote les contours
+        index_utilises=np.unique(np.hstack([contour for _,contour,_ in faces]))
+        return index_utilises,[(i,np.searchsorted(index_utilises,contour),chant) for i,contour,chant in faces]
+
+gabarits_decoupe={} # (nombre de points, côtés des points, contours) -> GabaritDecoupe
+TAILLE_MAX_GABARITS=4096
+
+def gabarit_decoupe(contours,nombre_points,boolean): # gabarit de découpe, calculé une seule fois par topologie
+    cle=(nombre_points,boolean.tobytes(),tuple(tuple(contour.tolist()) for contour in contours))
+    gabarit=gabarits_decoupe.get(cle)
+    if gabarit is None :
+        gabarit=GabaritDecoupe(contours,nombre_points,boolean)
+        if len(gabarits_decoupe)>=TAILLE_MAX_GABARITS :
+            gabarits_decoupe.clear()
+        gabarits_decoupe[cle]=gabarit
+    return gabarit
+
+class GabaritTranches: # topologie d'une découpe de zone par k plans parallèles en k+1 tranches, en une seule passe
+    # composition des gabarits de découpe des clip successifs sur le reste (plus) : mêmes points, contours et orientations
+    # coupes : pour chaque plan, (point a, point b) des intersections ajoutées à la fin des points dans cet ordre,
+    #          indexés dans les points complétés par les intersections des plans précédents
+    # tranches : pour chaque tranche (index des points conservés, [(indice de la face mère ou -1, plan, contour, chant), ...])
+    # les faces d'une tranche sont dans l'ordre des clip successifs : morceaux des faces mères, face du plan du dessous, face du plan du dessus
+    def __init__(self,contours,nombre_points,tranches_points,nombre_plans):
+        origines=np.arange(nombre_points) # index de chaque point du reste dans les points complétés
+        tranches_reste=tranches_points
+        faces=[(i,-1,contour,False) for i,contour in enumerate(contours)]
+        total=nombre_points
+        self.coupes=[]
+        self.tranches=[]
+        for plan in range(nombre_plans) :
+            gabarit=gabarit_decoupe([contour for _,_,contour,_ in faces],len(origines),tranches_reste>plan)
+            self.coupes.append(origines[gabarit.coupes])
+            # les intersections sont sur le plan, donc sous les plans suivants
+            origines=np.concatenate([origines,total+np.arange(len(gabarit.coupes))])
+            tranches_reste=np.concatenate([tranches_reste,np.full(len(gabarit.coupes),plan)])
+            total+=len(gabarit.coupes)
+
+            index_moins,faces_moins=gabarit.moins
+            self.ajouter_tranche(origines[index_moins],[(-1,plan,contour,False) if i<0 else (faces[i][0],faces[i][1],contour,chant) for i,contour,chant in faces_moins])
+
+            index_plus,faces_plus=gabarit.plus
+            faces=[(-1,plan,contour,False) if i<0 else (faces[i][0],faces[i][1],contour,chant) for i,contour,chant in faces_plus]
+            origines=origines[index_plus]
+            tranches_reste=tranches_reste[index_plus]
+        self.ajouter_tranche(origines,faces)
+
+    def ajouter_tranche(self,index_points,faces):
+        if not any(i>=0 for i,_,_,_ in faces) :
+            raise ValueError(f"tranche {len(self.tranches)} vide : les plans de découpe sortent de la zone")
+        self.tranches.append((index_points,faces))
+
+gabarits_tranches={} # (nombre de points, tranches des points, nombre de plans, contours) -> GabaritTranches
+
+def gabarit_tranches(faces,nombre_points,tranches_points,nombre_plans): # gabarit de découpe en tranches, calculé une seule fois par topologie
+    contours=[face.contour for face in faces]
+    cle=(nombre_points,tranches_points.tobytes(),nombre_plans,tuple(tuple(contour.tolist()) for contour in contours))
+    gabarit=gabarits_tranches.get(cle)
+    if gabarit is None :
+        gabarit=GabaritTranches(contours,nombre_points,tranches_points,nombre_plans)
+        if len(gabarits_tranches)>=TAILLE_MAX_GABARITS :
+            gabarits_tranches.clear()
+        gabarits_tranches[cle]=gabarit
+    return gabarit
+
 class Zone: # l'objet zone défini un volume et des caractéristiques supplémentaires dans le cas où la zone est une planche 
     def __init__(
         self,
@@ -458,7 +764,8 @@ class Zone: # l'objet zone défini un volume et des caractéristiques supplémen
         texture = None, # texture de la planche 
         biseau=False, # la planche comporte t elle un coupe en biseau ? 
         nom="meuble",
-        handle_type=None
+        handle_type=None,
+        couleur=None # couleur unie RGBA qui remplace la texture (option --colors)
     ):
         """Représente une face 3D.
 
@@ -487,128 +794,56 @@ class Zone: # l'objet zone défini un volume et des caractéristiques supplémen
         self.biseau=biseau
         self.nom=nom
         self.handle_type=handle_type
+        self.couleur=couleur
+        self.tableau_alesages=None # alésages de la planche en colonnes (DTYPE_ALESAGES), remplis par placer_alesages
+        self.index_face_usine=None # index_face des alésages de face_usine, fixé par placer_alesages
+    def derivee(self): # sous zone vide qui partage les données de la zone (copie sur écriture)
+        # Les tableaux (points, normales, plan, sens des fibres) ne sont jamais modifiés en place : une opération
+        # réaffecte l'attribut, la zone mère n'est donc pas touchée. Une copie profonde parcourait toute
+        # la filiation des faces (facesupport, faceoppose, zone) à chaque découpe.
+        zone=copy(self)
+        zone.listface=[]
+        if self.face_usine is not None : # la face d'usinage de la mère n'est pas dans listface : copie propre à la sous zone
+            zone.face_usine=copy(self.face_usine)
+            zone.face_usine.alesages=list(self.face_usine.alesages)
+        return zone
     def clip(self,plan,label="l",mode="general"): #cette methode permet de produire de deux sous zone en découpant une zone en deux selon un plan 
-        zoneplus=deepcopy(self)
-        zonemoins=deepcopy(self)
-        zoneplus.listface=[]
-        zonemoins.listface=[]
+        zoneplus=self.derivee()
+        zonemoins=self.derivee()
         faces=self.listface
         points=self.points
         boolean=slice(points,plan)
 
-        # contruction des segments 
-        segments=[face.segments() for face in faces]
-        segments=np.vstack(segments)
-        segments=np.sort(segments,axis=1)
-        segments=np.unique(segments,axis=0)
-        segment_plus=deepcopy(segments)
-        segment_moins=deepcopy(segments)
-        for i,segment in enumerate(segments) :
-            if np.all(boolean[segment])  :
-                segment_moins[i]=np.array([-1,-1])
-            elif  np.all(~boolean[segment]) :
-                segment_plus[i]=np.array([-1,-1])
-                1==1
-            else :
-                newpoint=line_plane_intersection(points[segment[0]],points[segment[1]],plan)
-                zonemoins.points=np.vstack([zonemoins.points,newpoint])
-                zoneplus.points=np.vstack([zoneplus.points,newpoint])
-                if boolean[segment[0]] :
-                    segment_plus[i]=np.array([segment[0],len(zoneplus.points)-1])
-                    segment_moins[i]=np.array([segment[1],len(zoneplus.points)-1])
+        # la topologie de la découpe ne dépend que des contours et du côté de chaque point : 
+        # les zones rectangulaires coupées selon normalv/normalh/normala retombent toujours sur les mêmes gabarits
+        gabarit=gabarit_decoupe([face.contour for face in faces],len(points),boolean)
+
+        # points d'intersection ajoutés à la fin des points, dans l'ordre des segments
+        newpoints=segments_plane_intersections(points[gabarit.coupes[:,0]],points[gabarit.coupes[:,1]],plan)
+        points=np.vstack([points,newpoints])
+
+        labelplus,labelmoins=labels_decoupe(label)
+        newfaceplus=None
+        newfacemoins=None
+        for zone,(index_utilises,faces_gabarit),labelcoupe,equationcoupe in (
+            (zoneplus,gabarit.plus,labelplus,-plan),
+            (zonemoins,gabarit.moins,labelmoins,plan),
+        ):
+            zone.points=points[index_utilises]
+            for i,contour,chant in faces_gabarit :
+                if i<0 : # face de clippage
+                    face=Face(label=labelcoupe,equation=equationcoupe,contour=contour)
+                    if zone is zoneplus :
+                        newfaceplus=face
+                    else :
+                        newfacemoins=face
                 else :
-                    segment_plus[i]=np.array([segment[1],len(zoneplus.points)-1])
-                    segment_moins[i]=np.array([segment[0],len(zoneplus.points)-1])
-
-
-        #reconstitution des faces 
-        for i,face in enumerate(faces) :
-            if np.all(boolean[face.contour]) :
-
-                faceplus = Face(label=face.label,equation=face.equation,contour=face.contour)
-                faceplus.chant=False
-                
-                faceplus.facesupport=face
-                zoneplus.listface.append(faceplus)
-                #ajouter à zone plus
-            elif np.all(~boolean[face.contour]) :
-               
-                
-                facemoins = Face(label=face.label,equation=face.equation,contour=face.contour)
-                facemoins.chant=False
-                facemoins.facesupport=face
-                zonemoins.listface.append(facemoins)
-                #ajouter la face à zone -
-            else : 
-                segments_face = face.segments()
-                segments_face = np.sort(segments_face,axis=1)
-                segments_face = np.unique(segments_face,axis=0)
-
-                mask = np.any((segments[:, None, :] == segments_face).all(axis=2), axis=1)
-                segments_face_plus=segment_plus[mask]
-                segments_face_moins=segment_moins[mask]
-
-                face_plus=Face(label=face.label,equation=face.equation,contour=face.contour)
-                face_moins=Face(label=face.label,equation=face.equation,contour=face.contour)
-
-
-                face_plus.facesupport=face
-                face_moins.facesupport=face
-
-                face_plus.contour=reconstruct_contour(segments_face_plus)
-                face_plus.chant=True
-                zoneplus.listface.append(face_plus)
-                
-                face_moins.contour=reconstruct_contour(segments_face_moins)
-                face_moins.chant=True
-                zonemoins.listface.append(face_moins)
-        
-        # Reconstitution de la face de clippage et ajout à la zone 
-        segments=[face.segments() for face in zoneplus.listface]
-        segments=np.vstack(segments)
-        segments=np.sort(segments,axis=1)
-        unique, counts = np.unique(segments, axis=0, return_counts=True)
-        single_occurrence_segments = unique[counts == 1]
-        contour=reconstruct_contour(single_occurrence_segments)
-        if label=="verticale":
-            labelplus="d"
-            labelmoins="g"
-        elif label=="horizontale":
-            labelplus="h"
-            labelmoins="b"          
-
-        elif label=="avant":
-            labelplus="a"
-            labelmoins="f"
-
-        elif label =="d" :
-            labelplus="g"
-            labelmoins="d"         
-        elif label =="g" :
-            labelplus="d"
-            labelmoins="g"  
-
-        elif label =="b" :
-            labelplus="h"
-            labelmoins="b"    
-                 
-        elif label =="h" :
-            labelplus="b"
-            labelmoins="h" 
-            
-        elif label =="a" :
-            labelplus="f"
-            labelmoins="a"         
-        elif label =="f" :
-            labelplus="a"
-            labelmoins="f"              
-        else : 
-            labelplus=label
-            labelmoins=label
-
-        newfaceplus=Face(label=labelplus,equation=-plan,contour=contour)
-        newfacemoins=Face(label=labelmoins,equation=plan,contour=contour)
-        
+                    face=Face(label=faces[i].label,equation=faces[i].equation,contour=contour)
+                    face.facesupport=faces[i]
+                    face.racine=faces[i].racine
+                    face.chant=chant
+                face.zone=zone
+                zone.listface.append(face)
 
         if mode=="couper":
             newfacemoins.facesupport=None
@@ -616,42 +851,63 @@ class Zone: # l'objet zone défini un volume et des caractéristiques supplémen
         else :
             newfacemoins.faceoppose=newfaceplus
             newfaceplus.faceoppose=newfacemoins
-                
-        zoneplus.listface.append(newfaceplus)
-        zonemoins.listface.append(newfacemoins)
-
-        for face in zoneplus.listface :
-            face.zone=zoneplus
-        for face in zonemoins.listface :
-            face.zone=zonemoins     
-   
-        zoneplus.clear()
-        zonemoins.clear()
- 
-
-        # ajouter un zone.clear 
+
         return zoneplus,zonemoins #zoneplus est la planche en mode enveloppe 
+    def trancher(self,normale,positions,label="l",mode="general"): # découpe la zone en une passe par les plans normale.x = position (positions croissantes) SORTIE les len(positions)+1 tranches, de bas en haut
+        # équivalent de clip successifs sur le reste (plus) de chaque découpe, sans recalculer la zone restante à chaque plan
+        faces=self.listface
+        points=self.points
+        a,b,c=normale
+        scalaires=a * points[:, 0] + b * points[:, 1] + c * points[:, 2] # même calcul que slice
+        tranches_points=np.searchsorted(positions,scalaires,side="left") # nombre de plans strictement sous chaque point
+        gabarit=gabarit_tranches(faces,len(points),tranches_points,len(positions))
+
+        # points d'intersection plan par plan, calculés comme clip à partir des points du reste (éventuellement déjà coupés)
+        plans=[np.append(normale,-position) for position in positions]
+        for plan,coupes in zip(plans,gabarit.coupes) :
+            points=np.vstack([points,segments_plane_intersections(points[coupes[:,0]],points[coupes[:,1]],plan)])
+
+        labelplus,labelmoins=labels_decoupe(label)
+        faces_plus={} # plan -> face de découpe côté plus (tranche du dessus)
+        faces_moins={}
+        zones=[]
+        for j,(index_utilises,faces_gabarit) in enumerate(gabarit.tranches) :
+            zone=self.derivee()
+            zone.points=points[index_utilises]
+            for i,plan,contour,chant in faces_gabarit :
+                if i<0 :
+                    if plan<j :
+                        face=Face(label=labelplus,equation=-plans[plan],contour=contour)
+                        faces_plus[plan]=face
+                    else :
+                        face=Face(label=labelmoins,equation=plans[plan],contour=contour)
+                        faces_moins[plan]=face
+                else :
+                    face=Face(label=faces[i].label,equation=faces[i].equation,contour=contour)
+                    face.facesupport=faces[i]
+                    face.racine=faces[i].racine
+                    face.chant=chant
+                face.zone=zone
+                zone.listface.append(face)
+            zones.append(zone)
+
+        if mode!="couper":
+            for plan in faces_plus :
+                faces_plus[plan].faceoppose=faces_moins[plan]
+                faces_moins[plan].faceoppose=faces_plus[plan]
+        return zones
+    def alesages_face(self, face): # lignes de tableau_alesages portées par une face de la planche (aucune si la face n'en est pas une)
+        index = next((i for i, autre in enumerate(self.listface) if autre is face), -1 if face is self.face_usine else None)
+        if index is None :
+            return self.tableau_alesages[:0]
+        return self.tableau_alesages[self.tableau_alesages["index_face"] == index]
     def trimesh(self): # creer l'objet trimesh pour les planches 
         if not self.planche : 
             pass
         else :
-            faces=self.listface
-            points=self.points 
-            faces_pv=[]     
-            for face in faces :
-                n=np.array([len(face.contour)])
-                face_pv = np.concatenate((n,face.contour))
-                
-                faces_pv.append(face_pv)
-            faces=np.concatenate(faces_pv)
-            mesh_pv=pv.PolyData(points,faces)
-            mesh_pv = mesh_pv.triangulate()
-            vertices= mesh_pv.points
-            faces = mesh_pv.faces.reshape(-1, 4)[:, 1:]  # Supprimer le premier élément (nombre de sommets par face)
-            # Créer un objet trimesh
-            mesh_trimesh = trimesh.Trimesh(vertices=vertices, faces=faces)
-            mesh_trimesh.fix_normals()
-            self.mesh = mesh_trimesh
+            # triangulation directe des faces, orientées selon leur équation (normale sortante)
+            faces=np.vstack([trianguler_polygone(self.points,face.contour,face.equation[:3]) for face in self.listface])
+            self.mesh = trimesh.Trimesh(vertices=self.points, faces=faces)
             
         return self.mesh
     def clear(self): # supprime les points inutilisé dans les faces de la zone 
@@ -722,19 +978,9 @@ class Zone: # l'objet zone défini un volume et des caractéristiques supplémen
         prop=prop/np.sum(prop)
         prop=np.cumsum(prop)
         
-        reste=self
-        zones=[]
-   
-        for i in range(len(prop)-1):
-            d=min*(1-prop[i])+max*prop[i]
-            plan_cut=np.append(plan,-d)
-            # clip renvoie (plus, moins). Avec normale UP/RIGHT, plus=Haut/Droite, moins=Bas/Gauche
-            z_plus, z_moins = reste.clip(plan_cut, label=dir, mode="couper")
-            zones.append(z_moins)
-            reste = z_plus
-
-        zones.append(reste)
-        return zones
+        positions=[min*(1-prop[i])+max*prop[i] for i in range(len(prop)-1)]
+        # tranches de bas en haut (gauche à droite, fond vers avant) : normale UP/RIGHT, plus=Haut/Droite, moins=Bas/Gauche
+        return self.trancher(plan,np.array(positions),label=dir,mode="couper")
 
     def cloisonner(self,mode="proportions",prop=np.array([1,1]),longueurs=np.array([50,50,50]),dir="verticale",epaisseur=19,texture="blanc"): # coupe une zone en n partie en ajoutant des planches de séparations 
         if dir=="verticale":
@@ -771,27 +1017,20 @@ class Zone: # l'objet zone défini un volume et des caractéristiques supplémen
         for i in range(n):
             pos_rel[i+1] = pos_rel[i] + prop[i] * espace_utile + (epaisseur if i < n-1 else 0)
 
-        reste = self
-        zones = []
-        planches = []
-        
+        # plans bas et haut de chaque séparation : d_bas est la fin de la zone précédente (début de la planche), d_haut le début de la zone suivante
+        positions=[]
         for i in range(n - 1):
-            # d_bas est la fin de la zone précédente (début de la planche)
-            d_bas = min + pos_rel[i+1] - epaisseur
-            # d_haut est le début de la zone suivante (fin de la planche)
-            d_haut = min + pos_rel[i+1]
-            
-            plan_bas = np.append(plan, -d_bas)
-            plan_haut = np.append(plan, -d_haut)
+            positions.append(min + pos_rel[i+1] - epaisseur)
+            positions.append(min + pos_rel[i+1])
+        tranches=self.trancher(plan,np.array(positions),label=dir)
+
+        zones = tranches[0::2]
+        planches = tranches[1::2]
+        for i,z_planche in enumerate(planches):
+            d_bas = positions[2*i]
+            d_haut = positions[2*i+1]
             plan_median = np.append(plan, -(d_bas + d_haut)/2)
             
-            # On coupe pour extraire la zone du bas/gauche
-            z_reste, z_zone = reste.clip(plan_bas, label=dir)
-            zones.append(z_zone)
-            
-            # On coupe le reste pour extraire la planche
-            z_reste, z_planche = z_reste.clip(plan_haut, label=dir)
-            
             z_planche.planche = True
             z_planche.plan = plan_median
             z_planche.epaisseur = epaisseur
@@ -809,11 +1048,7 @@ class Zone: # l'objet zone défini un volume et des caractéristiques supplémen
                 z_planche.face_usine = [face for face in z_planche.listface if face.label == label_usinage][0]
             except:
                 z_planche.face_usine = z_planche.listface[0]
-                
-            planches.append(z_planche)
-            reste = z_reste
 
-        zones.append(reste)
         return zones, planches
     def rotation(self) : # permet de faire tourner les label d'une zone d'un quart de tour 
         for face in self.listface :
@@ -848,13 +1083,11 @@ class Zone: # l'objet zone défini un volume et des caractéristiques supplémen
             imagenumber=create_number_image(number)
         
             self.mesh.visual = trimesh.visual.texture.TextureVisuals(uv=uvs, image=imagenumber)      
-    def texturer(self): # ajoute la texture au mesh trimesh 
+    def texturer(self,textures_dict,dossier_textures): # ajoute la texture au mesh trimesh 
         if not self.planche : 
             pass
         else :
-            texture_obj = self.texture
-            if isinstance(texture_obj, str):
-                texture_obj = textures_dict.get(texture_obj, textures_dict.get("Blanc Premium"))
+            texture_obj = resoudre_texture(self.texture, textures_dict)
             
             if not texture_obj:
                 return
@@ -881,20 +1114,16 @@ class Zone: # l'objet zone défini un volume et des caractéristiques supplémen
             x0=texture_obj.longueur
             y0=texture_obj.largeur
 
-            texture_path = os.path.join(script_dir, "textures", texture_obj.nom + ".png")
-            texture_image = Image.open(texture_path)
-            width, height = texture_image.size
-            xcrop=width*x/x0
-            ycrop=height*y/y0
-            # Adjust (left, upper, right, lower) to match the desired crop area
-
-            cropped_texture_image = texture_image.crop((0, 0, xcrop, ycrop))
-            self.mesh.visual = trimesh.visual.texture.TextureVisuals(uv=uvs,image = cropped_texture_image)
-    def prix(self) : # calcul le cout matiere de la planche 
-        texture_obj = self.texture
-        if isinstance(texture_obj, str):
-            texture_obj = textures_dict.get(texture_obj, textures_dict.get("Blanc Premium"))
-            
+            texture_path = os.path.join(dossier_textures, texture_obj.nom + ".png")
+            texture_image = cache_textures.image(texture_path)
+            # La planche couvre le coin (0, 0, x, y) du panneau x0 * y0 : les UV sont mis à l'échelle sur l'image entière
+            # (origine trimesh en bas de l'image) au lieu de découper l'image, qui reste partagée par toutes les planches
+            uvs[:,0]=uvs[:,0]*x/x0
+            uvs[:,1]=1-(1-uvs[:,1])*y/y0
+            self.mesh.visual = trimesh.visual.texture.TextureVisuals(uv=uvs,image = texture_image)
+    def prix(self,textures_dict) : # calcul le cout matiere de la planche 
+        texture_obj = resoudre_texture(self.texture, textures_dict)
+
         if not texture_obj:
             return 0
 
@@ -1124,85 +1353,146 @@ def M5(a,b,c):# initialise la zone
         face.zone=zone
     return zone
 
-def subsequence(sequence):# touve les sous sequences entre parentheses
-    i=0
-    depth=0
-    virgules=[0]
-    while i<len(sequence):
-        char=sequence[i]
-        if char=="(" or char=="[":
-            depth=depth+1
-        if char==")" or char=="]":
-            depth=depth-1
-        if char==",":
-            if depth==1:
-                virgules.append(i)
-        if depth==0:
-            virgules.append(i)
-            subs=[]
-            for j in range (len(virgules)-1):
-                subs.append(sequence[virgules[j]+1:virgules[j+1]])
-            return subs
-        i=i+1
-
-textures={"exterieur": textures_dict["Blanc Premium"],"interieur": textures_dict["Blanc Premium"],"porte": textures_dict["Chêne Brun"],"tiroir": textures_dict["Chêne Brun"]}
-
-print(textures_dict["Chêne Brun"].epaisseur)
-
-def process(sequence,zone,textures=textures) : # cette fonction sert à parser un sequence de caractère pour modeliser un meuble 
+def primitive(noeud): # crée la zone de départ d'un noeud M0 à M5 
+    valeurs=noeud.valeurs
+    if noeud.numero==0 : #ne jamais utiliser car très dangereux
+        return M0(*valeurs)
+    if noeud.numero==1 :# permet de faire un meuble rectangulaire avec 3 valeur en mm (largeur, profondeur,haueteur) Exemple : M1(1500,344,2000)
+        a,b,c=valeurs
+        return M0(a,b,c,c,c,c)
+    if noeud.numero==2 : # permet de faire un meuble sous mansarde avec 4 valeur en mm (largeur, profondeur,petite hauteur, grande hauteur) Exemple : M2(1500,344,1200,2000)
+        a,b,c,d=valeurs
+        return M0(a,b,c,d,c,d)
+    if noeud.numero==3 : # permet de faire un meuble sous escalier avec 4 valeur en mm (largeur, profondeur,petite hauteur, grande hauteur) Exemple : M3(1500,344,1200,2000)
+        a,b,c,d=valeurs
+        return M0(a,b,c,c,d,d)
+    if noeud.numero==4 : #ne pas utiliser car trop dangereux 
+        return M4(*valeurs)
+    if noeud.numero==5 : #permet de faire un meuble d'angle avec 3 valeur en mm (longeur1, longeur2,hauteur). Exemple M5(500,400,600)
+        return M5(*valeurs)
+
+def diviser(zone,noeud,textures): # découpe la zone selon un noeud V, H ou A. SORTIE les sous zones et les planches de séparation
+    dir=noeud.axe
+    if noeud.invisible : # couper : pas de création de planche
+        if noeud.valeurs is not None : # proportions ou longeurs (si on est en mode longeur)
+            return zone.couper(dir=dir,mode=noeud.mode , longueurs=np.array(noeud.valeurs) , prop=np.array(noeud.valeurs)),[]
+        if noeud.nombre is not None : # si c'est un chriffre n on divise en n part égales
+            return zone.couper(dir=dir,prop=np.ones(noeud.nombre)),[]
+        return zone.couper(dir=dir),[] # parenthèses directes : on divise juste en 2
+
+    epaisseur=textures["interieur"].epaisseur
+    if noeud.valeurs is not None :
+        zones,planches=zone.cloisonner(dir=dir,mode=noeud.mode , longueurs=np.array(noeud.valeurs) , prop=np.array(noeud.valeurs),epaisseur=epaisseur,texture=textures["interieur"])
+    elif noeud.nombre is not None :
+        zones,planches=zone.cloisonner(dir=dir,prop=np.ones(noeud.nombre),epaisseur=epaisseur,texture=textures["interieur"])
+    else :
+        zones,planches=zone.cloisonner(dir=dir,epaisseur=epaisseur,texture=textures["interieur"])
+    if epaisseur>1 :
+        return zones,planches
+    return zones,[]
+
+def translater_plan(plan, t): # ENTREE une équation de plan et un vecteur SORTIE l'équation du plan translaté
+    return np.append(plan[:3], plan[3] - np.dot(plan[:3], t))
+
+def forme_locale(zone): # signature de la zone dans son repère local (origine au premier point) : deux zones de même forme ont la même signature
+    points = np.round(zone.points - zone.points[0], 6) + 0.0 # + 0.0 : -0.0 et 0.0 ont la même signature
+    faces = tuple(
+        (face.label, tuple(face.contour), tuple(np.round(face.equation[:3], 9) + 0.0), face.chant)
+        for face in zone.listface
+    )
+    normales = tuple(np.round(np.concatenate([zone.normalh, zone.normalv, zone.normala]), 9) + 0.0)
+    attributs = (zone.type, zone.planche, zone.epaisseur, zone.bloc, zone.nom, zone.handle_type, getattr(zone.texture, 'nom', zone.texture))
+    return (points.shape, points.tobytes(), faces, normales, attributs)
+
+class MemoSequences: # mémoïsation des sous séquences répétées (colonnes, tiroirs identiques ...)
+    # Une sous séquence appliquée à deux zones de même forme donne les mêmes planches à une translation près :
+    # la première évaluation est gardée, les suivantes sont des copies translatées.
+    # Les copies restent rattachées aux faces de leur propre zone (facesupport) pour la détection des contacts,
+    # leur face d'origine (racine) est recalculée à partir de cette filiation.
+    def __init__(self, arbre, textures_dict=None):
+        self.textures = list((textures_dict or {}).values()) # partagées, jamais copiées
+        self.occurrences = {} # texte de la sous séquence -> nombre d'apparitions dans le prompt
+        self.resultats = {} # (texte, textures, forme locale) -> (zone de référence, planches)
+        self.reutilisations = 0
+        self.compter(arbre)
+
+    def compter(self, sequence):
+        for noeud in sequence.operations:
+            for enfant in getattr(noeud, 'enfants', None) or []:
+                texte = repr(enfant)
+                self.occurrences[texte] = self.occurrences.get(texte, 0) + 1
+                self.compter(enfant)
+
+    def memoisable(self, sequence): # r et N modifient la zone reçue, M repart d'une zone absolue
+        for noeud in sequence.operations:
+            if noeud.lettre in ("r", "N", "M"):
+                return False
+            for enfant in getattr(noeud, 'enfants', None) or []:
+                if not self.memoisable(enfant):
+                    return False
+        return True
+
+    def copier(self, planches, source, cible): # copie profonde dont les références aux faces de source pointent vers celles de cible
+        memo = {id(texture): texture for texture in self.textures}
+        memo[id(source)] = cible
+        for face_source in source.listface: # faces d'origine au dessus de la source : jamais copiées, les racines sont recalculées plus bas
+            memo[id(face_source.racine)] = face_source.racine
+        for face_source, face_cible in zip(source.listface, cible.listface):
+            memo[id(face_source)] = face_cible
+        fixes = set(memo)
+        copie = deepcopy(planches, memo)
+        nouveaux = [objet for cle, objet in memo.items() if cle not in fixes and isinstance(objet, (Zone, Face, Alesage))]
+        for objet in nouveaux:
+            if isinstance(objet, Face):
+                objet.racine = objet.remonter_facesupport()
+        return copie, nouveaux
+
+    def evaluer(self, sequence, zone, textures, textures_dict): # équivalent de process(sequence, zone, ...)
+        texte = repr(sequence)
+        if self.occurrences.get(texte, 0) < 2 or not self.memoisable(sequence):
+            return process(sequence, zone, textures, textures_dict, self)
+
+        cle = (texte, tuple(sorted((nom, id(texture)) for nom, texture in textures.items())), forme_locale(zone))
+        if cle not in self.resultats:
+            planches = process(sequence, zone, textures, textures_dict, self)
+            self.resultats[cle] = (zone, self.copier(planches, zone, zone)[0]) # instantané : la suite du prompt peut modifier les planches
+            return planches
+
+        self.reutilisations += 1
+        reference, planches = self.resultats[cle]
+        planches, nouveaux = self.copier(planches, reference, zone)
+        t = zone.points[0] - reference.points[0]
+        for objet in nouveaux:
+            if isinstance(objet, Zone):
+                if objet.points is not None:
+                    objet.points = objet.points + t
+                if objet.plan is not None:
+                    objet.plan = translater_plan(objet.plan, t)
+                if objet.mesh is not None:
+                    objet.mesh.apply_translation(t)
+            elif isinstance(objet, Face):
+                objet.equation = translater_plan(objet.equation, t)
+            else:
+                objet.positionxyz = objet.positionxyz + t
+        return planches
+
+def process(sequence,zone,textures,textures_dict,memo=None) : # cette fonction sert à modeliser un meuble à partir d'un prompt (ou de son arbre syntaxique, voir grammaire.py)
     #l'objet zone est ammenée à évoluer suite aux opération faites dessus cela repésente une zone d'espace 
     # l'objet Listplanches permet d'accumuler les planches qui résultent des différentes opérations
     
-    #Cette fonction décode la sequence et exécute des fonctions plus bas niveaux qui vont crééer des planche.
+    #Cette fonction parcourt l'arbre du prompt et exécute des fonctions plus bas niveaux qui vont crééer des planche.
     # La methode "envelopper" permet de creer des planches prise sur le bord de la zone, le long d'un label donné. Le label peut etre h (haut), b (bas), g(gauche), d (droite), f (fond), a (avant)
     # La méthode "cloisonner" permet de séparer une zone en sous-zones et de crééer des planches qui vont les séparer. Cette  séparation se fait selon 3 axes : "avant" "horizontal" et "verticale"
     # La methode "couper" permet de séparer une zone en sous-zone sans creer de nouvelle planche
-    sequence=sequence+"   "
+    if isinstance(sequence, str):
+        sequence=analyser(sequence) # lève ErreurSyntaxe avec la position en cas de prompt invalide
     Listplanches=[]
-    i=0
-    while i<len(sequence) :  #boucle de lecrture des caractères
-        char=sequence[i]
-        
-        # Helper pour extraire le type de poignée (chiffre 1-4)
-        def check_handle(idx):
-            if idx + 1 < len(sequence) and sequence[idx+1].isdigit():
-                return int(sequence[idx+1]), idx + 1
-            return None, idx
+    for noeud in sequence.operations :  #boucle sur les opérations de la séquence
+        char=noeud.lettre
 
         if char=="M": # "M"+"chiffre" permet la création d'une zone. Il faut obligatoirement initialiser le meuble par une création de zone 
             print("M")
-            i=i+1
-            char=sequence[i]
-            if char=="0" : #ne jamais utiliser car très dangereux
-                i=i+1
-                seq1,seq2,seq3,seq4,seq5,seq6=subsequence(sequence[i:])
-                i=i+len(seq1)+len(seq2)+len(seq3)+len(seq4)+len(seq5)+len(seq6)+6
-                zone=M0(seq1,seq2,seq3,seq4,seq5,seq6)
-            if char=="1":# permet de faire un meuble rectangulaire avec 3 valeur en mm (largeur, profondeur,haueteur) Exemple : M1(1500,344,2000)
-                i=i+1
-                seq1,seq2,seq3=subsequence(sequence[i:])
-                i=i+len(seq1)+len(seq2)+len(seq3)+3
-                zone=M0(seq1,seq2,seq3,seq3,seq3,seq3)
-            if char=="2": # permet de faire un meuble sous mansarde avec 4 valeur en mm (largeur, profondeur,petite hauteur, grande hauteur) Exemple : M2(1500,344,1200,2000)
-                i=i+1
-                seq1,seq2,seq3,seq4=subsequence(sequence[i:])
-                i=i+len(seq1)+len(seq2)+len(seq3)+len(seq4)+4
-                zone=M0(seq1,seq2,seq3,seq4,seq3,seq4)
-            if char=="3": # permet de faire un meuble sous escalier avec 4 valeur en mm (largeur, profondeur,petite hauteur, grande hauteur) Exemple : M3(1500,344,1200,2000)
-                i=i+1
-                seq1,seq2,seq3,seq4=subsequence(sequence[i:])
-                i=i+len(seq1)+len(seq2)+len(seq3)+len(seq4)+4
-                zone=M0(seq1,seq2,seq3,seq3,seq4,seq4)
-            if char=="4": #ne pas utiliser car trop dangereux 
-                i=i+1
-                seq1,seq2,seq3,seq4=subsequence(sequence[i:])
-                i=i+len(seq1)+len(seq2)+len(seq3)+len(seq4)+4
-                zone=M4(seq1,seq2,seq3,seq4)
-            if char=="5": #permet de faire un meuble d'angle avec 3 valeur en mm (longeur1, longeur2,hauteur). Exemple M5(500,400,600)
-                i=i+1
-                seq1,seq2,seq3=subsequence(sequence[i:])
-                i=i+len(seq1)+len(seq2)+len(seq3)+3
-                zone=M5(seq1,seq2,seq3)
+            zone=primitive(noeud)
         elif char=="E" : # E comme enveloppe : créer une enveloppe externe au meuble 
             print("E")
             planches,zone=zone.envelopper(label="d",epaisseur=textures["exterieur"].epaisseur,texture=textures["exterieur"])
@@ -1215,219 +1505,28 @@ def process(sequence,zone,textures=textures) : # cette fonction sert à parser u
             print("F")
             planches,zone=zone.envelopper(label="f",epaisseur=textures["exterieur"].epaisseur,texture=textures["exterieur"])
             Listplanches=Listplanches+planches  
-        elif char=="V": # V permet de faire une séparation verticale
-            print("V")
-            i=i+1
-            char=sequence[i]
-            if char=="I": #si on ajoute I la séparartion devient invisible : il n'y a pas création de planche 
+        elif char=="V" or char=="H" or char=="A": # V séparation verticale, H séparation horizontale, A séparation selon l'axe d'ouverture (peu de cas pertinents)
+            # En ajoutant "I" on fait des séparations invisibles (pas de planche). Si on rajoute un "L" on passe en mode longueur, le mode par defaut étant la proportion
+            # V2 : n parts égales, V[30,70] : proportions (ou longueurs), V(...,...) : 2 parts égales. Les sous séquences entre parenthèses s'appliquent aux sous zones (gauche à droite, bas en haut)
+            print(char)
+            if noeud.invisible:
                 print("I")
-                i=i+1
-                char=sequence[i]
-
-                if char=="L": # si on ajoute L on passe en mode longueur. Le mode par défaut reste le mode proportions 
-                    
-                    mode="longueurs"
-                    i=i+1
-                    char=sequence[i]
-                else : 
-                    mode="proportions"
-                
-
-                if char=="(": #si on a des parenthèses directes, on divise juste en 2
-                    
-                    zones=zone.couper(dir="verticale")
-                    Lmeubles=zones
-                    seq1,seq2=subsequence(sequence[i:])
-                    Lseq=[seq1,seq2]
-                    # i sera incrémenté plus bas
-                elif char=="[": #si on a des crochets, on indique des proportion ou des longeurs (si on est en mode longeur )
-                    Lseq_prop=subsequence(sequence[i:])
-                    i=i+1
-                    sommelen=sum([len(seq) for seq in Lseq_prop])
-                    i=i+sommelen+len(Lseq_prop)
-                    Lseq_prop=[int(seq) for seq in Lseq_prop]
-                    zones=zone.couper(dir="verticale",mode=mode , longueurs=np.array(Lseq_prop) , prop=np.array(Lseq_prop))
-                    Lmeubles=zones
-                    Lseq=[] # sera rempli par le ( ) suivant
-
-                elif char.isdigit(): # si c'est un chriffre n on divise en n part égales
-                    k=int(char)
-                    prop=np.ones(k)
-                    zones=zone.couper(dir="verticale",prop=prop)
-                    Lmeubles=zones
-                    Lseq=[]
-                    i=i+1
-                
-                if i < len(sequence) and sequence[i]=="(": # si on descide de préciser ce qu'on veut dans chaque sous zone
-                    Lseq=subsequence(sequence[i:])
-                    i=i+1
-                
-                if Lseq:
-                    for j, seq in enumerate(Lseq)  : # on execute les sous séquence sur les sous meuble de gauche à droite 
-                        if j < len(Lmeubles):
-                            i=i+len(seq)+1
-                            Listplanches=Listplanches+process(seq,Lmeubles[j],textures)
-
-
-
-            else :  # meme chose qu'en haut mais on va crééer des planche 
-                epaisseur=textures["interieur"].epaisseur
-                if char=="L":
-                    
-                    mode="longueurs"
-                    i=i+1
-                    char=sequence[i]
-                else : 
-                    mode="proportions"
-                
-
-                if char=="(":
-                    
-                    zones,planches=zone.cloisonner(dir="verticale",epaisseur=epaisseur,texture=textures["interieur"])
-                    Lmeubles=zones
-                    if epaisseur>1 :
-                        Listplanches=Listplanches+planches
-                    seq1,seq2=subsequence(sequence[i:])
-                    Lseq=[seq1,seq2]
-                elif char=="[":
-                    Lseq_prop=subsequence(sequence[i:])
-                    i=i+1
-                    sommelen=sum([len(seq) for seq in Lseq_prop])
-                    i=i+sommelen+len(Lseq_prop)
-                    Lseq_prop=[int(seq) for seq in Lseq_prop]
-                    zones,planches=zone.cloisonner(dir="verticale",mode=mode , longueurs=np.array(Lseq_prop) , prop=np.array(Lseq_prop),epaisseur=epaisseur,texture=textures["interieur"])
-                    Lmeubles=zones
-                    if epaisseur>1 :
-                        Listplanches=Listplanches+planches
-                    Lseq=[]
-                elif char.isdigit():
-                    k=int(char)
-                    prop=np.ones(k)
-                    zones,planches=zone.cloisonner(dir="verticale",prop=prop,epaisseur=epaisseur,texture=textures["interieur"])
-                    Lmeubles=zones
-                    if epaisseur>1 :
-                        Listplanches=Listplanches+planches
-                    Lseq=[]
-                    i=i+1
-                
-                if i < len(sequence) and sequence[i]=="(":
-                    Lseq=subsequence(sequence[i:])
-                    i=i+1
-                
-                if Lseq:
-                    for j, seq in enumerate(Lseq)  :
-                        if j < len(Lmeubles):
-                            i=i+len(seq)+1
-                            Listplanches=Listplanches+process(seq,Lmeubles[j],textures)
-        elif char=="H":  # H permet de faire des séparation horizontale. En ajoutant "I" à la suite du H, on fait des séparations invisibles. Si on rajoute un "L" on passen en mode longueur, le mode par defaut étant la proportion 
-            print("H")
-            i=i+1
-            char=sequence[i]
-            if char=="I":
-                print("I")
-                i=i+1
-                char=sequence[i]
-
-                if char=="L":
-                    
-                    mode="longueurs"
-                    i=i+1
-                    char=sequence[i]
-                else : 
-                    mode="proportions"
-                
-
-                if char=="(":
-                    
-                    zones=zone.couper(dir="horizontale")
-                    Lmeubles=zones
-                    seq1,seq2=subsequence(sequence[i:])
-                    Lseq=[seq1,seq2]
-                elif char=="[":
-                    Lseq_prop=subsequence(sequence[i:])
-                    i=i+1
-                    sommelen=sum([len(seq) for seq in Lseq_prop])
-                    i=i+sommelen+len(Lseq_prop)
-                    Lseq_prop=[int(seq) for seq in Lseq_prop]
-                    zones=zone.couper(dir="horizontale",mode=mode , longueurs=np.array(Lseq_prop) , prop=np.array(Lseq_prop))
-                    Lmeubles=zones
-                    Lseq=[]
-
-                elif char.isdigit():
-                    k=int(char)
-                    prop=np.ones(k)
-                    zones=zone.couper(dir="horizontale",prop=prop)
-                    Lmeubles=zones
-                    Lseq=[]
-                    i=i+1
-                
-                if i < len(sequence) and sequence[i]=="(":
-                    Lseq=subsequence(sequence[i:])
-                    i=i+1
-                
-                if Lseq:
-                    for j, seq in enumerate(Lseq)  :  # On exécute les sous meubles sur les sous zones de bas en Haut 
-                        if j < len(Lmeubles):
-                            i=i+len(seq)+1
-                            Listplanches=Listplanches+process(seq,Lmeubles[j],textures)
-
-
-
-            else : 
-                epaisseur=textures["interieur"].epaisseur
-                if char=="L":
-                    
-                    mode="longueurs"
-                    i=i+1
-                    char=sequence[i]
-                else : 
-                    mode="proportions"
-                
-
-                if char=="(":
-                    
-                    zones,planches=zone.cloisonner(dir="horizontale",epaisseur=epaisseur,texture=textures["interieur"])
-                    Lmeubles=zones
-                    if epaisseur>1 :
-                        Listplanches=Listplanches+planches
-                    seq1,seq2=subsequence(sequence[i:])
-                    Lseq=[seq1,seq2]
-                elif char=="[":
-                    Lseq_prop=subsequence(sequence[i:])
-                    i=i+1
-                    sommelen=sum([len(seq) for seq in Lseq_prop])
-                    i=i+sommelen+len(Lseq_prop)
-                    Lseq_prop=[int(seq) for seq in Lseq_prop]
-                    zones,planches=zone.cloisonner(dir="horizontale",mode=mode , longueurs=np.array(Lseq_prop) , prop=np.array(Lseq_prop),epaisseur=epaisseur,texture=textures["interieur"])
-                    Lmeubles=zones
-                    if epaisseur>1 :
-                        Listplanches=Listplanches+planches
-                    Lseq=[]
-                elif char.isdigit():
-                    k=int(char)
-                    prop=np.ones(k)
-                    zones,planches=zone.cloisonner(dir="horizontale",prop=prop,epaisseur=epaisseur,texture=textures["interieur"])
-                    Lmeubles=zones
-                    if epaisseur>1 :
-                        Listplanches=Listplanches+planches
-                    Lseq=[]
-                    i=i+1
-                
-                if i < len(sequence) and sequence[i]=="(":
-                    Lseq=subsequence(sequence[i:])
-                    i=i+1
-                
-                if Lseq:
-                    for j, seq in enumerate(Lseq)  : 
-                        if j < len(Lmeubles):
-                            i=i+len(seq)+1
-                            Listplanches=Listplanches+process(seq,Lmeubles[j],textures)
+            zones,planches=diviser(zone,noeud,textures)
+            Listplanches=Listplanches+planches
+            if noeud.enfants:
+                Lmeubles=zones
+                if char=="A" and noeud.valeurs is None and noeud.nombre is None:
+                    Lmeubles=[zones[1],zones[0]] # A(...,...) : les deux sous zones sont prises dans l'ordre inverse
+                for j, enfant in enumerate(noeud.enfants)  :
+                    if memo is not None :
+                        Listplanches=Listplanches+memo.evaluer(enfant,Lmeubles[j],textures,textures_dict)
+                    else :
+                        Listplanches=Listplanches+process(enfant,Lmeubles[j],textures,textures_dict)
         elif char=="P": # P permet d'ajouter une porte elle peut être encastre si on la fait après les planches adjacentes (exemple EP) ou bien en applique si on la fait avant (exemple PE)
             print("P")
-            i=i+1
-            char=sequence[i]
+            char=noeud.variante
+            handle_type=noeud.poignee
             if char=="2" :
-                handle_type, i = check_handle(i)
                 planches,zone=zone.envelopper(label="a",epaisseur=textures["porte"].epaisseur+0.1,texture=textures["porte"])
                 planche=planches[0]
                 _,planche=planche.envelopper(label="g",epaisseur=3)
@@ -1455,7 +1554,6 @@ def process(sequence,zone,textures=textures) : # cette fonction sert à parser u
                 Listplanches.append(planchegauche)
                 Listplanches.append(planchedroite)
             elif char=="g" or char=="d":
-                handle_type, i = check_handle(i)
                 planches,zone=zone.envelopper(label="a",epaisseur=textures["porte"].epaisseur+0.1,texture=textures["porte"])
                 planche=planches[0]
                 _,planche=planche.envelopper(label="g",epaisseur=3)
@@ -1472,7 +1570,6 @@ def process(sequence,zone,textures=textures) : # cette fonction sert à parser u
                 planche.face_usine=[face for face in planche.listface if face.label=="f"][0]
                 Listplanches.append(planche)
             elif char=="m": # MIROIR
-                handle_type, i = check_handle(i)
                 planches,zone=zone.envelopper(label="a",epaisseur=textures["porte"].epaisseur+0.1,texture=textures["porte"])
                 planche=planches[0]
                 _,planche=planche.envelopper(label="g",epaisseur=3)
@@ -1535,9 +1632,6 @@ def process(sequence,zone,textures=textures) : # cette fonction sert à parser u
 
             else :
 
-                i=i-1
-                char=sequence[i]
-                
                 planches,zone=zone.envelopper(label="a",epaisseur=19.1,texture=textures["porte"])
                 planche=planches[0]
                 _,planche=planche.envelopper(label="g",epaisseur=3)
@@ -1550,105 +1644,6 @@ def process(sequence,zone,textures=textures) : # cette fonction sert à parser u
                 
                 planche.face_usine=[face for face in planche.listface if face.label=="f"][0]
                 Listplanches.append(planche)
-        elif char=="A": #A marche sur le même principe que H et V mais il y a peu de cas où c'est pertinant de faire une division selon l'axe d'ouverture du meuble 
-            print("A")
-            i=i+1
-            char=sequence[i]
-            if char=="I":
-                print("I")
-                i=i+1
-                char=sequence[i]
-
-                if char=="L":
-                    
-                    mode="longueurs"
-                    i=i+1
-                    char=sequence[i]
-                else : 
-                    mode="proportions"
-                
-
-                if char=="(":
-                    
-                    zones=zone.couper(dir="avant")
-                    meublehaut,meublebas=zones[0],zones[1]
-                    seq1,seq2=subsequence(sequence[i:])
-                    i=i+len(seq1)+len(seq2)+2
-                    Listplanches=Listplanches+process(seq1,meublebas,textures)
-                    Listplanches=Listplanches+process(seq2,meublehaut,textures)
-                elif char=="[":
-                    Lseq=subsequence(sequence[i:])
-                    i=i+1
-                    sommelen=sum([len(seq) for seq in Lseq])
-                    i=i+sommelen+len(Lseq)
-                    Lseq=[int(seq) for seq in Lseq]
-                    zones=zone.couper(dir="avant",mode=mode , longueurs=np.array(Lseq) , prop=np.array(Lseq))
-                    Lmeubles=zones
-
-                elif char.isdigit():
-                    k=int(char)
-                    prop=np.ones(k)
-                    zones=zone.couper(dir="avant",prop=prop)
-                    Lmeubles=zones
-                    i=i+1
-                
-                char=sequence[i]  
-                if char=="(":
-                    Lseq=subsequence(sequence[i:])
-                    i=i+1
-                    for j, seq in enumerate(Lseq)  :
-                        i=i+len(seq)+1
-                        Listplanches=Listplanches+process(seq,Lmeubles[j],textures)
-
-
-
-            else : 
-                epaisseur=textures["interieur"].epaisseur
-                if char=="L":
-                    
-                    mode="longueurs"
-                    i=i+1
-                    char=sequence[i]
-                else : 
-                    mode="proportions"
-                
-
-                if char=="(":
-                    
-                    zones,planches=zone.cloisonner(dir="avant",epaisseur=epaisseur,texture=textures["interieur"])
-                    meublehaut,meublebas,planche=zones[0],zones[1],planches[0]
-                    seq1,seq2=subsequence(sequence[i:])
-                    i=i+len(seq1)+len(seq2)+2
-                    if epaisseur>1 :
-                        Listplanches.append(planche)
-                    Listplanches=Listplanches+process(seq1,meublebas,textures)
-                    Listplanches=Listplanches+process(seq2,meublehaut,textures)
-                elif char=="[":
-                    Lseq=subsequence(sequence[i:])
-                    i=i+1
-                    sommelen=sum([len(seq) for seq in Lseq])
-                    i=i+sommelen+len(Lseq)
-                    Lseq=[int(seq) for seq in Lseq]
-                    zones,planches=zone.cloisonner(dir="avant",mode=mode , longueurs=np.array(Lseq) , prop=np.array(Lseq),epaisseur=epaisseur,texture=textures["interieur"])
-                    planches,Lmeubles=planches,zones
-                    if epaisseur>1 :
-                        Listplanches=Listplanches+planches
-                elif char.isdigit():
-                    k=int(char)
-                    prop=np.ones(k)
-                    zones,planches=zone.cloisonner(dir="avant",prop=prop,epaisseur=epaisseur,texture=textures["interieur"])
-                    planches,Lmeubles=planches,zones
-                    if epaisseur>1 :
-                        Listplanches=Listplanches+planches
-                    i=i+1
-                
-                char=sequence[i]  
-                if char=="(":
-                    Lseq=subsequence(sequence[i:])
-                    i=i+1
-                    for j, seq in enumerate(Lseq)  :
-                        i=i+len(seq)+1
-                        Listplanches=Listplanches+process(seq,Lmeubles[j],textures)
         elif char=="S":  # S permet de faire un socle en bas du meuble il faut toujours faire un socle en bas du meuble 
 
             print("S")
@@ -1661,31 +1656,22 @@ def process(sequence,zone,textures=textures) : # cette fonction sert à parser u
             planche.bloc="socle"
             Listplanches.append(planche)
 
-            i=i+1
-            char=sequence[i]
-            if char == "2" :
+            if noeud.double :
                 
                 planches,zonebas=zonebas.envelopper(label="f",epaisseur=textures["interieur"].epaisseur,texture=textures["interieur"])
                 planche=planches[0]
                 planche.bloc="socle"
                 Listplanches.append(planche)
-            else :
-                i=i-1
-                char=sequence[i]
         elif char=="R": # simple retrait. Peut donner un coté esthétique. A utiliser avec parcimonie 
             print("R")
             _,zone=zone.envelopper(label="a",epaisseur=19)    
         elif char=="T": # T défini un tiroir dans la zone courante 
             print("T")
-            i=i+1
-            char_next=sequence[i]
             bloc_name = "tiroir"
-            if char_next == "o":
+            if noeud.push:
                 bloc_name = "tiroir_push"
-            else:
-                i = i - 1
             
-            handle_type, i = check_handle(i)
+            handle_type = noeud.poignee
             
             planches,zone=zone.envelopper(label="g",epaisseur=3)
             planches,zone=zone.envelopper(label="d",epaisseur=3)
@@ -1748,14 +1734,10 @@ def process(sequence,zone,textures=textures) : # cette fonction sert à parser u
             print("a")
             planches,zone=zone.envelopper(label="a",epaisseur=textures["porte"].epaisseur,texture=textures["porte"])
             Listplanches=Listplanches+planches
-        elif char=="C": # laisser les couleur tel quel pour le moment 
+        elif char=="C": # C(exterieur,interieur,porte,tiroir) change les textures pour la suite de la séquence
             print("C")
-            i=i+1
-            char=sequence[i]
-            if char=="(":
-                seq1,seq2,seq3,seq4=subsequence(sequence[i:])
-                i=i+len(seq1)+len(seq2)+len(seq3)+len(seq4)+4
-                textures={"exterieur": textures_dict[seq1],"interieur": textures_dict[seq2],"porte": textures_dict[seq3],"tiroir": textures_dict[seq4]}
+            seq1,seq2,seq3,seq4=noeud.noms
+            textures={"exterieur": textures_dict[seq1],"interieur": textures_dict[seq2],"porte": textures_dict[seq3],"tiroir": textures_dict[seq4]}
         elif char=="c": # c for cable hole
             print("c")
             # Calcul du centre de la zone sur le plan du fond
@@ -1857,15 +1839,9 @@ def process(sequence,zone,textures=textures) : # cette fonction sert à parser u
             planches,zone=zone.envelopper(label="f",epaisseur=10)
             planches,zone=zone.envelopper(label="h",epaisseur=10)
         elif char=="N" :
-            i=i+1
-            char=sequence[i]
-            if char=="(":
-                nom=str(subsequence(sequence[i:])[0])
-                print(nom)
-                zone.nom=nom
-                i=i+len(nom)
-                char=char=sequence[i]
-        i=i+1
+            nom=noeud.nom
+            print(nom)
+            zone.nom=nom
 
 
     return Listplanches
@@ -1873,275 +1849,368 @@ def process(sequence,zone,textures=textures) : # cette fonction sert à parser u
 
 # %%
 ## execution
+# La génération est découpée en étapes appelables (process, maillage, textures, alésages, dxf, prix)
+# pour pouvoir être importée (serveur_generation.py) sans relancer tout le script.
 
-# Récupérer les arguments : prompt, output_path et --closed
-if len(sys.argv) < 2:
-    print("[ERROR] Usage: python procedure_real.py <prompt> [output_path] [--closed] [--colors JSON] [--deleted-panels JSON]", file=sys.stderr)
-    sys.exit(1)
-
-chaine = sys.argv[1]  # Le prompt M1(...)
-output_path = sys.argv[2] if len(sys.argv) > 2 else "./meuble.glb"  # Chemin de sortie
-closed_mode = "--closed" in sys.argv  # Mode fermé (tiroirs et portes fermés)
-
-# Récupérer les couleurs hex si fournies (format JSON pour multi-couleurs)
-custom_colors = {}
-if "--colors" in sys.argv:
-    colors_index = sys.argv.index("--colors")
-    if colors_index + 1 < len(sys.argv):
-        import json
-        try:
-            custom_colors = json.loads(sys.argv[colors_index + 1])
-            print(f"[INFO] Couleurs personnalisées (multi): {custom_colors}")
-        except json.JSONDecodeError as e:
-            print(f"[WARNING] Format JSON invalide pour --colors: {e}")
-            custom_colors = {}
-elif "--color" in sys.argv:
-    # Support legacy single color
-    color_index = sys.argv.index("--color")
-    if color_index + 1 < len(sys.argv):
-        custom_colors = {"all": sys.argv[color_index + 1]}
-        print(f"[INFO] Couleur unique: {custom_colors['all']}")
-
-# Récupérer les panneaux supprimés (pour exclure du DXF)
-deleted_panels = []
-if "--deleted-panels" in sys.argv:
-    dp_index = sys.argv.index("--deleted-panels")
-    if dp_index + 1 < len(sys.argv):
-        try:
-            deleted_panels = json.loads(sys.argv[dp_index + 1])
-            print(f"[INFO] Panneaux à exclure du DXF: {deleted_panels}")
-        except json.JSONDecodeError as e:
-            print(f"[WARNING] Format JSON invalide pour --deleted-panels: {e}")
-            deleted_panels = []
-
-# Récupérer la structure des zones (pour segmentation des panneaux)
-zones_structure = None
-if "--zones" in sys.argv:
-    zones_index = sys.argv.index("--zones")
-    if zones_index + 1 < len(sys.argv):
-        try:
-            zones_structure = json.loads(sys.argv[zones_index + 1])
-            print(f"[INFO] Structure des zones reçue pour segmentation")
-        except json.JSONDecodeError as e:
-            print(f"[WARNING] Format JSON invalide pour --zones: {e}")
-            zones_structure = None
-
-print(f"[INFO] Génération du meuble avec prompt: {chaine}")
-print(f"[INFO] Fichier de sortie: {output_path}")
-print(f"[INFO] Mode fermé: {closed_mode}") 
-
-#chaine=retirer_espaces(chaine)
-planches=process(chaine,1,textures) 
-
+class GenerationOptions: # options d'une génération, équivalent des arguments de la ligne de commande
+    def __init__(
+        self,
+        closed=False,
+        colors=None,
+        deleted_panels=None,
+        zones=None,
+        textures_dict=None,
+        dossier_textures=None,
+        textures_externes=False,
+        poignees=False,
+        quantification=False,
+    ):
+        self.closed = closed # mode fermé (tiroirs et portes fermés)
+        self.colors = colors or {} # couleurs hex par composant {"structure": "#xxx", ...} ou {"all": "#xxx"}
+        self.deleted_panels = deleted_panels or [] # panneaux à exclure du DXF (IDs frontend)
+        self.zones = zones # structure des zones (segmentation des panneaux)
+        self.textures_dict = textures_dict # catalogue déjà chargé, sinon lu depuis panneau.json
+        self.dossier_textures = dossier_textures or os.path.join(dossier_script(), "textures")
+        self.textures_externes = textures_externes # images du GLB écrites à part (textures/<empreinte>.png à côté du GLB) au lieu d'être intégrées
+        self.poignees = poignees # poignées des portes et tiroirs dans le GLB (une instance de maillage par type)
+        self.quantification = quantification # sommets du GLB quantifiés sur 16 bits (KHR_mesh_quantization)
+
+class GenerationResult: # résultat d'une génération, toutes les données restent en mémoire
+    def __init__(self, prompt, options):
+        self.prompt = prompt
+        self.options = options
+        self.planches = [] # toutes les zones produites par process (maillages du GLB)
+        self.panneaux = [] # planches retenues pour le DXF, numérotées
+        self.groupes = [] # panneaux groupés par texture
+        self.contacts = None # GrapheContacts des panneaux
+        self.dxf = None # document ezdxf
+        self.prix = None # détail du prix (meublejson)
+        self.textures_dict = None # catalogue utilisé par la génération
+        self.timings = {} # durée de chaque étape en secondes
+        self.debut_etape = time.perf_counter()
+
+    def chronometrer(self, nom): # durée de l'étape nom, depuis la fin de la précédente
+        maintenant = time.perf_counter()
+        self.timings[nom] = maintenant - self.debut_etape
+        self.debut_etape = maintenant
+
+    @property
+    def meshes(self): # maillages trimesh exportés dans le GLB
+        return [planche.mesh for planche in self.planches if hasattr(planche, 'mesh') and planche.mesh is not None]
 
+    def __repr__(self):
+        return f"GenerationResult({self.prompt}, {len(self.panneaux)} panneaux, {self.timings.get('total', 0):.2f}s)"
 
 
 # %%
-#enregistrement des modele 3D
-# enregistre 4 models : avec sans portes et avec textures ou numéroté 
-
-for i, planche in enumerate(planches) :
-    planche.trimesh()  
+# couleurs personnalisées
+
+def hex_to_rgba(hex_color):
+    """Convertit une couleur hex en RGBA"""
+    hex_color = hex_color.lstrip('#')
+    if len(hex_color) == 6:
+        r = int(hex_color[0:2], 16)
+        g = int(hex_color[2:4], 16)
+        b = int(hex_color[4:6], 16)
+        return [r, g, b, 255]
+    return None
 
+def couleur_composant(planche, custom_colors): # SORTIE la couleur RGBA unie de la planche, None si elle garde sa texture
+    # Mapping des types de composants vers les clés de couleur
+    # Types de blocs dans le code: "tiroir", "porteg", "ported", "portec", "porte_coulissante", "socle"
+    # Clés frontend: "structure", "drawers", "doors", "base"
 
-for i, planche in enumerate(planches) :
-    planche.texturer()
+    # Déterminer quelle couleur appliquer selon le type de bloc ou le type de zone
+    color_key = None
+    bloc_type = getattr(planche, 'bloc', None)
+    zone_type = getattr(planche, 'type', None)
+
+    if bloc_type == "tiroir" or bloc_type == "tiroir_push":
+        color_key = "drawers"
+    elif bloc_type in ["porteg", "ported", "portec", "porte_coulissante", "porteg_push"]:
+        color_key = "doors"
+    elif bloc_type == "miroir":
+        # Appliquer un aspect miroir (argenté brillant)
+        return [230, 230, 235, 255]
+    elif bloc_type == "verre":
+        # Appliquer un aspect verre (plus visible mais transparent)
+        return [200, 230, 255, 140] # Alpha 140
+    elif bloc_type == "pegboard":
+        # Couleur bois perforé
+        return [139, 115, 85, 255]
+    elif bloc_type == "socle":
+        color_key = "base"
+    elif zone_type == "cloisonnement_horizontale":
+        color_key = "shelves"
+    elif zone_type == "enveloppe_f" or bloc_type == "pegboard":
+        color_key = "back"
+    elif bloc_type == "cable_hole":
+        # Le passe-câble est toujours noir
+        return [20, 20, 20, 255]
+    else:
+        # Structure (planches du corps du meuble)
+        color_key = "structure"
+
+    # Récupérer la couleur appropriée (ou "all" si couleur unique)
+    hex_color = custom_colors.get(color_key) or custom_colors.get("all")
+
+    if hex_color:
+        rgb_color = hex_to_rgba(hex_color)
+        if rgb_color:
+            print(f"[INFO] Couleur appliquée à {color_key or 'structure'} ({bloc_type or 'planche'}): {hex_color} -> RGB{rgb_color[:3]}")
+            return rgb_color
+        print(f"[WARNING] Format hex invalide pour {color_key}: {hex_color}")
+    return None
 
-# Si des couleurs personnalisées sont fournies, remplacer les textures par des couleurs unies
-if custom_colors:
+def appliquer_couleurs(planches, custom_colors): # choisit avant le texturage les planches en couleur unie : elles ne seront pas texturées
     print(f"[INFO] Application des couleurs personnalisées par composant")
 
-    def hex_to_rgba(hex_color):
-        """Convertit une couleur hex en RGBA"""
-        hex_color = hex_color.lstrip('#')
-        if len(hex_color) == 6:
-            r = int(hex_color[0:2], 16)
-            g = int(hex_color[2:4], 16)
-            b = int(hex_color[4:6], 16)
-            return [r, g, b, 255]
+    for planche in planches:
+        if not hasattr(planche, 'mesh') or planche.mesh is None:
+            continue
+        planche.couleur = couleur_composant(planche, custom_colors)
+
+
+# %%
+# poignées des portes et tiroirs
+
+def quaternion_axe_z(axe): # SORTIE quaternion (x, y, z, w) de la rotation qui amène l'axe z local sur axe
+    axe = axe / np.linalg.norm(axe)
+    c = axe[2]
+    if c < -1 + 1e-9:
+        return [1.0, 0.0, 0.0, 0.0] # demi tour autour de x
+    v = np.cross([0.0, 0.0, 1.0], axe)
+    s = np.sqrt((1 + c) * 2)
+    return [v[0] / s, v[1] / s, v[2] / s, s / 2]
+
+class BibliothequePoignees: # maillages de référence des poignées, tessellés une fois par processus et instanciés par noeud
+    LONGUEUR = 100.0 # mm : longueur des barres et côté du cube de référence, ramenés à la bonne taille par l'échelle du noeud
+
+    def __init__(self):
+        self.maillages = {} # forme -> (sommets, triangles)
+
+    def maillage(self, forme):
+        if forme not in self.maillages:
+            if forme == "bouton":
+                mesh = trimesh.creation.uv_sphere(radius=15)
+            elif forme == "encastree": # cube, dimensions portées par l'échelle du noeud
+                mesh = trimesh.creation.box(extents=[self.LONGUEUR] * 3)
+            else: # barre de diamètre 16 selon z, longueur portée par l'échelle du noeud
+                mesh = trimesh.creation.cylinder(radius=8, height=self.LONGUEUR)
+            self.maillages[forme] = (mesh.vertices, mesh.faces)
+        return self.maillages[forme]
+
+bibliotheque_poignees = BibliothequePoignees()
+
+def placement_poignee(planche): # SORTIE (forme, couleur, translation, rotation, échelle) de la poignée de la planche, None si elle n'en a pas
+    if planche.type != "enveloppe_a": # seules les façades portent une poignée, pas les côtés ni le fond des caissons de tiroir
         return None
 
-    # Mapping des types de composants vers les clés de couleur
-    # Types de blocs dans le code: "tiroir", "porteg", "ported", "portec", "porte_coulissante", "socle"
-    # Clés frontend: "structure", "drawers", "doors", "base"
+    # Déterminer le type de poignée (priorité au type spécifié, sinon défaut pour portes/tiroirs)
+    h_type = getattr(planche, 'handle_type', None)
+
+    # Pas de poignée pour les systèmes push-to-open ou si explicitement désactivé (code 0)
+    is_push = planche.bloc and "push" in str(planche.bloc)
+    if h_type is None and not is_push and planche.bloc in ["porteg", "ported", "tiroir"]:
+        h_type = 1 # Barre verticale par défaut
+    if not h_type:
+        return None
+
+    try:
+        # Trouver la face avant pour positionner la poignée
+        face_front = [f for f in planche.listface if f.label == "a"][0]
+    except IndexError:
+        print(f"[WARNING] Pas de face avant pour la poignée de {planche.nom}")
+        return None
+    points_face = planche.points[face_front.contour]
+    normal = face_front.equation[:3]
+    centre_face = np.mean(points_face, axis=0)
+
+    # Calculer vecteurs pour largeur/hauteur locale
+    # normalv est [-1, 0, 0] (gauche), normalh est [0, -1, 0] (bas)
+    u_horiz = -planche.normalv # Vers la droite
+    u_vert = -planche.normalh  # Vers le haut
+
+    # Dimensions de la face
+    scalars_h = points_face @ u_horiz
+    scalars_v = points_face @ u_vert
+    w_face = np.max(scalars_h) - np.min(scalars_h)
+    h_face = np.max(scalars_v) - np.min(scalars_v)
+
+    # Positionnement horizontal
+    offset_x = 0
+    if planche.bloc == "porteg": # Charnières à gauche, poignée à droite
+        offset_x = w_face/2 - 40
+    elif planche.bloc == "ported": # Charnières à droite, poignée à gauche
+        offset_x = -(w_face/2 - 40)
+
+    pos_h = centre_face + offset_x * u_horiz + 15 * normal # Devant la face
+
+    longueur = BibliothequePoignees.LONGUEUR
+    if h_type == 3: # Knob
+        return "bouton", [192, 192, 192, 255], pos_h, None, None
+    if h_type == 2: # Horizontal bar
+        return "barre", [192, 192, 192, 255], pos_h, quaternion_axe_z(u_horiz), [1, 1, min(w_face*0.6, 120) / longueur]
+    if h_type == 4: # Recessed, un peu enfoncé
+        return "encastree", [40, 40, 40, 255], pos_h - 12 * normal, None, np.array([min(w_face*0.5, 80), 20, 5]) / longueur
+    # Default 1: Vertical bar
+    return "barre", [192, 192, 192, 255], pos_h, quaternion_axe_z(u_vert), [1, 1, min(h_face * 0.3, 300) / longueur]
+
+
+# %%
+# export du modèle 3D
+
+def decalage_ouverture(planche): # décalage des façades en mode ouvert, None si la planche ne bouge pas
+    if planche.bloc in ["tiroir", "tiroir_push"]:
+        # Décalage vers l'avant (-normala car normala pointe vers le fond)
+        return -300 * planche.normala
+    elif planche.bloc in ["porteg", "ported", "porteg_push", "miroir"]:
+        # Petite ouverture pour les portes
+        return -20 * planche.normala
+    # On pourrait aussi ajouter l'ouverture des portes ici si souhaité
+    return None
+
+def ajouter_maillage_glb(ecrivain, mesh, couleur=None, instances=None):
+    """
+    Écrit un maillage trimesh avec son apparence (couleur unie, texture,
+    couleurs par sommet ou rien), dans son repère local : les sommets sont
+    ramenés au coin minimal de la boîte englobante.
 
+    Les planches identiques à une translation près (tiroirs d'une pile,
+    étagères d'un H6...) ont la même empreinte locale et la même apparence :
+    le maillage n'est écrit qu'une fois et chaque planche en est une instance.
+
+    Returns:
+        (index du maillage glTF, origine du repère local en mm)
+    """
+    origine = mesh.vertices.min(axis=0)
+    sommets = mesh.vertices - origine
+    materiau, uvs, couleurs = None, None, None
+    visual = mesh.visual
+    if couleur is not None: # un matériau partagé par couleur plutôt qu'une couleur recopiée sur chaque sommet
+        materiau = ecrivain.ajouter_materiau_couleur(couleur)
+    elif visual.kind == "texture" and getattr(visual.material, "image", None) is not None:
+        png = cache_textures.png(visual.material.image) # textures du catalogue : une image et un matériau pour toutes les planches
+        octets, empreinte = png if png is not None else (encoder_png(visual.material.image), None)
+        materiau = ecrivain.ajouter_materiau_texture(octets, empreinte=empreinte)
+        uvs = np.column_stack([visual.uv[:, 0], 1.0 - visual.uv[:, 1]]) # origine des UV glTF en haut à gauche de l'image
+    elif visual.kind in ("vertex", "face"):
+        couleurs = visual.vertex_colors
+
+    cle = None
+    if instances is not None:
+        cle = (
+            (np.round(sommets, 6) + 0.0).tobytes(), # + 0.0 : -0.0 et 0.0 ont la même empreinte
+            np.asarray(mesh.faces).tobytes(),
+            materiau,
+            None if uvs is None else np.round(uvs, 6).astype(np.float32).tobytes(),
+            None if couleurs is None else np.asarray(couleurs, dtype=np.uint8).tobytes(),
+        )
+        if cle in instances:
+            return instances[cle], origine
+    maillage = ecrivain.ajouter_maillage(sommets, mesh.faces, uvs=uvs, couleurs=couleurs, materiau=materiau)
+    if cle is not None:
+        instances[cle] = maillage
+    return maillage, origine
+
+def exporter_glb(resultat, output_path, closed=None, chemin_autre_variante=None): # écrit aussi la variante ouverte/fermée opposée si chemin_autre_variante est donné
+    if closed is None:
+        closed = resultat.options.closed
+    planches = resultat.planches
+
+    # Un noeud par maillage pour mieux gérer la transparence et les matériaux
+    # L'ouverture des tiroirs et portes est portée par la transformation du noeud : les sommets ne bougent pas,
+    # et les variantes ouverte et fermée partagent les mêmes tampons
+    dossier_images = None
+    if resultat.options.textures_externes:
+        dossier_images = os.path.join(os.path.dirname(os.path.abspath(output_path)), "textures")
+    pas_quantification = None
+    if resultat.options.quantification:
+        # Pas commun à tous les maillages (repères locaux, poignées comprises) : la plus grande dimension tient sur 16 bits
+        etendue = max([300.0] + [float(np.ptp(planche.mesh.vertices, axis=0).max()) for planche in planches if getattr(planche, 'mesh', None) is not None])
+        pas_quantification = etendue / 32767
+    ecrivain = EcrivainGLB(dossier_images=dossier_images, prefixe_uri_images="textures/", pas_quantification=pas_quantification)
+    mobiles = [] # (noeud, position fermée, décalage d'ouverture) des tiroirs et portes
+    instances = {} # empreinte locale -> index du maillage glTF, partagé par les planches identiques
+    maillages_poignees = {} # forme -> index du maillage glTF, une instance par poignée
+    i = 0
     for planche in planches:
         if not hasattr(planche, 'mesh') or planche.mesh is None:
             continue
+        maillage, origine = ajouter_maillage_glb(ecrivain, planche.mesh, planche.couleur, instances)
+        noeud = ecrivain.ajouter_noeud(f"mesh_{i}", maillage, translation=origine)
+        shift = decalage_ouverture(planche)
+        if shift is not None:
+            mobiles.append((noeud, origine, shift))
+        i += 1
+        if resultat.options.poignees:
+            placement = placement_poignee(planche)
+            if placement is not None:
+                forme, couleur, translation, rotation, echelle = placement
+                if forme not in maillages_poignees:
+                    sommets, triangles = bibliotheque_poignees.maillage(forme)
+                    maillages_poignees[forme] = ecrivain.ajouter_maillage(sommets, triangles, materiau=ecrivain.ajouter_materiau_couleur(couleur), nom=f"poignee_{forme}")
+                # Noeud enfant de la façade : la poignée suit l'ouverture
+                ecrivain.ajouter_noeud(f"poignee_{planche.nom}", maillages_poignees[forme], translation - origine, rotation, echelle, parent=noeud)
+
+    # Animation "ouverture" (position fermée -> ouverte) : un seul GLB suffit pour animer le meuble
+    if mobiles:
+        ecrivain.ajouter_animation_translation("ouverture", [(noeud, origine, origine + shift) for noeud, origine, shift in mobiles])
+
+    variantes = [(closed, output_path)]
+    if chemin_autre_variante:
+        variantes.append((not closed, chemin_autre_variante))
+    for ferme, chemin in variantes:
+        for noeud, origine, shift in mobiles:
+            ecrivain.deplacer_noeud(noeud, origine if ferme else origine + shift)
+        # Export vers le chemin spécifié par l'API, conversion mm -> m par le noeud racine
+        ecrivain.ecrire(chemin, echelle=0.001)
+        print(f"[INFO] Fichier GLB généré ({'fermé' if ferme else 'ouvert'}): {chemin}")
+
+def couleur_apercu(planche, textures_dict, dossier_textures): # couleur unie de la planche dans l'aperçu : la sienne, sinon la teinte moyenne de sa texture
+    if planche.couleur is not None:
+        return planche.couleur
+    if not planche.planche:
+        return None
+    texture_obj = resoudre_texture(planche.texture, textures_dict)
+    if not texture_obj:
+        return None
+    return cache_textures.couleur_moyenne(os.path.join(dossier_textures, texture_obj.nom + ".png"))
 
-        # Déterminer quelle couleur appliquer selon le type de bloc ou le type de zone
-        color_key = None
-        bloc_type = getattr(planche, 'bloc', None)
-        zone_type = getattr(planche, 'type', None)
-
-        if bloc_type == "tiroir" or bloc_type == "tiroir_push":
-            color_key = "drawers"
-        elif bloc_type in ["porteg", "ported", "portec", "porte_coulissante", "porteg_push"]:
-            color_key = "doors"
-        elif bloc_type == "miroir":
-            # Appliquer un aspect miroir (argenté brillant)
-            planche.mesh.visual = trimesh.visual.ColorVisuals(
-                mesh=planche.mesh,
-                vertex_colors=[230, 230, 235, 255]
-            )
-            continue
-        elif bloc_type == "verre":
-            # Appliquer un aspect verre (plus visible mais transparent)
-            planche.mesh.visual = trimesh.visual.ColorVisuals(
-                mesh=planche.mesh,
-                vertex_colors=[200, 230, 255, 140] # Alpha 140
-            )
-            continue
-        elif bloc_type == "pegboard":
-            # Couleur bois perforé
-            planche.mesh.visual = trimesh.visual.ColorVisuals(
-                mesh=planche.mesh,
-                vertex_colors=[139, 115, 85, 255]
-            )
-            continue
-        elif bloc_type == "socle":
-            color_key = "base"
-        elif zone_type == "cloisonnement_horizontale":
-            color_key = "shelves"
-        elif zone_type == "enveloppe_f" or bloc_type == "pegboard":
-            color_key = "back"
-        elif bloc_type == "cable_hole":
-            # Le passe-câble est toujours noir
-            planche.mesh.visual = trimesh.visual.ColorVisuals(
-                mesh=planche.mesh,
-                vertex_colors=[20, 20, 20, 255]
-            )
-            continue
-        else:
-            # Structure (planches du corps du meuble)
-            color_key = "structure"
-
-        # Récupérer la couleur appropriée (ou "all" si couleur unique)
-        hex_color = custom_colors.get(color_key) or custom_colors.get("all")
-
-        if hex_color:
-            rgb_color = hex_to_rgba(hex_color)
-            if rgb_color:
-                planche.mesh.visual = trimesh.visual.ColorVisuals(
-                    mesh=planche.mesh,
-                    vertex_colors=rgb_color
-                )
-                print(f"[INFO] Couleur appliquée à {color_key or 'structure'} ({bloc_type or 'planche'}): {hex_color} -> RGB{rgb_color[:3]}")
-            else:
-                print(f"[WARNING] Format hex invalide pour {color_key}: {hex_color}")
+def exporter_apercu(resultat, output_path, closed=None): # GLB grossier écrit dès que les planches sont maillées
+    """
+    Aperçu affiché pendant que le modèle complet est calculé : une couleur unie
+    par planche (teinte moyenne de sa texture), sans UV ni poignées, et toutes
+    les planches d'une même couleur fusionnées en un seul maillage. Les façades
+    sont recopiées à leur position ouverte ou fermée, sans animation.
 
+    N'a besoin que de generer_geometrie : ni texturage, ni alésages, ni DXF.
+    """
+    if closed is None:
+        closed = resultat.options.closed
+    groupes = {} # couleur -> (liste des sommets, liste des triangles, nombre de sommets)
+    for planche in resultat.planches:
+        if not hasattr(planche, 'mesh') or planche.mesh is None:
+            continue
+        couleur = couleur_apercu(planche, resultat.textures_dict, resultat.options.dossier_textures)
+        cle = None if couleur is None else tuple(couleur)
+        sommets, triangles, nombre = groupes.setdefault(cle, ([], [], [0]))
+        shift = None if closed else decalage_ouverture(planche)
+        sommets.append(planche.mesh.vertices if shift is None else planche.mesh.vertices + shift)
+        triangles.append(np.asarray(planche.mesh.faces) + nombre[0])
+        nombre[0] += len(planche.mesh.vertices)
+
+    ecrivain = EcrivainGLB()
+    for i, (cle, (sommets, triangles, _)) in enumerate(groupes.items()):
+        materiau = None if cle is None else ecrivain.ajouter_materiau_couleur(list(cle))
+        maillage = ecrivain.ajouter_maillage(np.vstack(sommets), np.vstack(triangles), materiau=materiau)
+        ecrivain.ajouter_noeud(f"apercu_{i}", maillage)
+    ecrivain.ecrire(output_path, echelle=0.001)
+    print(f"[INFO] Aperçu GLB généré: {output_path}")
 
-# La génération des fichiers (GLB et DXF) a été déplacée à la fin du script 
-# pour inclure les alésages de montage et les numérotations.
 
-# Appliquer l'ouverture des tiroirs seulement si on n'est pas en mode fermé
-if not closed_mode:
-    for planche in planches :
-        if planche.bloc in ["tiroir", "tiroir_push"]:
-            # Décalage vers l'avant (-normala car normala pointe vers le fond)
-            shift = -300 * planche.normala
-            planche.mesh.vertices += shift
-            planche.points += shift
-        elif planche.bloc in ["porteg", "ported", "porteg_push", "miroir"]:
-            # Petite ouverture pour les portes
-            shift = -20 * planche.normala
-            planche.mesh.vertices += shift
-            planche.points += shift
-        # On pourrait aussi ajouter l'ouverture des portes ici si souhaité
-
-# Génération des poignées (Désactivé à la demande de l'utilisateur)
-handle_meshes = []
-# for planche in planches:
-#     # Déterminer le type de poignée (priorité au type spécifié, sinon défaut pour portes/tiroirs)
-#     h_type = getattr(planche, 'handle_type', None)
-#     
-#     # Pas de poignée pour les systèmes push-to-open ou si explicitement désactivé (ex: code 0 si on en ajoutait un)
-#     is_push = planche.bloc and "push" in str(planche.bloc)
-#     if not h_type and not is_push and planche.bloc in ["porteg", "ported", "tiroir"]:
-#         h_type = 1 # Barre verticale par défaut
-#         
-#     if h_type:
-#         try:
-#             # Trouver la face avant pour positionner la poignée
-#             face_front = [f for f in planche.listface if f.label == "a"][0]
-#             points_face = planche.points[face_front.contour]
-#             normal = face_front.equation[:3]
-#             centre_face = np.mean(points_face, axis=0)
-#             
-#             # Calculer vecteurs pour largeur/hauteur locale
-#             # normalv est [-1, 0, 0] (gauche), normalh est [0, -1, 0] (bas)
-#             u_horiz = -planche.normalv # Vers la droite
-#             u_vert = -planche.normalh  # Vers le haut
-#             
-#             # Dimensions de la face
-#             scalars_h = points_face @ u_horiz
-#             scalars_v = points_face @ u_vert
-#             w_face = np.max(scalars_h) - np.min(scalars_h)
-#             h_face = np.max(scalars_v) - np.min(scalars_v)
-#             
-#             # Positionnement horizontal
-#             offset_x = 0
-#             if planche.bloc == "porteg": # Charnières à gauche, poignée à droite
-#                 offset_x = w_face/2 - 40
-#             elif planche.bloc == "ported": # Charnières à droite, poignée à gauche
-#                 offset_x = -(w_face/2 - 40)
-#             elif planche.bloc in ["tiroir", "tiroir_push"]:
-#                 offset_x = 0
-#                 
-#             pos_h = centre_face + offset_x * u_horiz + 15 * normal # Devant la face
-#             
-#             h_mesh = None
-#             if h_type == 3: # Knob
-#                 h_mesh = trimesh.creation.uv_sphere(radius=15)
-#                 h_mesh.apply_translation(pos_h)
-#             elif h_type == 2: # Horizontal bar
-#                 h_mesh = create_cylinder(16, min(w_face*0.6, 120), pos_h, u_horiz)
-#             elif h_type == 4: # Recessed
-#                 h_mesh = trimesh.creation.box(extents=[min(w_face*0.5, 80), 20, 5])
-#                 h_mesh.apply_translation(pos_h - 12 * normal) # Un peu enfoncé
-#                 h_mesh.visual = trimesh.visual.ColorVisuals(mesh=h_mesh, vertex_colors=[40, 40, 40, 255])
-#             else: # Default 1: Vertical bar
-#                 bar_len = min(h_face * 0.3, 300)
-#                 # Orienter verticalement (le long de u_vert)
-#                 h_mesh = create_cylinder(16, bar_len, pos_h, u_vert)
-#             
-#             if h_mesh:
-#                 if h_type != 4:
-#                     h_mesh.visual = trimesh.visual.ColorVisuals(mesh=h_mesh, vertex_colors=[192, 192, 192, 255])
-#                 handle_meshes.append(h_mesh)
-#         except Exception as e:
-#             print(f"[WARNING] Erreur generation poignée sur {planche.nom}: {e}")
-
-# Concatenation de toutes les mailles pour l'export final (Utiliser une Scene pour préserver les matériaux/transparence)
-all_meshes = [planche.mesh for planche in planches if hasattr(planche, 'mesh') and planche.mesh is not None]
-all_meshes.extend(handle_meshes)
-
-# Créer une scène au lieu de concaténer pour mieux gérer la transparence et les matériaux
-scene = trimesh.Scene()
-for i, m in enumerate(all_meshes):
-    scene.add_geometry(m, node_name=f"mesh_{i}")
-
-# Conversion mm -> m pour le GLB
-scene.apply_scale(0.001)
-
-# Export vers le chemin spécifié par l'API
-scene.export(output_path)
-print(f"[INFO] Fichier GLB généré: {output_path}")
-
-# Si on n'est pas en mode fermé, on remet les tiroirs à leur place pour la suite (calculs d'alésages etc)
-if not closed_mode:
-    for planche in planches :
-        if planche.bloc in ["tiroir", "tiroir_push"]:
-            shift = +300 * planche.normala
-            planche.mesh.vertices += shift
-            planche.points += shift
-        elif planche.bloc in ["porteg", "ported", "porteg_push", "miroir"]:
-            shift = +20 * planche.normala
-            planche.mesh.vertices += shift
-            planche.points += shift
-
-# Filtrer uniquement les vraies planches pour le DXF et la suite
-planches = [p for p in planches if (hasattr(p, 'planche') and p.planche) and getattr(p, 'bloc', None) != "coulisse"]
+# %%
+# sélection des panneaux du DXF
 
 # Fonction pour générer un ID compatible avec le frontend pour chaque planche
 def get_panel_id(planche, index):
@@ -2153,7 +2222,7 @@ def get_panel_id(planche, index):
     zone_type = getattr(planche, 'type', '') if hasattr(planche, 'type') else ''
     if hasattr(planche, 'zone') and hasattr(planche.zone, 'type'):
         zone_type = planche.zone.type
-    
+
     # Mapper les types Python vers les types frontend
     type_mapping = {
         'enveloppe_g': 'left',
@@ -2164,9 +2233,9 @@ def get_panel_id(planche, index):
         'cloisonnement_verticale': 'separator-vertical',
         'cloisonnement_horizontale': 'separator-horizontal',
     }
-    
+
     panel_type = type_mapping.get(zone_type, None)
-    
+
     if panel_type:
         if panel_type.startswith('separator'):
             # Pour les séparateurs, on utilise l'index
@@ -2175,7 +2244,7 @@ def get_panel_id(planche, index):
             # Pour les panneaux de structure, on utilise 0-0 par défaut
             # (le frontend utilise row-col pour des meubles multi-cellules)
             return f"{panel_type}-0-0"
-    
+
     return None
 
 # Helper function: analyser la structure des zones pour déterminer le nombre de segments
@@ -2244,7 +2313,10 @@ def convert_frontend_id_to_backend(frontend_id, zones_structure):
     return None
 
 # Filtrer les panneaux supprimés pour le DXF
-if deleted_panels and len(deleted_panels) > 0:
+def filtrer_panneaux_supprimes(planches, deleted_panels, zones_structure):
+    if not deleted_panels:
+        return planches
+
     original_count = len(planches)
 
     # Analyser les panneaux supprimés pour comprendre la segmentation
@@ -2305,227 +2377,387 @@ if deleted_panels and len(deleted_panels) > 0:
 
     planches = planches_filtered
     print(f"[INFO] {original_count - len(planches)} planches exclues du DXF sur {original_count}")
-
-# Numéroter les planches pour le DXF
-for i, p in enumerate(planches):
-    p.nom = str(i + 1) # Commencer à 1 pour être plus naturel
-
-# Grouper les planches par texture pour le DXF
-groupes = sectionner_par_texture(planches)
-
-
+    return planches
 
 
 # %%
 # config des alesages
 
-def config(planchechant,plancheplat):
-    alesage_etagere_plat = 1  #à creer 
-    alesage_etagere_chant = 1 #à creer 
-
-    alesage_tourillon = Alesage(positionsnu=np.array([0,0,0]),rayon=3,profondeur=15,distance_au_coin=60,face_usinage="plat",couleur="red")
-    alesage_tourillong = Alesage(positionsnu=np.array([-32,0,0]),rayon=4,profondeur=15,distance_au_coin=60,face_usinage="plat",couleur="red")
-    alesage_tourillond = Alesage(positionsnu=np.array([32,0,0]),rayon=4,profondeur=15,distance_au_coin=60,face_usinage="plat",couleur="red")
-
-    alesage_equerre_plat = Alesage(positionsnu=np.array([0,0,17.5]),rayon=2.5,profondeur=10,face_usinage="plat",couleur="red")
-    alesage_equerre_chant = Alesage(positionsnu=np.array([0,-10,0]),rayon=2.5,profondeur=10,face_usinage="chant",couleur="red")
-
-    alesage_excentrique_chant = Alesage(positionsnu=np.array([0,-34,0]),rayon=7.5,profondeur=15,distance_au_coin=60,face_usinage="chant",couleur="green")
-    alesage_excentrique_plat = Alesage(positionsnu=np.array([0,0,0]),rayon=2.5,profondeur=10,distance_au_coin=60,face_usinage="plat",couleur="pink")
-
-    alesage_porte_plat= Alesage(positionsnu=np.array([0,0,15]),rayon=17.5,profondeur=12.8,face_usinage="plat",distance_au_coin=100,couleur="blue")
-    alesage_porte_chant1= Alesage(positionsnu=np.array([16,-37,0]),rayon=1.5,profondeur=5,face_usinage="chant",distance_au_coin=100, couleur="grey")
-    alesage_porte_chant2= Alesage(positionsnu=np.array([-16,-37,0]),rayon=1.5,profondeur=5,face_usinage="chant",distance_au_coin=100,couleur="grey")
-
-
+GabaritAlesage = namedtuple("GabaritAlesage", ["positionsnu", "rayon", "profondeur", "distance_au_coin", "face_usinage", "couleur", "type"]) # alésage type d'une règle, jamais modifié
+
+class ReglesAlesages: # règles de perçage des assemblages lues dans regles_alesages.json, relues seulement si le fichier change
+    # Une règle associe (chant_bloc, chant_type, plat_bloc, plat_type) à une liste de gabarits, la première règle qui
+    # correspond l'emporte. Chaque clé rencontrée n'est résolue qu'une fois : la table cle -> gabarits se remplit
+    # au fil des générations et sert toutes les planches suivantes.
+    CHAMPS = ("chant_bloc", "chant_type", "plat_bloc", "plat_type")
+
+    def __init__(self):
+        self.chemin = None
+        self.date = None
+        self.regles = [] # (conditions par champ (None : toute valeur), gabarits)
+        self.table = {} # (chant_bloc, chant_type, plat_bloc, plat_type) -> tuple de gabarits, None si aucune règle
+
+    def charger(self, json_file=None): # ENTREE chemin des règles, par défaut regles_alesages.json à côté de ce script
+        if json_file is None:
+            json_file = os.path.join(dossier_script(), "regles_alesages.json")
+        date = os.path.getmtime(json_file)
+        if (json_file, date) != (self.chemin, self.date):
+            with open(json_file, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            gabarits = {}
+            for nom, champs in data.get("gabarits", {}).items():
+                positionsnu = np.array(champs["positionsnu"], dtype=float)
+                positionsnu.flags.writeable = False
+                gabarits[nom] = GabaritAlesage(
+                    positionsnu=positionsnu,
+                    rayon=champs.get("rayon", 6),
+                    profondeur=champs.get("profondeur", 15),
+                    distance_au_coin=champs.get("distance_au_coin", 50),
+                    face_usinage=champs.get("face_usinage", "chant"),
+                    couleur=champs.get("couleur", "red"),
+                    type=champs.get("type", "cylindre"),
+                )
+            regles = []
+            for regle in data.get("regles", []):
+                conditions = tuple(
+                    None if champ not in regle else frozenset(regle[champ] if isinstance(regle[champ], list) else [regle[champ]])
+                    for champ in self.CHAMPS
+                )
+                regles.append((conditions, tuple(gabarits[nom] for nom in regle["alesages"])))
+            self.chemin, self.date, self.regles, self.table = json_file, date, regles, {}
+            print(f"[INFO] {len(regles)} règles d'alésage chargées depuis {json_file}")
+        return self
+
+    def gabarits(self, planchechant, plancheplat): # ENTREE face chant et face plat en contact SORTIE tuple de gabarits, None si aucune règle
+        cle = (planchechant.zone.bloc, planchechant.zone.type, plancheplat.zone.bloc, plancheplat.zone.type)
+        if cle not in self.table:
+            self.table[cle] = next(
+                (gabarits for conditions, gabarits in self.regles
+                 if all(condition is None or valeur in condition for condition, valeur in zip(conditions, cle))),
+                None,
+            )
+        return self.table[cle]
 
-    if plancheplat.zone.bloc == None :
-        if planchechant.zone.bloc == None :
-            if planchechant.zone.type == "enveloppe_h" or planchechant.zone.type == "enveloppe_b" or planchechant.zone.type == "enveloppe_d" or planchechant.zone.type == "enveloppe_g" or planchechant.zone.type == "enveloppe_f" :
-                if plancheplat.zone.type == "enveloppe_h" or plancheplat.zone.type == "enveloppe_b" or plancheplat.zone.type == "enveloppe_d" or plancheplat.zone.type == "enveloppe_g" or plancheplat.zone.type == "enveloppe_f" :
-                    return [alesage_excentrique_plat,alesage_excentrique_chant,alesage_tourillond ,alesage_tourillong]
-                elif plancheplat.zone.type == "cloisonnement_horizontale" or plancheplat.zone.type == "cloisonnement_verticale" or plancheplat.zone.type == "cloisonnement_avant" :
-                    return []
-            elif  planchechant.zone.type == "cloisonnement_verticale" :
-                if plancheplat.zone.type == "enveloppe_h" or plancheplat.zone.type == "enveloppe_b" or plancheplat.zone.type == "enveloppe_d" or plancheplat.zone.type == "enveloppe_g" or plancheplat.zone.type == "enveloppe_f" or plancheplat.zone.type == "cloisonnement_horizontale"  :
-                    return [alesage_excentrique_plat,alesage_excentrique_chant,alesage_tourillond ,alesage_tourillong]
-            elif  planchechant.zone.type == "cloisonnement_avant" or planchechant.zone.type == "cloisonnement_horizontale" :
-                return [alesage_equerre_plat,alesage_equerre_chant]
-        elif planchechant.zone.bloc == "socle" and planchechant.zone.type == "cloisonnement_horizontale":
-            return [alesage_excentrique_plat,alesage_excentrique_chant,alesage_tourillond ,alesage_tourillong]
+regles_alesages = ReglesAlesages() # partagées par toutes les générations d'un même processus (serveur_generation)
 
-            
-    elif plancheplat.zone.bloc == "porteg"  :
-        if planchechant.zone.type=="enveloppe_g" :
-            return [alesage_porte_plat,alesage_porte_chant1,alesage_porte_chant2]
-    elif plancheplat.zone.bloc == "ported"  :
-        if planchechant.zone.type=="enveloppe_d" :
-            return [alesage_porte_plat,alesage_porte_chant1,alesage_porte_chant2]        
-    elif plancheplat.zone.bloc == "tiroir":
-        if planchechant.zone.type == "enveloppe_a" or planchechant.zone.type == "enveloppe_b" or planchechant.zone.type == "enveloppe_d" or planchechant.zone.type == "enveloppe_g" or planchechant.zone.type == "enveloppe_f" :
-            if plancheplat.zone.type == "enveloppe_h" or plancheplat.zone.type == "enveloppe_b" or plancheplat.zone.type == "enveloppe_d" or plancheplat.zone.type == "enveloppe_g" or plancheplat.zone.type == "enveloppe_f" or plancheplat.zone.type == "enveloppe_a":
-                return [alesage_excentrique_plat,alesage_excentrique_chant,alesage_tourillond ,alesage_tourillong]
-            elif plancheplat.zone.type == "cloisonnement_horizontale" or plancheplat.zone.type == "cloisonnement_verticale" or plancheplat.zone.type == "cloisonnement_avant" :
-                return [alesage_tourillon]
-        elif  planchechant.zone.type == "cloisonnement_verticale" :
-            if plancheplat.zone.type == "enveloppe_h" or plancheplat.zone.type == "enveloppe_b" or plancheplat.zone.type == "enveloppe_d" or plancheplat.zone.type == "enveloppe_g" or plancheplat.zone.type == "enveloppe_f" :
-                return [alesage_excentrique_plat,alesage_excentrique_chant,alesage_tourillond ,alesage_tourillong]
-        elif  planchechant.zone.type == "cloisonnement_avant" or planchechant.zone.type == "cloisonnement_horizontale" :
-            return [alesage_tourillon]
+def config(planchechant,plancheplat): # gabarits d'alésage de l'assemblage (face chant, face plat), None si aucune règle
+    return regles_alesages.charger().gabarits(planchechant,plancheplat)
 
 
+# %%
+#coupes biaises détection des coupes biaies
+def detecter_biseaux(planches):
+    for planche in planches :
+        normale=planche.plan[:3]
+        for face in planche.listface :
+            if face.chant :
+                if abs(np.dot(normale,face.equation[:3]))>0.01:
+                    planche.biseau=abs(np.arccos(np.dot(normale,face.equation[:3]))*180/np.pi-90)
 
 
 # %%
-#coupes biaises détection des coupes biaies 
-for planche in planches :
-    normale=planche.plan[:3]
-    for face in planche.listface :
-        if face.chant :
-            if abs(np.dot(normale,face.equation[:3]))>0.01:
-                planche.biseau=abs(np.arccos(np.dot(normale,face.equation[:3]))*180/np.pi-90)
-
+#placement par doublet
+class GrapheContacts: # graphe des contacts plat / chant entre panneaux, lu sur les faces d'origine tenues à jour par clip
+    # Deux faces sont en contact quand la face d'origine de l'une est au dos (faceoppose) de la face d'origine de l'autre.
+    # Chaque découpe transmet la face d'origine (racine) aux faces qu'elle crée : les faces des panneaux sont indexées
+    # par l'opposée de leur racine, et les contacts de chaque panneau sont rangés une fois pour toutes.
+    def __init__(self, planches):
+        self.planches = list(planches)
+        self.par_planche = {} # id(planche) -> doublets (plat, chant) dont le plat est une face de la planche
+        self.par_chant = {} # id(planche) -> doublets (plat, chant) dont le chant est une face de la planche
+        par_opposee = {} # id(face d'origine opposée) -> faces des panneaux, dans l'ordre des panneaux
+        for planche in self.planches:
+            for face in planche.listface:
+                par_opposee.setdefault(id(face.racine.faceoppose), []).append(face)
 
+        for planche in self.planches:
+            doublets = self.par_planche[id(planche)] = []
+            for face in planche.listface :
+                if face.chant :
+                    continue
+                for faceoppose in par_opposee.get(id(face.racine), []) : #les faces sont en contact
+                    if faceoppose.chant : # Les faces sont chant et non chants
+                        if np.abs(np.dot(faceoppose.equation[:3],faceoppose.zone.face_usine.equation[:3]))<0.05 : # orthogonalité 
+                            doublets.append((face, faceoppose)) #doublet : [plat chant]
+                            self.par_chant.setdefault(id(faceoppose.zone), []).append((face, faceoppose))
+
+    def contacts(self, planche): # doublets (plat, chant) où la planche porte le plat
+        return self.par_planche.get(id(planche), [])
+
+    def voisines(self, planche): # planches en contact avec la planche, par son plat puis par son chant
+        voisines = {}
+        for face, faceoppose in self.contacts(planche):
+            voisines.setdefault(id(faceoppose.zone), faceoppose.zone)
+        for face, faceoppose in self.par_chant.get(id(planche), []):
+            voisines.setdefault(id(face.zone), face.zone)
+        return list(voisines.values())
+
+    def doublets(self): # tous les doublets (plat, chant), panneau par panneau
+        return [doublet for planche in self.planches for doublet in self.contacts(planche)]
+
+def alesages_contacts(planches, graphe): # SORTIE (lignes DTYPE_ALESAGES, index de la planche de chaque ligne) des alésages de tous les contacts plat / chant
+    regles = regles_alesages.charger()
+    vide = (np.zeros(0, dtype=DTYPE_ALESAGES), np.zeros(0, dtype=int))
+
+    contacts = [] # (face plat, face chant, gabarits) des contacts qui reçoivent des alésages
+    for face, faceoppose in graphe.doublets() :
+        gabarits = regles.gabarits(faceoppose,face)
+        if gabarits :
+            contacts.append((face, faceoppose, gabarits))
+    if not contacts :
+        return vide
+
+    # Segment de contact : milieux des arêtes du chant coupées par le plan médian de la planche (slice sur les deux extrémités),
+    # les deux premières dans l'ordre du contour. Toutes les arêtes de tous les contacts sont traitées ensemble.
+    aretes = [faceoppose.zone.points[faceoppose.segments()] for face, faceoppose, gabarits in contacts]
+    nombres = np.array([len(segments) for segments in aretes])
+    aretes = np.concatenate(aretes) # (A, 2, 3)
+    contact_arete = np.repeat(np.arange(len(contacts)), nombres)
+    plans = np.array([faceoppose.zone.plan for face, faceoppose, gabarits in contacts])[contact_arete]
+    a, b, c, d = plans.T
+    cotes = a[:, None] * aretes[:, :, 0] + b[:, None] * aretes[:, :, 1] + c[:, None] * aretes[:, :, 2] + d[:, None] > 0
+    coupees = cotes[:, 0] != cotes[:, 1]
+    cumul = np.cumsum(coupees)
+    debuts = np.cumsum(nombres) - nombres
+    rang = cumul - (cumul - coupees)[debuts][contact_arete] # rang de l'arête coupée dans son contact (1, 2, ...)
+    milieux = (aretes[:, 0] + aretes[:, 1]) / 2
+    p0 = np.zeros((len(contacts), 3))
+    p1 = np.zeros((len(contacts), 3))
+    premieres = coupees & (rang == 1)
+    secondes = coupees & (rang == 2)
+    p0[contact_arete[premieres]] = milieux[premieres]
+    p1[contact_arete[secondes]] = milieux[secondes]
+    valides = np.bincount(contact_arete[secondes], minlength=len(contacts)) > 0
+    for k in np.flatnonzero(~valides) :
+        print(f"[WARNING] Segment de contact trop court ou invalide pour les alésages sur {contacts[k][1].zone.nom}")
+
+    # Un alésage par (contact, gabarit) : repère (s, n, u) du chant, coin à distance_au_coin de chaque extrémité
+    # du segment de contact (un seul alésage au milieu si le segment fait moins de 200 mm)
+    lot = [(k, gabarit) for k in np.flatnonzero(valides) for gabarit in contacts[k][2] if gabarit.face_usinage in ("chant", "plat")]
+    if not lot :
+        return vide
+    k = np.array([k for k, gabarit in lot])
+    positionsnu = np.array([gabarit.positionsnu for k, gabarit in lot])
+    distances = np.array([gabarit.distance_au_coin for k, gabarit in lot], dtype=float)[:, None]
+    n = np.array([faceoppose.equation[:3] for face, faceoppose, gabarits in contacts])[k]
+    u = np.array([faceoppose.zone.face_usine.equation[:3] for face, faceoppose, gabarits in contacts])[k]
+    decalages = np.cross(n, u) * positionsnu[:, 0:1] + n * positionsnu[:, 1:2] + u * positionsnu[:, 2:3] # M @ positionsnu, M = (s, n, u)
+
+    vect = p0[k] - p1[k]
+    l = np.linalg.norm(vect, axis=1)
+    longs = l > 200
+    direction = np.divide(vect, l[:, None], out=np.zeros_like(vect), where=longs[:, None])
+    premiers = np.where(longs[:, None], p0[k] - direction * distances, (p0[k] + p1[k]) / 2) + decalages
+    seconds = p1[k] + direction * distances + decalages
+
+    # Face qui porte chaque alésage : le chant ou le plat du contact selon le gabarit
+    position_face = {} # id(face) -> (index de la planche, index de la face dans listface)
+    for i, planche in enumerate(planches) :
+        for j, face in enumerate(planche.listface) :
+            position_face[id(face)] = (i, j)
+    porteurs = np.array([position_face[id(contacts[k][1] if gabarit.face_usinage == "chant" else contacts[k][0])] for k, gabarit in lot])
+
+    # Lignes dans l'ordre de pose : (premier, second) centre de chaque (contact, gabarit), le second seulement pour les segments longs
+    garder = np.column_stack([np.ones(len(lot), dtype=bool), longs]).ravel()
+    def par_centre(valeurs):
+        return np.repeat(valeurs, 2, axis=0)[garder]
+    lignes = np.zeros(int(garder.sum()), dtype=DTYPE_ALESAGES)
+    lignes["position"] = np.stack([premiers, seconds], axis=1).reshape(-1, 3)[garder]
+    lignes["rayon"] = par_centre([gabarit.rayon for k, gabarit in lot])
+    lignes["profondeur"] = par_centre([gabarit.profondeur for k, gabarit in lot])
+    lignes["face_usinage"] = par_centre([gabarit.face_usinage for k, gabarit in lot])
+    lignes["couleur"] = par_centre([gabarit.couleur for k, gabarit in lot])
+    lignes["calque"] = par_centre([calque_diametre(gabarit.rayon) for k, gabarit in lot])
+    lignes["index_face"] = par_centre(porteurs[:, 1])
+    print(f"[INFO] {len(lignes)} alésages placés sur {len(contacts)} contacts")
+    return lignes, par_centre(porteurs[:, 0])
+
+def placer_alesages(planches, graphe=None): # remplit tableau_alesages de chaque planche : alésages posés à la modélisation puis ceux des contacts
+    graphe = graphe or GrapheContacts(planches)
+    lignes, index_planche = alesages_contacts(planches, graphe)
+
+    # Rangement par planche puis par face (tri stable : l'ordre de pose est gardé sur chaque face)
+    ordre = np.argsort(index_planche, kind="stable")
+    lignes, index_planche = lignes[ordre], index_planche[ordre]
+    bornes = np.searchsorted(index_planche, np.arange(len(planches) + 1))
+    for i, planche in enumerate(planches) :
+        # alésages ajoutés pendant la modélisation (passe-câble) : toujours objets Alesage, ils suivent les copies de MemoSequences
+        modelises = [tableau_alesages(face.alesages, j) for j, face in enumerate(planche.listface) if face.alesages]
+        # face_usine d'une zone dérivée (Zone.derivee) est une copie propre, absente de listface : ses alésages restent comptés
+        planche.index_face_usine = next((j for j, face in enumerate(planche.listface) if face is planche.face_usine), -1)
+        if planche.index_face_usine < 0 and planche.face_usine is not None and planche.face_usine.alesages :
+            modelises.insert(0, tableau_alesages(planche.face_usine.alesages, -1))
+        tableau = lignes[bornes[i]:bornes[i + 1]]
+        if modelises :
+            tableau = np.concatenate(modelises + [tableau])
+        planche.tableau_alesages = tableau[np.argsort(tableau["index_face"], kind="stable")]
 
 
 # %%
-#placement par doublet 
+# génération du dxf
+def dessiner_alesages(doc, msp, planche, xmin, ymin, X, Y, diameter_layers): # cercles des alésages de la planche, calque par calque de diamètre
+    tableau = planche.tableau_alesages
+    if tableau is None or not len(tableau):
+        return
+
+    # Projeter tous les centres en une fois dans le repère de la face d'usinage, puis à la place de la planche
+    centres = project_points_on_plane(tableau["position"],
+                                      planche.points[planche.face_usine.contour[0]],
+                                      np.cross(planche.sens_fibres,planche.face_usine.equation[:3]),
+                                      planche.sens_fibres)
+    centres[:, 0] = centres[:, 0] - xmin + X
+    centres[:, 1] = centres[:, 1] - ymin + Y
+
+    # Calques dans l'ordre où ils apparaissent sur la planche : mêmes couleurs qu'en les créant trou par trou
+    calques, premieres = np.unique(tableau["calque"], return_index=True)
+    for calque in calques[np.argsort(premieres)]:
+        layer_name = str(calque)
+        # Ajouter le layer si ce diamètre n'a pas encore de couche
+        if layer_name not in diameter_layers:
+            doc.layers.add(layer_name, color=len(diameter_layers) + 2)  # Assigner une couleur différente
+            diameter_layers[layer_name] = True  # Marquer comme ajouté
+
+        selection = tableau["calque"] == calque
+        for (x, y), rayon in zip(centres[selection].tolist(), tableau["rayon"][selection].tolist()):
+            msp.add_circle(center=(x, y), radius=rayon, dxfattribs={"layer": layer_name})
+
+def generer_dxf(groupes):
+    doc = ezdxf.new()
+    # Définir explicitement que le dessin utilise des millimètres comme unité
+    doc.header['$INSUNITS'] = 4  # 4 = millimètres
+    doc.header['$MEASUREMENT'] = 1  # 1 = métrique
+    doc.header['$LUNITS'] = 2  # 2 = décimal
+
+    doc.layers.add("contour_haut", color=1)  
+    doc.layers.add("contour_bas", color=2) 
+    doc.layers.add("texte", color=9)  # Création d'une nouvelle couche pour le texte
+    msp = doc.modelspace()
 
+    marge = 50  # marge en mm
+    X = 0
+    Y = 0
 
-faces = [face for planche in planches for face in planche.listface]
+    diameter_layers = {}  # Dictionnaire pour stocker les layers créés
+    toutes_facades = []  # Collecter toutes les façades pour les placer ensemble en haut à droite
+    X_max_global = 0  # Suivre le X maximum de toutes les planches normales
 
-doublets = [
-    (face1, face2)
-    for i, face1 in enumerate(faces)
-    for j, face2 in enumerate(faces)
-    ]
+    for planches_index, planches in enumerate(groupes):
 
-doublet_contact=[]
+        # Séparer les façades (portes, tiroirs, miroirs) des autres planches
+        facades_types = [
+            "porteg", "ported", "portec", "porte_coulissante", "porteg_push",  # Portes
+            "tiroir", "tiroir_push",  # Tiroirs (normaux et push-to-open)
+            "miroir", "verre"  # Miroirs et vitres
+        ]
+        planches_normales = [p for p in planches if getattr(p, 'bloc', None) not in facades_types]
+        planches_facades = [p for p in planches if getattr(p, 'bloc', None) in facades_types]
 
-for doublet in doublets : # creer le graph de connexité des planches 
-    face = doublet[0]
-    faceoppose = doublet[1]
-    if face.remonter_facesupport() == faceoppose.remonter_facesupport().faceoppose :  #les faces sont en contact
-        if faceoppose.chant and not face.chant : # Les faces sont chant et non chants
-            if np.abs(np.dot(faceoppose.equation[:3],faceoppose.zone.face_usine.equation[:3]))<0.05 : # orthogonalité 
-                doublet_contact.append(doublet) #doublet : [plat chant]
-print(doublet_contact)
+        # Collecter les façades pour les placer ensemble plus tard
+        for facade in planches_facades:
+            toutes_facades.append((planches_index, facade))
 
-for doublet in doublet_contact : # place les alésages en fonction de la configuration 
+        # Traiter d'abord les planches normales (à gauche)
+        X_max_normales = 0
+        for i, planche in enumerate(planches_normales):
 
-    face = doublet[0]
-    faceoppose = doublet[1]
+            # Projeter les points et rester en mm
+            projection = project_points_on_plane(planche.points,
+                                                planche.points[planche.face_usine.contour[0]],
+                                                np.cross(planche.sens_fibres,planche.face_usine.equation[:3]),
+                                                planche.sens_fibres)
+            # projection = projection / 1000  # Suppression de la conversion en m
 
-    alesages = config(faceoppose,face)
-    
-    n= faceoppose.equation[:3]
-    u= faceoppose.zone.face_usine.equation[:3]
-    s= np.cross(n,u)
-    M = np.column_stack((s, n, u))
-
-
-    if alesages is None :
-        1==1
-    else : 
-        for alesage in alesages :
-            try : 
-
-                # on commence par reconstituer le segment de contact
-                distance_au_coin = alesage.distance_au_coin
-                planche=faceoppose.zone
-                segments = faceoppose.segments()
-                points = planche.points
-                plan= planche.plan
-                segmentsreels = points[segments]
-                new_segment=[]
-                for segment in segmentsreels :
-                    boolean=slice(segment,plan)
-                    
-                    if np.all(boolean) or np.all(~boolean):
-                        pass
-                    else :
-                        new_segment.append((segment[0]+segment[1])/2)
-            
-                if len(new_segment) < 2:
-                    print(f"[WARNING] Segment de contact trop court ou invalide pour les alésages sur {planche.nom}")
-                    continue
+            xmax = np.max(projection[:, 0])
+            xmin = np.min(projection[:, 0])
 
-                vect = new_segment[0]-new_segment[1]
-                l = np.linalg.norm(vect)
-                if l > 200 : 
-                    centres = [new_segment[0] - vect/l*distance_au_coin,new_segment[1] + vect/l*distance_au_coin]
-                else :
-                    centres = [(new_segment[0]+new_segment[1])/2]
-                
-                #ajout des différents alésages 
-                print(centres)
-                print([alesage.rayon for alesage in alesages])
-                for centre in centres :
-                    alesagecopy=deepcopy(alesage)
-                    alesagecopy.positionxyz = centre +  M @ alesagecopy.positionsnu
-                    if alesagecopy.face_usinage == "chant" :
-                        faceoppose.alesages.append(alesagecopy)
-                    elif alesagecopy.face_usinage == "plat" :
-                        face.alesages.append(alesagecopy)
+            ymax = np.max(projection[:, 1])
+            ymin = np.min(projection[:, 1])
 
-            except Exception as e :
-                print("error " , e) 
+            projection[:, 0] = projection[:, 0] - xmin + X
+            projection[:, 1] = projection[:, 1] - ymin + Y
 
+            for face in planche.listface:
+                if planche.biseau:
+                    print(planche.biseau)
+                    if not face.chant:
+                        if face == planche.face_usine:
+                            contour_2d = projection[face.contour]
+                            msp.add_lwpolyline(
+                                points=contour_2d,
+                                close=True,
+                                dxfattribs={"layer": "contour_haut"},
+                            )
+
+                            # Ajout de texte pour ce contour
+                            texte = planche.nom+f"G{planches_index+1}"+"\n biseau"+str(np.round(planche.biseau))
+                            # Calculer le centre du contour pour placer le texte
+                            x_center = np.min(contour_2d[:, 0])
+                            y_center = (np.max(contour_2d[:, 1]) + np.min(contour_2d[:, 1])) / 2
+                            msp.add_text(
+                                texte,
+                                dxfattribs={
+                                    "layer": "texte",
+                                    "height": 15,  # hauteur du texte en mm
+                                    "style": "Standard",
+                                    "insert": (x_center, y_center)
+                                }
+                            )
+                        else :
+                            contour_2d = projection[face.contour]
+                            msp.add_lwpolyline(
+                                points=contour_2d,
+                                close=True,
+                                dxfattribs={"layer": "contour_bas"},
+                            )
+
+
+                else:
+                    if face == planche.face_usine: # ajouter les deux face non chant en cas de coupe biaise 
+                        contour_2d = projection[face.contour]
+                        msp.add_lwpolyline(
+                            points=contour_2d,
+                            close=True,
+                            dxfattribs={"layer": "contour_haut"},
+                        )
 
-# %%
-# séparartion des matériaux (cette section n'est plus utilisée car déplacée avant sys.exit)
+                        # Ajout de texte pour ce contour
+                        texte = planche.nom+f"G{planches_index+1}"
+                        # Calculer le centre du contour pour placer le texte
+                        x_center = np.min(contour_2d[:, 0])
+                        y_center = (np.max(contour_2d[:, 1]) + np.min(contour_2d[:, 1])) / 2
+                        msp.add_text(
+                            texte,
+                            dxfattribs={
+                                "layer": "texte",
+                                "height": 15,  # hauteur du texte en mm
+                                "style": "Standard",
+                                "insert": (x_center, y_center)
+                            }
+                        )
 
-planchescopy=deepcopy(planches)
+            dessiner_alesages(doc, msp, planche, xmin, ymin, X, Y, diameter_layers)
 
+            X = X + marge + xmax - xmin
+            X_max_normales = max(X_max_normales, X)
 
+        # Mettre à jour le X maximum global
+        X_max_global = max(X_max_global, X_max_normales)
 
+        # Les façades seront placées après la boucle principale
+        Y = Y + 1000  # Décalage de 1000 mm (1m) pour le groupe suivant
+        X = 0 # Réinitialiser X pour le nouveau groupe
 
-# %%
-# génération du dxf
-doc = ezdxf.new()
-# Définir explicitement que le dessin utilise des millimètres comme unité
-doc.header['$INSUNITS'] = 4  # 4 = millimètres
-doc.header['$MEASUREMENT'] = 1  # 1 = métrique
-doc.header['$LUNITS'] = 2  # 2 = décimal
-
-doc.layers.add("contour_haut", color=1)  
-doc.layers.add("contour_bas", color=2) 
-doc.layers.add("texte", color=9)  # Création d'une nouvelle couche pour le texte
-msp = doc.modelspace()
-
-marge = 50  # marge en mm
-X = 0
-Y = 0
-
-diameter_layers = {}  # Dictionnaire pour stocker les layers créés
-toutes_facades = []  # Collecter toutes les façades pour les placer ensemble en haut à droite
-X_max_global = 0  # Suivre le X maximum de toutes les planches normales
-
-for planches_index, planches in enumerate(groupes):
-
-    # Séparer les façades (portes, tiroirs, miroirs) des autres planches
-    facades_types = [
-        "porteg", "ported", "portec", "porte_coulissante", "porteg_push",  # Portes
-        "tiroir", "tiroir_push",  # Tiroirs (normaux et push-to-open)
-        "miroir", "verre"  # Miroirs et vitres
-    ]
-    planches_normales = [p for p in planches if getattr(p, 'bloc', None) not in facades_types]
-    planches_facades = [p for p in planches if getattr(p, 'bloc', None) in facades_types]
-
-    # Collecter les façades pour les placer ensemble plus tard
-    for facade in planches_facades:
-        toutes_facades.append((planches_index, facade))
-
-    # Traiter d'abord les planches normales (à gauche)
-    X_max_normales = 0
-    for i, planche in enumerate(planches_normales):
+    # Placer toutes les façades ensemble en haut à droite
+    Y_facades = 2500  # Très haut dans le DXF (grande valeur positive pour monter)
+    X_facades = X_max_global + 500  # À droite des planches normales, avec marge de 500mm
+
+    for planches_index, planche in toutes_facades:
 
         # Projeter les points et rester en mm
         projection = project_points_on_plane(planche.points,
                                             planche.points[planche.face_usine.contour[0]],
                                             np.cross(planche.sens_fibres,planche.face_usine.equation[:3]),
                                             planche.sens_fibres)
-        # projection = projection / 1000  # Suppression de la conversion en m
 
         xmax = np.max(projection[:, 0])
         xmin = np.min(projection[:, 0])
@@ -2533,8 +2765,8 @@ for planches_index, planches in enumerate(groupes):
         ymax = np.max(projection[:, 1])
         ymin = np.min(projection[:, 1])
 
-        projection[:, 0] = projection[:, 0] - xmin + X
-        projection[:, 1] = projection[:, 1] - ymin + Y
+        projection[:, 0] = projection[:, 0] - xmin + X_facades
+        projection[:, 1] = projection[:, 1] - ymin + Y_facades
 
         for face in planche.listface:
             if planche.biseau:
@@ -2547,7 +2779,7 @@ for planches_index, planches in enumerate(groupes):
                             close=True,
                             dxfattribs={"layer": "contour_haut"},
                         )
-                        
+
                         # Ajout de texte pour ce contour
                         texte = planche.nom+f"G{planches_index+1}"+"\n biseau"+str(np.round(planche.biseau))
                         # Calculer le centre du contour pour placer le texte
@@ -2570,94 +2802,9 @@ for planches_index, planches in enumerate(groupes):
                             dxfattribs={"layer": "contour_bas"},
                         )
 
-                
-            else:
-                if face == planche.face_usine: # ajouter les deux face non chant en cas de coupe biaise 
-                    contour_2d = projection[face.contour]
-                    msp.add_lwpolyline(
-                        points=contour_2d,
-                        close=True,
-                        dxfattribs={"layer": "contour_haut"},
-                    )
-                    
-                    # Ajout de texte pour ce contour
-                    texte = planche.nom+f"G{planches_index+1}"
-                    # Calculer le centre du contour pour placer le texte
-                    x_center = np.min(contour_2d[:, 0])
-                    y_center = (np.max(contour_2d[:, 1]) + np.min(contour_2d[:, 1])) / 2
-                    msp.add_text(
-                        texte,
-                        dxfattribs={
-                            "layer": "texte",
-                            "height": 15,  # hauteur du texte en mm
-                            "style": "Standard",
-                            "insert": (x_center, y_center)
-                        }
-                    )
-
-            for alesage in face.alesages:
-                # Projeter le centre de l'alésage
-                projectioncentre = project_points_on_plane(alesage.positionxyz,
-                                                          planche.points[planche.face_usine.contour[0]],
-                                                          np.cross(planche.sens_fibres,planche.face_usine.equation[:3]), 
-                                                          planche.sens_fibres)
-                # projectioncentre = projectioncentre / 1000  # Suppression de la conversion en m
-                projectioncentre[:, 0] = projectioncentre[:, 0] - xmin + X
-                projectioncentre[:, 1] = projectioncentre[:, 1] - ymin + Y
-
-                # Définir le nom de couche avec unité mm
-                radius_mm = alesage.rayon 
-                diameter_mm = round(2 * radius_mm, 1) 
-                layer_name = f"diam_{diameter_mm}mm" 
-
-                # Ajouter le layer si ce diamètre n'a pas encore de couche
-                if layer_name not in diameter_layers:
-                    doc.layers.add(layer_name, color=len(diameter_layers) + 2)  # Assigner une couleur différente
-                    diameter_layers[layer_name] = True  # Marquer comme ajouté
-
-                # Ajouter le cercle au bon layer
-                msp.add_circle(
-                    center=(projectioncentre[0, 0], projectioncentre[0, 1]),
-                    radius=radius_mm,
-                    dxfattribs={"layer": layer_name},
-                )
-
-        X = X + marge + xmax - xmin
-        X_max_normales = max(X_max_normales, X)
-
-    # Mettre à jour le X maximum global
-    X_max_global = max(X_max_global, X_max_normales)
-
-    # Les façades seront placées après la boucle principale
-    Y = Y + 1000  # Décalage de 1000 mm (1m) pour le groupe suivant
-    X = 0 # Réinitialiser X pour le nouveau groupe
-
-# Placer toutes les façades ensemble en haut à droite
-Y_facades = 2500  # Très haut dans le DXF (grande valeur positive pour monter)
-X_facades = X_max_global + 500  # À droite des planches normales, avec marge de 500mm
-
-for planches_index, planche in toutes_facades:
-
-    # Projeter les points et rester en mm
-    projection = project_points_on_plane(planche.points,
-                                        planche.points[planche.face_usine.contour[0]],
-                                        np.cross(planche.sens_fibres,planche.face_usine.equation[:3]),
-                                        planche.sens_fibres)
-
-    xmax = np.max(projection[:, 0])
-    xmin = np.min(projection[:, 0])
 
-    ymax = np.max(projection[:, 1])
-    ymin = np.min(projection[:, 1])
-
-    projection[:, 0] = projection[:, 0] - xmin + X_facades
-    projection[:, 1] = projection[:, 1] - ymin + Y_facades
-
-    for face in planche.listface:
-        if planche.biseau:
-            print(planche.biseau)
-            if not face.chant:
-                if face == planche.face_usine:
+            else:
+                if face == planche.face_usine: # ajouter les deux face non chant en cas de coupe biaise
                     contour_2d = projection[face.contour]
                     msp.add_lwpolyline(
                         points=contour_2d,
@@ -2666,7 +2813,7 @@ for planches_index, planche in toutes_facades:
                     )
 
                     # Ajout de texte pour ce contour
-                    texte = planche.nom+f"G{planches_index+1}"+"\n biseau"+str(np.round(planche.biseau))
+                    texte = planche.nom+f"G{planches_index+1}"
                     # Calculer le centre du contour pour placer le texte
                     x_center = np.min(contour_2d[:, 0])
                     y_center = (np.max(contour_2d[:, 1]) + np.min(contour_2d[:, 1])) / 2
@@ -2679,103 +2826,24 @@ for planches_index, planche in toutes_facades:
                             "insert": (x_center, y_center)
                         }
                     )
-                else :
-                    contour_2d = projection[face.contour]
-                    msp.add_lwpolyline(
-                        points=contour_2d,
-                        close=True,
-                        dxfattribs={"layer": "contour_bas"},
-                    )
-
-
-        else:
-            if face == planche.face_usine: # ajouter les deux face non chant en cas de coupe biaise
-                contour_2d = projection[face.contour]
-                msp.add_lwpolyline(
-                    points=contour_2d,
-                    close=True,
-                    dxfattribs={"layer": "contour_haut"},
-                )
-
-                # Ajout de texte pour ce contour
-                texte = planche.nom+f"G{planches_index+1}"
-                # Calculer le centre du contour pour placer le texte
-                x_center = np.min(contour_2d[:, 0])
-                y_center = (np.max(contour_2d[:, 1]) + np.min(contour_2d[:, 1])) / 2
-                msp.add_text(
-                    texte,
-                    dxfattribs={
-                        "layer": "texte",
-                        "height": 15,  # hauteur du texte en mm
-                        "style": "Standard",
-                        "insert": (x_center, y_center)
-                    }
-                )
-
-        for alesage in face.alesages:
-            # Projeter le centre de l'alésage
-            projectioncentre = project_points_on_plane(alesage.positionxyz,
-                                                      planche.points[planche.face_usine.contour[0]],
-                                                      np.cross(planche.sens_fibres,planche.face_usine.equation[:3]),
-                                                      planche.sens_fibres)
-            projectioncentre[:, 0] = projectioncentre[:, 0] - xmin + X_facades
-            projectioncentre[:, 1] = projectioncentre[:, 1] - ymin + Y_facades
-
-            # Définir le nom de couche avec unité mm
-            radius_mm = alesage.rayon
-            diameter_mm = round(2 * radius_mm, 1)
-            layer_name = f"diam_{diameter_mm}mm"
-
-            # Ajouter le layer si ce diamètre n'a pas encore de couche
-            if layer_name not in diameter_layers:
-                doc.layers.add(layer_name, color=len(diameter_layers) + 2)
-                diameter_layers[layer_name] = True
-
-            # Ajouter le cercle au bon layer
-            msp.add_circle(
-                center=(projectioncentre[0, 0], projectioncentre[0, 1]),
-                radius=radius_mm,
-                dxfattribs={"layer": layer_name},
-            )
-
-    X_facades = X_facades + marge + xmax - xmin
-
-# Ajouter des métadonnées pour clarifier les unités
-doc.header['$MENU'] = "Toutes les unités sont en millimètres"
-doc.header['$INSUNITS'] = 4 # 4 = Millimètres dans la norme DXF
 
-# Générer le nom du fichier DXF basé sur le nom du fichier GLB
-dxf_filename = os.path.splitext(os.path.basename(output_path))[0] + ".dxf"
-dxf_output_dir = os.path.dirname(output_path)
-dxf_output_path = os.path.join(dxf_output_dir, dxf_filename)
+        dessiner_alesages(doc, msp, planche, xmin, ymin, X_facades, Y_facades, diameter_layers)
 
-# Sauvegarder aussi dans pieces/ pour compatibilité avec l'ancien code
-pieces_dir = os.path.join(script_dir, "pieces")
-os.makedirs(pieces_dir, exist_ok=True)
-doc.saveas(os.path.join(pieces_dir, "piece_general.dxf"))
+        X_facades = X_facades + marge + xmax - xmin
 
-# Sauvegarder le DXF unique avec le même nom que le GLB
-doc.saveas(dxf_output_path)
-print(f"[INFO] Fichier DXF généré: {dxf_output_path}")
+    # Ajouter des métadonnées pour clarifier les unités
+    doc.header['$MENU'] = "Toutes les unités sont en millimètres"
+    doc.header['$INSUNITS'] = 4 # 4 = Millimètres dans la norme DXF
 
-# S'assurer que le fichier est bien écrit sur le disque avant de quitter
-try:
-    if os.path.exists(dxf_output_path):
-        # Optionnel: On peut aussi copier le fichier dans un endroit générique si besoin
-        # Mais l'API cherche maintenant le fichier spécifique
-        pass
-except:
-    pass
+    return doc
 
-# On arrête le script ici pour éviter les générations SVG/DXF redondantes qui écrasent tout
-sys.exit(0)
 
 # %%
-#generation de SVG
+#generation de SVG (plus appelée : le DXF est généré directement par generer_dxf)
 
-def generate_svg(groupes):
+def generate_svg(groupes, dossier_pieces):
     i="general"
-    dwg = svgwrite.Drawing(os.path.join(pieces_dir, f"piece_{i}.svg"), profile='tiny')
+    dwg = svgwrite.Drawing(os.path.join(dossier_pieces, f"piece_{i}.svg"), profile='tiny')
     # Définir les calques en utilisant des groupes SVG
 
     panneau_group = dwg.add(dwg.g(id=f'panneau', fill='none'))
@@ -2808,29 +2876,26 @@ def generate_svg(groupes):
                         points = [(float(x), float(y)) for x, y in contour_2d]
                         planche_group.add(dwg.polyline(points=points + [points[0]], stroke = "black", stroke_width=1, fill='none'))
 
-                for alesage in face.alesages:
-                    projectioncentre = project_points_on_plane(alesage.positionxyz,planche.points[planche.face_usine.contour[0]],np.cross(planche.sens_fibres,planche.face_usine.equation[:3]), planche.sens_fibres)
-                    projectioncentre =projectioncentre/10
-                    projectioncentre[:, 0] -= xmin-1
-                    projectioncentre[:, 0] = projectioncentre[:, 0] + x 
-                    projectioncentre[:, 1] -= ymin - 1 + y
-                    planche_group.add(dwg.circle(center=(projectioncentre[0, 0], projectioncentre[0, 1]),r=(alesage.rayon/10), stroke = alesage.couleur,stroke_width=1))
+            for alesage in planche.tableau_alesages if planche.tableau_alesages is not None else []:
+                projectioncentre = project_points_on_plane(alesage["position"],planche.points[planche.face_usine.contour[0]],np.cross(planche.sens_fibres,planche.face_usine.equation[:3]), planche.sens_fibres)
+                projectioncentre =projectioncentre/10
+                projectioncentre[:, 0] -= xmin-1
+                projectioncentre[:, 0] = projectioncentre[:, 0] + x 
+                projectioncentre[:, 1] -= ymin - 1 + y
+                planche_group.add(dwg.circle(center=(projectioncentre[0, 0], projectioncentre[0, 1]),r=(alesage["rayon"]/10), stroke = str(alesage["couleur"]),stroke_width=1))
 
             x=x+xmax-xmin + marge 
         y=y-400
     #dwg.viewbox(-10,-10,x,7000)
     dwg.save()
 
-generate_svg(groupes)
-
 
 # %%
-# svg to dxf 
-
-import ezdxf
-from svgpathtools import svg2paths
+# svg to dxf
 
 def svg_to_dxf(svg_file, dxf_file):
+    from svgpathtools import svg2paths
+
     # Charger les chemins à partir du fichier SVG
     paths, attributes = svg2paths(svg_file)
 
@@ -2849,115 +2914,258 @@ def svg_to_dxf(svg_file, dxf_file):
     # Sauvegarder le fichier DXF
     doc.saveas(dxf_file)
 
-# Exemple d'utilisation
-svg_to_dxf('pieces/piece_general.svg', 'pieces/conversion.dxf')
-
-
 
 # %%
-#Calcul de prix 
-planches=planchescopy
-prix = 0 
+#Calcul de prix
 
-prix_percage = 0.52 #PU
-prix_chant = 2.15 #euro par ml
-prix_paletisation = 55 #PU
-prix_decoupe = 1.15 # euro par mL
+def lire_facteur_prix(fichier="facteur_prix.txt"):
+    try:
+        with open(fichier, "r") as f:
+            return float(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return 2  # Valeur par défaut si le fichier n'existe pas ou contient une valeur incorrecte
 
-prix_usine=0
-prix_quincaille = 0 
-prix_bois=0
-prix_transport=150
+def calculer_prix(planches, textures_dict, chaine): # SORTIE le détail du prix (meublejson)
+    prix = 0
 
-prix_metrage = 100
+    prix_percage = 0.52 #PU
+    prix_chant = 2.15 #euro par ml
+    prix_paletisation = 55 #PU
+    prix_decoupe = 1.15 # euro par mL
 
-for i, planche in enumerate(planches) :
+    prix_usine=0
+    prix_quincaille = 0
+    prix_bois=0
+    prix_transport=150
 
-    prix_usine = (planche.perimetre()/1000)*(prix_chant+prix_decoupe) + prix_usine
-    prix_usine = len(planche.face_usine.alesages)*prix_percage + prix_usine
+    prix_metrage = 100
 
-    prix_bois = planche.prix() + prix_bois
+    for i, planche in enumerate(planches) :
 
-    if planche.bloc == "tiroir" :
-        prix_quincaille += 15
-    elif planche.bloc == "porteg" or planche.bloc == "ported" :
-        prix_quincaille += 50
+        prix_usine = (planche.perimetre()/1000)*(prix_chant+prix_decoupe) + prix_usine
+        prix_usine = np.count_nonzero(planche.tableau_alesages["index_face"] == planche.index_face_usine)*prix_percage + prix_usine
 
-prix_usine=prix_usine+prix_paletisation
+        prix_bois = planche.prix(textures_dict) + prix_bois
 
-prix_montage = (prix_usine+prix_bois)*0.5
+        if planche.bloc == "tiroir" :
+            prix_quincaille += 15
+        elif planche.bloc == "porteg" or planche.bloc == "ported" :
+            prix_quincaille += 50
 
+    prix_usine=prix_usine+prix_paletisation
 
+    prix_montage = (prix_usine+prix_bois)*0.5
 
-cout =  prix_usine+prix_transport+prix_bois+prix_quincaille + prix_montage + prix_metrage
+    cout =  prix_usine+prix_transport+prix_bois+prix_quincaille + prix_montage + prix_metrage
 
+    facteur = lire_facteur_prix()
 
+    prix = cout * facteur
 
-def lire_facteur_prix(fichier="facteur_prix.txt"):
-    try:
-        with open(fichier, "r") as f:
-            return float(f.read().strip())
-    except (FileNotFoundError, ValueError):
-        return 2  # Valeur par défaut si le fichier n'existe pas ou contient une valeur incorrecte
+    ##JSON
+    meublejson={}
+    meublejson["Description"]="meuble sur mesure"
+    meublejson["prixht"]=prix
+    meublejson["prixttc"]=np.round(prix*1.2,decimals=2)
+    meublejson["chaine"]=chaine
+    meublejson["sous_produit"]=[]
 
-# Exemple d'utilisation
-facteur = lire_facteur_prix()
+    for description, montant in [
+        ("Conception", prix_metrage),
+        ("Approvisionnement Bois", prix_bois),
+        ("Quincaillerie", prix_quincaille),
+        ("Decoupe", prix_usine),
+        ("Transport", prix_transport),
+        ("Pose", prix_montage),
+    ]:
+        sousproduit={}
+        sousproduit["description"]=description
+        sousproduit["prixht"]=montant*facteur
+        sousproduit["prixttc"]=sousproduit["prixht"]*1.2
+        meublejson["sous_produit"].append(sousproduit)
 
-prix = cout * facteur
+    return meublejson
 
 
 # %%
-##JSON
-print("prix du meuble :",prix)
-
-meublejson={}
-meublejson["Description"]="meuble sur mesure"
-meublejson["prixht"]=prix
-meublejson["prixttc"]=np.round(prix*1.2,decimals=2)
-meublejson["chaine"]=chaine
-meublejson["sous_produit"]=[]
-
-sousproduit={}
-sousproduit["description"]="Conception"
-sousproduit["prixht"]=prix_metrage*facteur
-sousproduit["prixttc"]=sousproduit["prixht"]*1.2
-meublejson["sous_produit"].append(sousproduit)
-
-sousproduit={}
-sousproduit["description"]="Approvisionnement Bois"
-sousproduit["prixht"]=prix_bois*facteur
-sousproduit["prixttc"]=sousproduit["prixht"]*1.2
-meublejson["sous_produit"].append(sousproduit)
-
-sousproduit={}
-sousproduit["description"]="Quincaillerie"
-sousproduit["prixht"]=prix_quincaille*facteur
-sousproduit["prixttc"]=sousproduit["prixht"]*1.2
-meublejson["sous_produit"].append(sousproduit)
-
-sousproduit={}
-sousproduit["description"]="Decoupe"
-sousproduit["prixht"]=prix_usine*facteur
-sousproduit["prixttc"]=sousproduit["prixht"]*1.2
-meublejson["sous_produit"].append(sousproduit)
-
-sousproduit={}
-sousproduit["description"]="Transport"
-sousproduit["prixht"]=prix_transport*facteur
-sousproduit["prixttc"]=sousproduit["prixht"]*1.2
-meublejson["sous_produit"].append(sousproduit)
-
-sousproduit={}
-sousproduit["description"]="Pose"
-sousproduit["prixht"]=prix_montage*facteur
-sousproduit["prixttc"]=sousproduit["prixht"]*1.2
-meublejson["sous_produit"].append(sousproduit)
-
-with open("produit.json", "w") as json_file:
-    json.dump(meublejson, json_file, indent=4)
- # Write JSON to file
-
-print(meublejson)
+# génération complète
+
+def generer_geometrie(prompt, options=None): # ENTREE un prompt M1(...) SORTIE un GenerationResult dont les planches sont maillées (de quoi écrire l'aperçu)
+    options = options or GenerationOptions()
+    textures_dict = options.textures_dict if options.textures_dict is not None else charger_textures()
+    resultat = GenerationResult(prompt, options)
+    resultat.textures_dict = textures_dict
+
+    #chaine=retirer_espaces(chaine)
+    arbre = analyser(prompt)
+    memo = MemoSequences(arbre, textures_dict) # les sous séquences répétées ne sont évaluées qu'une fois par forme de zone
+    planches = process(arbre, 1, textures_par_defaut(textures_dict), textures_dict, memo)
+    if memo.reutilisations:
+        print(f"[INFO] {memo.reutilisations} sous séquence(s) réutilisée(s) par translation")
+    resultat.planches = planches
+    resultat.chronometrer("process")
+
+    for planche in planches :
+        planche.trimesh()
+    resultat.chronometrer("maillage")
+
+    # Si des couleurs personnalisées sont fournies, les planches concernées passent en couleur unie et ne sont pas texturées
+    if options.colors:
+        appliquer_couleurs(planches, options.colors)
+    resultat.chronometrer("couleurs")
+    return resultat
 
+def finaliser(resultat): # textures, alésages, DXF et prix d'un résultat de generer_geometrie
+    options = resultat.options
+    textures_dict = resultat.textures_dict
+    planches = resultat.planches
+    resultat.debut_etape = time.perf_counter() # le temps passé entre les deux (écriture de l'aperçu) n'est pas compté ici
 
+    for planche in planches :
+        if planche.couleur is None :
+            planche.texturer(textures_dict, options.dossier_textures)
+    resultat.chronometrer("textures")
+
+    # Filtrer uniquement les vraies planches pour le DXF et la suite
+    panneaux = [p for p in planches if (hasattr(p, 'planche') and p.planche) and getattr(p, 'bloc', None) != "coulisse"]
+    panneaux = filtrer_panneaux_supprimes(panneaux, options.deleted_panels, options.zones)
+
+    # Numéroter les planches pour le DXF
+    for i, p in enumerate(panneaux):
+        p.nom = str(i + 1) # Commencer à 1 pour être plus naturel
+
+    # Grouper les planches par texture pour le DXF
+    resultat.panneaux = panneaux
+    resultat.groupes = sectionner_par_texture(panneaux, textures_dict)
+
+    detecter_biseaux(panneaux)
+    resultat.contacts = GrapheContacts(panneaux)
+    placer_alesages(panneaux, resultat.contacts)
+    resultat.chronometrer("alesages")
+
+    resultat.dxf = generer_dxf(resultat.groupes)
+    resultat.chronometrer("dxf")
+
+    resultat.prix = calculer_prix(panneaux, textures_dict, resultat.prompt)
+    resultat.chronometrer("prix")
+
+    resultat.timings["total"] = sum(duree for etape, duree in resultat.timings.items() if etape != "total")
+    return resultat
+
+def generate(prompt, options=None): # ENTREE un prompt M1(...) SORTIE un GenerationResult (rien n'est écrit sur disque)
+    return finaliser(generer_geometrie(prompt, options))
+
+def ecrire_sorties(resultat, output_path, dossier_pieces=None, chemin_autre_variante=None): # écrit le GLB et le DXF du même nom
+    exporter_glb(resultat, output_path, chemin_autre_variante=chemin_autre_variante)
 
+    # Générer le nom du fichier DXF basé sur le nom du fichier GLB
+    dxf_filename = os.path.splitext(os.path.basename(output_path))[0] + ".dxf"
+    dxf_output_dir = os.path.dirname(output_path)
+    dxf_output_path = os.path.join(dxf_output_dir, dxf_filename)
+
+    # Sauvegarder aussi dans pieces/ pour compatibilité avec l'ancien code
+    dossier_pieces = dossier_pieces or os.path.join(dossier_script(), "pieces")
+    os.makedirs(dossier_pieces, exist_ok=True)
+    resultat.dxf.saveas(os.path.join(dossier_pieces, "piece_general.dxf"))
+
+    # Sauvegarder le DXF unique avec le même nom que le GLB
+    resultat.dxf.saveas(dxf_output_path)
+    print(f"[INFO] Fichier DXF généré: {dxf_output_path}")
+    return dxf_output_path
+
+def main(argv):
+    # Récupérer les arguments : prompt, output_path et --closed
+    if len(argv) < 2:
+        print("[ERROR] Usage: python procedure_real.py <prompt> [output_path] [--closed] [--colors JSON] [--deleted-panels JSON] [--external-textures] [--handles] [--quantize] [--variant-output PATH] [--preview-output PATH]", file=sys.stderr)
+        return 1
+
+    chaine = argv[1]  # Le prompt M1(...)
+    output_path = argv[2] if len(argv) > 2 else "./meuble.glb"  # Chemin de sortie
+    closed_mode = "--closed" in argv  # Mode fermé (tiroirs et portes fermés)
+    external_textures = "--external-textures" in argv  # Images écrites dans textures/ à côté du GLB
+    handles = "--handles" in argv  # Poignées des portes et tiroirs dans le GLB
+    quantize = "--quantize" in argv  # Sommets quantifiés (KHR_mesh_quantization)
+
+    # GLB de l'autre variante (ouvert si --closed, fermé sinon) tiré du même maillage
+    variant_output_path = None
+    if "--variant-output" in argv:
+        variant_index = argv.index("--variant-output")
+        if variant_index + 1 < len(argv):
+            variant_output_path = argv[variant_index + 1]
+
+    # Aperçu grossier écrit dès la fin du maillage, avant textures, alésages et DXF
+    preview_output_path = None
+    if "--preview-output" in argv:
+        preview_index = argv.index("--preview-output")
+        if preview_index + 1 < len(argv):
+            preview_output_path = argv[preview_index + 1]
+
+    # Récupérer les couleurs hex si fournies (format JSON pour multi-couleurs)
+    custom_colors = {}
+    if "--colors" in argv:
+        colors_index = argv.index("--colors")
+        if colors_index + 1 < len(argv):
+            try:
+                custom_colors = json.loads(argv[colors_index + 1])
+                print(f"[INFO] Couleurs personnalisées (multi): {custom_colors}")
+            except json.JSONDecodeError as e:
+                print(f"[WARNING] Format JSON invalide pour --colors: {e}")
+                custom_colors = {}
+    elif "--color" in argv:
+        # Support legacy single color
+        color_index = argv.index("--color")
+        if color_index + 1 < len(argv):
+            custom_colors = {"all": argv[color_index + 1]}
+            print(f"[INFO] Couleur unique: {custom_colors['all']}")
+
+    # Récupérer les panneaux supprimés (pour exclure du DXF)
+    deleted_panels = []
+    if "--deleted-panels" in argv:
+        dp_index = argv.index("--deleted-panels")
+        if dp_index + 1 < len(argv):
+            try:
+                deleted_panels = json.loads(argv[dp_index + 1])
+                print(f"[INFO] Panneaux à exclure du DXF: {deleted_panels}")
+            except json.JSONDecodeError as e:
+                print(f"[WARNING] Format JSON invalide pour --deleted-panels: {e}")
+                deleted_panels = []
+
+    # Récupérer la structure des zones (pour segmentation des panneaux)
+    zones_structure = None
+    if "--zones" in argv:
+        zones_index = argv.index("--zones")
+        if zones_index + 1 < len(argv):
+            try:
+                zones_structure = json.loads(argv[zones_index + 1])
+                print(f"[INFO] Structure des zones reçue pour segmentation")
+            except json.JSONDecodeError as e:
+                print(f"[WARNING] Format JSON invalide pour --zones: {e}")
+                zones_structure = None
+
+    print(f"[INFO] Génération du meuble avec prompt: {chaine}")
+    print(f"[INFO] Fichier de sortie: {output_path}")
+    print(f"[INFO] Mode fermé: {closed_mode}") 
+
+    options = GenerationOptions(
+        closed=closed_mode,
+        colors=custom_colors,
+        deleted_panels=deleted_panels,
+        zones=zones_structure,
+        textures_externes=external_textures,
+        poignees=handles,
+        quantification=quantize,
+    )
+    try:
+        resultat = generer_geometrie(chaine, options)
+    except ErreurSyntaxe as e:
+        print(f"[ERROR] Prompt invalide: {e}", file=sys.stderr)
+        return 1
+    if preview_output_path:
+        exporter_apercu(resultat, preview_output_path)
+    finaliser(resultat)
+    ecrire_sorties(resultat, output_path, chemin_autre_variante=variant_output_path)
+    print("prix du meuble :", resultat.prix["prixht"])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+ArchiMeuble - Serveur de génération persistant
+
+Garde en mémoire les bibliothèques lourdes (numpy, trimesh, ezdxf,
+PIL, svgwrite), le module procedure_real et le catalogue des textures, pour que
+chaque appel de generate.php ne paie plus le coût d'un nouvel interpréteur Python.
+
+Protocole (HTTP local, JSON) :
+    POST /generate  {"prompt", "output_path", "closed", "colors",
+                     "deleted_panels", "zones", "external_textures", "handles",
+                     "quantize", "variant_output_path",
+                     "preview_output_path", "publish_path"}
+    GET  /sante     état du serveur
+
+Avec "preview_output_path", la réponse part dès que l'aperçu (GLB grossier,
+sans textures ni alésages) est écrit ; textures, alésages, DXF et GLB complet
+sont calculés ensuite dans un thread, puis publiés à "publish_path" (le DXF
+d'abord : la présence du GLB signale un modèle complet, comme ModelCache::put).
+
+Usage : python3 serveur_generation.py [--host 127.0.0.1] [--port 8765]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, script_dir)
+
+# Chargés une seule fois pour toute la durée de vie du processus
+import procedure_real
+
+HOTE_DEFAUT = "127.0.0.1"
+PORT_DEFAUT = 8765
+
+
+def journal(message):
+    """Message du serveur lui-même : écrit sur le stderr d'origine du processus.
+
+    sys.stdout/sys.stderr sont redirigés, pour tout le processus, pendant une
+    génération : un print ordinaire d'un autre thread finirait dans la sortie
+    renvoyée à generate.php.
+    """
+    print(message, file=sys.__stderr__, flush=True)
+
+
+def construire_options(requete, textures_dict):
+    """Traduit une requête JSON en options identiques à celles de la ligne de commande."""
+    return procedure_real.GenerationOptions(
+        closed=bool(requete.get("closed")),
+        colors=requete.get("colors") or {},
+        deleted_panels=requete.get("deleted_panels") or [],
+        zones=requete.get("zones"),
+        textures_dict=textures_dict,
+        textures_externes=bool(requete.get("external_textures")),
+        poignees=bool(requete.get("handles")),
+        quantification=bool(requete.get("quantize")),
+    )
+
+
+class Generateur:
+    """Appelle procedure_real.generate dans le processus courant, une génération à la fois."""
+
+    def __init__(self):
+        self.textures_dict = procedure_real.charger_textures()
+        self.verrou = threading.Lock()  # une génération à la fois : ses messages passent par sys.stdout, redirigé pour tout le processus
+        self.nombre_generations = 0
+        self.en_arriere_plan = 0 # générations complètes en cours après un aperçu
+
+    def generer(self, requete):
+        prompt = requete.get("prompt")
+        if not prompt:
+            raise ValueError('Le paramètre "prompt" est requis')
+        output_path = requete.get("output_path") or "./meuble.glb"
+        preview_path = requete.get("preview_output_path")
+        options = construire_options(requete, self.textures_dict)
+
+        sortie = io.StringIO()
+        code_retour = 0
+        timings = {}
+        erreur_syntaxe = None
+        debut = time.time()
+
+        with self.verrou:
+            with contextlib.redirect_stdout(sortie), contextlib.redirect_stderr(sortie):
+                try:
+                    print(f"[INFO] Génération du meuble avec prompt: {prompt}")
+                    resultat = procedure_real.generer_geometrie(prompt, options)
+                    if preview_path:
+                        procedure_real.exporter_apercu(resultat, preview_path)
+                        resultat.chronometrer("apercu")
+                        timings = dict(resultat.timings)
+                    else:
+                        procedure_real.finaliser(resultat)
+                        procedure_real.ecrire_sorties(resultat, output_path, chemin_autre_variante=requete.get("variant_output_path"))
+                        timings = resultat.timings
+                except procedure_real.ErreurSyntaxe as e:
+                    print(f"[ERROR] Prompt invalide: {e}")
+                    erreur_syntaxe = {"message": e.message, "position": e.position}
+                    code_retour = 1
+                except Exception:
+                    traceback.print_exc()
+                    code_retour = 1
+            self.nombre_generations += 1
+            if preview_path and code_retour == 0:
+                self.en_arriere_plan += 1
+
+        if preview_path:
+            if code_retour == 0:
+                threading.Thread(target=self.terminer, args=(resultat, requete, output_path), daemon=True).start()
+            return {
+                "success": code_retour == 0 and os.path.exists(preview_path),
+                "returncode": code_retour,
+                "output": sortie.getvalue(),
+                "preview_glb_path": preview_path,
+                "pending": code_retour == 0,
+                "execution_time": round(time.time() - debut, 3),
+                "timings": {etape: round(duree, 3) for etape, duree in timings.items()},
+                "syntax_error": erreur_syntaxe,
+            }
+
+        dxf_path = os.path.splitext(output_path)[0] + ".dxf"
+        variant_path = requete.get("variant_output_path")
+        return {
+            "success": code_retour == 0 and os.path.exists(output_path),
+            "returncode": code_retour,
+            "output": sortie.getvalue(),
+            "glb_path": output_path,
+            "variant_glb_path": variant_path if variant_path and os.path.exists(variant_path) else None,
+            "dxf_path": dxf_path if os.path.exists(dxf_path) else None,
+            "execution_time": round(time.time() - debut, 3),
+            "timings": {etape: round(duree, 3) for etape, duree in timings.items()},
+            "syntax_error": erreur_syntaxe,
+        }
+
+
+    def terminer(self, resultat, requete, output_path):
+        """Suite d'une génération avec aperçu : modèle complet puis publication à publish_path."""
+        sortie = io.StringIO()
+        try:
+            with self.verrou:
+                with contextlib.redirect_stdout(sortie), contextlib.redirect_stderr(sortie):
+                    procedure_real.finaliser(resultat)
+                    procedure_real.ecrire_sorties(resultat, output_path, chemin_autre_variante=requete.get("variant_output_path"))
+            publish_path = requete.get("publish_path")
+            if publish_path:
+                dxf_path = os.path.splitext(output_path)[0] + ".dxf"
+                if os.path.exists(dxf_path):
+                    os.replace(dxf_path, os.path.splitext(publish_path)[0] + ".dxf")
+                os.replace(output_path, publish_path)
+            journal(f"[serveur_generation] modèle complet publié en {resultat.timings.get('total', 0):.2f}s : {publish_path or output_path}")
+        except Exception:
+            journal(sortie.getvalue()[-2000:] + traceback.format_exc())
+            # sans aperçu, ModelCache::pendingPreview ne répond plus "en cours" : la prochaine requête relance la génération
+            for chemin in (output_path, os.path.splitext(output_path)[0] + ".dxf", requete.get("preview_output_path")):
+                if os.path.exists(chemin):
+                    os.remove(chemin)
+        finally:
+            with self.verrou:
+                self.en_arriere_plan -= 1
+
+
+class GestionnaireRequetes(BaseHTTPRequestHandler):
+    generateur = None
+
+    def _repondre(self, code, donnees):
+        corps = json.dumps(donnees).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def do_GET(self):
+        if self.path == "/sante":
+            self._repondre(200, {"ok": True, "generations": self.generateur.nombre_generations, "en_arriere_plan": self.generateur.en_arriere_plan})
+        else:
+            self._repondre(404, {"success": False, "error": "Route inconnue"})
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self._repondre(404, {"success": False, "error": "Route inconnue"})
+            return
+        try:
+            longueur = int(self.headers.get("Content-Length", 0))
+            requete = json.loads(self.rfile.read(longueur) or b"{}")
+            resultat = self.generateur.generer(requete)
+        except (ValueError, json.JSONDecodeError) as e:
+            self._repondre(400, {"success": False, "error": str(e)})
+            return
+        self._repondre(200 if resultat["success"] else 500, resultat)
+
+    def log_message(self, format, *args):
+        journal("[serveur_generation] " + format % args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur de génération ArchiMeuble")
+    parser.add_argument("--host", default=os.environ.get("GENERATION_SERVER_HOST", HOTE_DEFAUT))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("GENERATION_SERVER_PORT", PORT_DEFAUT)))
+    args = parser.parse_args()
+
+    GestionnaireRequetes.generateur = Generateur()
+    # Requêtes traitées une par une, dans le thread principal : seules les fins de génération après aperçu tournent à côté
+    serveur = HTTPServer((args.host, args.port), GestionnaireRequetes)
+    journal(f"[INFO] Serveur de génération prêt sur http://{args.host}:{args.port}")
+    try:
+        serveur.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        serveur.server_close()
+
+
+if __name__ == "__main__":
+    main()
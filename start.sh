@@ -72,6 +72,12 @@ else
     echo "Cron service could not start (non-fatal)"
 fi
 
+# Démarrer le serveur de génération 3D (imports Python gardés en mémoire)
+echo ""
+echo "Starting Python generation server..."
+python3 /app/backend/python/serveur_generation.py >> /data/generation-server.log 2>&1 &
+echo "Generation server started (PID $!, logs: /data/generation-server.log)"
+
 # Démarrer le serveur PHP
 echo ""
 echo "Starting PHP server on port $PORT..."